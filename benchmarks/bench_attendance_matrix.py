@@ -0,0 +1,94 @@
+"""
+Micro-benchmark for reports_service.calculate_attendance_percentages.
+
+Builds one section of 300 students x 400 sessions (~80% attendance) and
+compares the vectorized matrix implementation with the previous
+per-report / per-student loop. Building the per-session attendanceMap
+dicts (students x sessions entries) costs the same either way, so the
+summary-only path is timed separately.
+
+Usage:
+    python -m benchmarks.bench_attendance_matrix [--students 300] [--sessions 400]
+"""
+import argparse
+import copy
+import random
+import time
+
+from core.reports_service import calculate_attendance_percentages
+
+
+def legacy_calculate_attendance_percentages(grouped_reports, master_students):
+    # pure-Python version kept for comparison
+    results = {}
+    for batch, sections in grouped_reports.items():
+        for section, reports in sections.items():
+            students = master_students.get(batch, {}).get(section, [])
+            total_classes = len(reports)
+            student_counts = {s: {"present": 0, "total": total_classes} for s in students}
+            for report in reports:
+                present_students = set(report["students"])
+                attendance_map = {}
+                for s in students:
+                    if s in present_students:
+                        student_counts[s]["present"] += 1
+                        attendance_map[s] = "Present"
+                    else:
+                        attendance_map[s] = "Absent"
+                report["attendanceMap"] = attendance_map
+            for s, data in student_counts.items():
+                total = data["total"]
+                data["percentage"] = round((data["present"] / total) * 100, 1) if total > 0 else 0
+            results[(batch, section)] = student_counts
+    return results
+
+
+def make_section(n_students, n_sessions, rate=0.8, seed=7):
+    rng = random.Random(seed)
+    students = [f"Student {i:03d}" for i in range(n_students)]
+    reports = [
+        {
+            "uploadedAt": f"2025-01-01T00:00:{j:06d}",
+            "students": [s for s in students if rng.random() < rate],
+            "attendanceMap": {},
+        }
+        for j in range(n_sessions)
+    ]
+    return {"2022-2026": {"A": reports}}, {"2022-2026": {"A": students}}
+
+
+def best_of(fn, grouped, master, repeat):
+    timings = []
+    for _ in range(repeat):
+        data = copy.deepcopy(grouped)
+        start = time.perf_counter()
+        result = fn(data, master)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--sessions", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    grouped, master = make_section(args.students, args.sessions)
+
+    legacy_time, legacy = best_of(legacy_calculate_attendance_percentages, grouped, master, args.repeat)
+    matrix_time, current = best_of(calculate_attendance_percentages, grouped, master, args.repeat)
+    summary_time, _ = best_of(
+        lambda g, m: calculate_attendance_percentages(g, m, include_maps=False),
+        grouped, master, args.repeat,
+    )
+
+    # same percentages as the old loop
+    for key, students in legacy.items():
+        for name, stats in students.items():
+            assert current[key][name]["percentage"] == stats["percentage"], name
+
+    print(f"{args.students} students x {args.sessions} sessions")
+    print(f"  legacy loop : {legacy_time * 1000:8.1f} ms")
+    print(f"  matrix      : {matrix_time * 1000:8.1f} ms  ({legacy_time / matrix_time:.1f}x, incl. per-session maps)")
+    print(f"  matrix only : {summary_time * 1000:8.1f} ms  ({legacy_time / summary_time:.1f}x, include_maps=False)")
@@ -0,0 +1,138 @@
+"""
+Peak memory of loading a year of attendance reports into one frame.
+
+Writes synthetic reports (sections x teaching days, one workbook per
+session) to a local storage root, then loads them in fresh interpreters
+so each mode gets its own peak RSS:
+
+    legacy     every column as strings, plain concat (the previous loader)
+    all        load_attendance_frame with every column (categoricals etc.)
+    projected  load_attendance_frame with the dashboard's columns only
+
+Usage:
+    python -m benchmarks.bench_loader_memory [--sections 3] [--days 250] [--students 60]
+"""
+import argparse
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+MODES = ("legacy", "all", "projected")
+PROJECTED_COLUMNS = ["date", "subject", "student_name", "er_number", "status"]
+
+
+def write_reports(root, sections, days, students, seed=7):
+    from openpyxl import Workbook
+    from core.storage import LocalStorage, BUCKET_NAME
+
+    storage = LocalStorage(BUCKET_NAME, root)
+    rng = random.Random(seed)
+    subjects = ["OS", "CN", "DBMS", "TOC", "SE"]
+    start = date(2024, 7, 1)
+    for s in range(sections):
+        batch, section = f"202{s}-202{s + 4}", chr(ord("A") + s)
+        for d in range(days):
+            day = start + timedelta(days=d * 365 // days)
+            subject = subjects[d % len(subjects)]
+            wb = Workbook(write_only=True)
+            ws = wb.create_sheet(title="Attendance")
+            ws.append(["ER Number", "Student Name", "Date", "Time", "Class", "Subject", "Batch", "Status"])
+            for i in range(students):
+                ws.append([f"92{s}00133{i:03d}", f"Student {s}-{i:03d}", day.strftime("%d-%m-%Y"), "10:00:00",
+                           section, subject, batch, "Present" if rng.random() < 0.8 else "Absent"])
+            body = io.BytesIO()
+            wb.save(body)
+            key = f"reports/batch={batch}/month={day:%Y-%m}/{day:%Y%m%d}_100000_{batch}_{section}_{subject}.xlsx"
+            storage.put_bytes(key, body.getvalue())
+
+
+def legacy_parse_report(body, key, columns=None):
+    # previous parser, kept for comparison: every column as strings
+    import pandas as pd
+    from core.attendance_loader import COLUMN_ALIASES, SESSION_COLUMNS, _parse_dates
+
+    raw = pd.read_excel(io.BytesIO(body), dtype=str)
+    headers = {str(c).strip().lower(): c for c in raw.columns}
+    frame = pd.DataFrame(index=raw.index)
+    for column in SESSION_COLUMNS:
+        source = next((headers[a] for a in COLUMN_ALIASES[column] if a in headers), None)
+        frame[column] = raw[source].astype("string").str.strip()
+    frame["status"] = frame["status"].str.lower()
+    frame["date"] = _parse_dates(frame["date"])
+    return frame
+
+
+def legacy_load():
+    # same download/parse pool as the current loader, previous parser and concat
+    import pandas as pd
+    from core import attendance_loader
+
+    attendance_loader.parse_report = legacy_parse_report
+    frames = []
+    for session in attendance_loader.iter_sessions():
+        frame = session["frame"]
+        frame["report_key"] = session["key"]
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_worker(mode):
+    import pandas  # noqa: F401  (count the import in the baseline, not the load)
+    from core.attendance_loader import load_attendance_frame
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    if mode == "legacy":
+        frame = legacy_load()
+    elif mode == "all":
+        frame = load_attendance_frame()
+    else:
+        frame = load_attendance_frame(columns=PROJECTED_COLUMNS)
+    print(json.dumps({
+        "rows": len(frame),
+        "frame_mb": frame.memory_usage(deep=True).sum() / (1024 * 1024),
+        "peak_mb": peak_rss_mb(),
+        "baseline_mb": baseline,
+        "seconds": time.perf_counter() - start,
+    }))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sections", type=int, default=3)
+    parser.add_argument("--days", type=int, default=250)
+    parser.add_argument("--students", type=int, default=60)
+    parser.add_argument("--worker", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker)
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as root:
+        write_reports(root, args.sections, args.days, args.students)
+        env = dict(os.environ, STORAGE_BACKEND="local", STORAGE_LOCAL_ROOT=root)
+
+        print(f"{args.sections * args.days} reports x {args.students} students")
+        print(f"  {'mode':<10} {'rows':>8} {'frame MB':>9} {'peak RSS MB':>12} {'load MB':>8} {'seconds':>8}")
+        for mode in MODES:
+            proc = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_loader_memory", "--worker", mode],
+                capture_output=True, text=True, env=env, check=True,
+            )
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+            print(f"  {mode:<10} {r['rows']:>8} {r['frame_mb']:>9.1f} {r['peak_mb']:>12.1f} "
+                  f"{r['peak_mb'] - r['baseline_mb']:>8.1f} {r['seconds']:>8.1f}")
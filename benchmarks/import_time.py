@@ -0,0 +1,70 @@
+"""
+Import-time budget for the WSGI module.
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter, reports
+the total and the slowest top-level imports, and exits non-zero if the
+budget is exceeded or a heavy dependency is imported eagerly.
+
+Usage:
+    python -m benchmarks.import_time [--budget-ms 400] [--module main] [--top 10]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# must stay out of `import main`; they load on first use
+HEAVY_MODULES = ("pandas", "numpy", "boto3", "botocore", "matplotlib", "openpyxl")
+
+
+def measure(module):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    code = f"import sys, {module}; print(','.join(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules)))"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, env=env, check=True,
+    )
+
+    # lines look like: "import time:   self [us] |  cumulative | imported package"
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative_us, name = line.replace("import time:", "", 1).split("|")
+        rows.append((int(cumulative_us), name[1:]))
+
+    # nested imports are indented (two spaces per level) under the module
+    # that pulled them in and are listed before it
+    end = max(i for i, (_, name) in enumerate(rows) if name == module)
+    start = end
+    while start > 0 and rows[start - 1][1].startswith(" "):
+        start -= 1
+    total_us = rows[end][0]
+    children = [(us, name.strip()) for us, name in rows[start:end] if not name.startswith("   ")]
+    eager = [m for m in proc.stdout.strip().split(",") if m]
+    return total_us, sorted(children, reverse=True), eager
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=400)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    total_us, slowest, eager = measure(args.module)
+
+    print(f"import {args.module}: {total_us / 1000:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    for us, name in slowest[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if eager:
+        print(f"❌ heavy modules imported eagerly: {', '.join(eager)}")
+        failed = True
+    if total_us / 1000 > args.budget_ms:
+        print("❌ over budget")
+        failed = True
+    if not failed:
+        print("✅ within budget")
+    sys.exit(1 if failed else 0)
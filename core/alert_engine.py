@@ -0,0 +1,191 @@
+import os
+import time
+import logging
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+from core.student_index import (
+    get_connection, sync_index, changed_students, mark_students_changed, prune_changes, subject_stats
+)
+from core.email_service import send_low_attendance_emails
+
+# Load environment
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ALERT_THRESHOLD = float(os.getenv("ALERT_THRESHOLD", "75"))
+# e.g. "CN=80,OS=70"; subjects not listed use ALERT_THRESHOLD
+ALERT_SUBJECT_THRESHOLDS = os.getenv("ALERT_SUBJECT_THRESHOLDS", "")
+ALERT_COOLDOWN_HOURS = float(os.getenv("ALERT_COOLDOWN_HOURS", "72"))
+OVERALL = "*"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alert_state (
+    er_number        TEXT NOT NULL,
+    subject          TEXT NOT NULL,
+    last_percentage  REAL,
+    last_alerted_at  REAL,
+    last_alerted_pct REAL,
+    PRIMARY KEY (er_number, subject)
+);
+CREATE TABLE IF NOT EXISTS alert_meta (
+    name  TEXT PRIMARY KEY,
+    value REAL
+);
+"""
+
+
+def parse_subject_thresholds(spec=ALERT_SUBJECT_THRESHOLDS):
+    thresholds = {}
+    for item in spec.split(","):
+        if "=" in item:
+            subject, value = item.split("=", 1)
+            try:
+                thresholds[subject.strip()] = float(value)
+            except ValueError:
+                logger.warning(f"Ignoring bad alert threshold {item!r}")
+    return thresholds
+
+
+def _connection():
+    conn = get_connection()
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def student_emails():
+    """ER number -> email for students whose roster row has one."""
+    from core.roster import get_roster
+    try:
+        roster = get_roster()
+    except Exception as e:
+        logger.warning(f"Roster unavailable, alerts go to the admin address: {e}")
+        return {}
+    return {er: s["email"] for er, s in roster.by_er.items() if s["email"]}
+
+
+def _evaluations(stats, threshold, subject_thresholds):
+    """(subject, percentage, threshold) for each subject plus the overall figure."""
+    for subject, (present, total) in stats["subjects"].items():
+        if total:
+            yield subject, round(present / total * 100, 1), subject_thresholds.get(subject, threshold)
+
+    present = sum(p for p, _ in stats["subjects"].values())
+    total = sum(t for _, t in stats["subjects"].values())
+    if total:
+        yield OVERALL, round(present / total * 100, 1), threshold
+
+
+def run_alert_evaluation(threshold=None, subject_thresholds=None, cooldown_hours=None,
+                         recipient=None, sync=True, full=False):
+    """
+    Evaluates only students whose attendance changed since the last run and
+    emails those below threshold, at most once per cooldown per subject and
+    in one email per student. Percentages are counted like the dashboard
+    (see subject_stats).
+    Returns a list of {er_number, name, subject, percentage, status}.
+    """
+    threshold = ALERT_THRESHOLD if threshold is None else float(threshold)
+    subject_thresholds = parse_subject_thresholds() if subject_thresholds is None else subject_thresholds
+    cooldown = (ALERT_COOLDOWN_HOURS if cooldown_hours is None else cooldown_hours) * 3600
+    recipient = recipient or os.getenv("MAIL_USERNAME")
+
+    if sync:
+        sync_index()
+
+    conn = _connection()
+    started = time.time()
+    row = conn.execute("SELECT value FROM alert_meta WHERE name = 'watermark'").fetchone()
+    watermark = None if full or row is None else row[0]
+
+    # first run (or full=True) looks at everybody
+    er_numbers = None if watermark is None else changed_students(watermark)
+    stats = subject_stats(er_numbers) if er_numbers is None or er_numbers else {}
+
+    state = {}
+    if stats:
+        for r in conn.execute("SELECT er_number, subject, last_alerted_at FROM alert_state"):
+            if r["er_number"] in stats:
+                state[(r["er_number"], r["subject"])] = r["last_alerted_at"]
+
+    due = []
+    updates = []
+    for er_number, student in stats.items():
+        for subject, percentage, limit in _evaluations(student, threshold, subject_thresholds):
+            last_alerted = state.get((er_number, subject))
+            updates.append((er_number, subject, percentage))
+            if percentage >= limit:
+                continue
+            if last_alerted and started - last_alerted < cooldown:
+                continue
+            due.append({
+                "er_number": er_number,
+                "name": student["name"] or er_number,
+                "subject": "Overall" if subject == OVERALL else subject,
+                "scope": subject,
+                "percentage": percentage,
+                "threshold": limit,
+            })
+
+    # students with an email in the roster get the alert; the rest go to the admin address
+    emails = student_emails() if due else {}
+    by_student = {}
+    for alert in due:
+        alert["email"] = emails.get(alert["er_number"]) or recipient
+        alert["recipient"] = "student" if alert["er_number"] in emails else "admin"
+        by_student.setdefault(alert["er_number"], []).append(alert)
+
+    # one email per student per run, listing every subject that is due
+    addressed = [alerts for alerts in by_student.values() if alerts[0]["email"]]
+    outcomes = dict(zip(
+        (alerts[0]["er_number"] for alerts in addressed),
+        send_low_attendance_emails([
+            {
+                "email": alerts[0]["email"],
+                "name": alerts[0]["name"],
+                "subjects": [
+                    {"course": a["subject"], "percentage": a["percentage"], "threshold": a["threshold"]}
+                    for a in alerts
+                ],
+            }
+            for alerts in addressed
+        ]) if addressed else [],
+    ))
+    skipped = {"status": "skipped", "error": "mail not configured"}
+
+    alerted_at = {}
+    for alert in due:
+        outcome = outcomes.get(alert["er_number"], skipped)
+        alert["status"] = outcome["status"]
+        if outcome.get("error"):
+            alert["error"] = outcome["error"]
+        if outcome["status"] == "sent":
+            alerted_at[(alert["er_number"], alert["scope"])] = (started, alert["percentage"])
+
+    with conn:
+        conn.executemany(
+            "INSERT INTO alert_state (er_number, subject, last_percentage) VALUES (?, ?, ?) "
+            "ON CONFLICT (er_number, subject) DO UPDATE SET last_percentage = excluded.last_percentage",
+            updates,
+        )
+        conn.executemany(
+            "UPDATE alert_state SET last_alerted_at = ?, last_alerted_pct = ? WHERE er_number = ? AND subject = ?",
+            [(at, pct, er, subject) for (er, subject), (at, pct) in alerted_at.items()],
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO alert_meta (name, value) VALUES ('watermark', ?)", (started,)
+        )
+    # the watermark moved past everyone evaluated; students whose alert was not
+    # sent (SMTP failure, mail not configured) are flagged again so the next run retries
+    mark_students_changed(a["er_number"] for a in due if a["status"] != "sent")
+    # change log entries older than a day are no longer needed
+    prune_changes(started - 86400)
+
+    logger.info(
+        f"Alert run: {len(stats)} student(s) evaluated, {len(due)} alert(s) due, "
+        f"{len(alerted_at)} emailed in {sum(o['status'] == 'sent' for o in outcomes.values())} message(s) at {datetime.now(timezone.utc).isoformat(timespec='seconds')}"
+    )
+    for alert in due:
+        alert.pop("scope", None)
+    return due
@@ -1,70 +1,38 @@
-from core.generate_attendance_charts import generate_overall_attendance
-from core.email_service import send_low_attendance_email
+from core.alert_engine import run_alert_evaluation
 import logging
 
 logger = logging.getLogger(__name__)
 
-def check_and_alert_low_attendance(threshold=75.0):
+STATUS_LABELS = {
+    ("sent", "student"): "Email Sent to Student",
+    ("sent", "admin"): "Email Sent to Admin",
+}
+
+def check_and_alert_low_attendance(threshold=None, full=False):
     """
-    Checks attendance for all students and sends an email if below threshold.
+    Checks attendance of students whose records changed since the last run
+    and sends an email for each one below threshold (per subject and
+    overall), skipping anyone already alerted within the cooldown.
+    threshold defaults to ALERT_THRESHOLD.
     Returns the list of students who were alerted.
     """
     try:
-        # Get latest attendance data
-        data = generate_overall_attendance()
-        students = data.get("students", [])
-        
+        alerts = run_alert_evaluation(threshold=threshold, full=full)
+
+        # students without an Email column entry in the roster are alerted via the admin email
         alerted_students = []
-        
-        for student in students:
-            try:
-                percentage = float(student.get("attendance_percentage", 100))
-                if percentage < threshold:
-                    name = student.get("name", "Student")
-                    # For now, we don't have emails in the Excel sheet (presumably).
-                    # We will mock it or try to fetch from a mapping if it existed.
-                    # TODO: Add email column to Excel or lookup.
-                    # For this V1, let's assume we send to a debug email or skip if not found.
-                    
-                    # ALERT: Since we don't have real student emails, we will log this limitation.
-                    # In a real app, we'd look up student['email'].
-                    # For demo purposes, we will SKIP sending if we can't find an email,
-                    # OR we can assume a pattern like 'firstname@example.com' or just log it.
-                    
-                    # For the USER to test, they should probably see this occurring.
-                    logger.info(f"Student {name} has low attendance: {percentage}%")
-                    
-                    # We'll try to send to a placeholder or the configured ADMIN email for testing?
-                    # Let's try to send to the sender itself (as a test) or just log it if no target.
-                    
-                    # Temporary: In a real deployment, we need a way to get student email.
-                    # I will assume there might be a dictionary or database. 
-                    # For now, I will NOT send actual emails to random addresses to avoid spam.
-                    # I will return them in the list so the frontend knows who *would* be alerted.
-                    
-                    student_email = None # define how to get this
-                    
-                    # If the user wants to test, maybe we send ALL alerts to the ADMIN email?
-                    # Let's do that if configured.
-                    import os
-                    admin_email = os.getenv("MAIL_USERNAME") # Send to self for testing
-                    if admin_email:
-                        send_low_attendance_email(admin_email, name, percentage)
-                        alerted_students.append({
-                            "name": name, 
-                            "percentage": percentage, 
-                            "status": "Email Sent to Admin"
-                        })
-                    else:
-                        alerted_students.append({
-                            "name": name, 
-                            "percentage": percentage, 
-                            "status": "Skipped (No Email Config)"
-                        })
-                        
-            except Exception as inner_e:
-                logger.error(f"Error processing student {student}: {inner_e}")
-                continue
+        for alert in alerts:
+            if alert["status"] == "skipped":
+                status = "Skipped (No Email Config)"
+            else:
+                status = STATUS_LABELS.get((alert["status"], alert["recipient"])) or f"Failed ({alert.get('error')})"
+            alerted_students.append({
+                "name": alert["name"],
+                "er_number": alert["er_number"],
+                "subject": alert["subject"],
+                "percentage": alert["percentage"],
+                "status": status,
+            })
 
         return alerted_students
 
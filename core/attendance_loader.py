@@ -0,0 +1,239 @@
+import io
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+from dotenv import load_dotenv
+
+from core.storage import get_storage, BUCKET_NAME
+from core.report_layout import REPORTS_ROOT, partition_prefixes, matches_query
+
+# Load environment
+load_dotenv()
+
+AWS_REGION = os.getenv("AWS_REGION", "ap-south-1")
+REPORTS_PREFIX = REPORTS_ROOT
+LOADER_WORKERS = int(os.getenv("REPORT_LOADER_WORKERS", "8"))
+LOADER_CONCAT_CHUNK = int(os.getenv("REPORT_LOADER_CONCAT_CHUNK", "64"))
+
+# canonical column -> header spellings seen in reports (lower-cased)
+COLUMN_ALIASES = {
+    "er_number": ("er number", "er_number", "er no", "enrollment number"),
+    "student_name": ("student name", "name", "student_name"),
+    "date": ("date",),
+    "time": ("time",),
+    "class": ("class", "lab", "section"),
+    "subject": ("subject", "subject name"),
+    "batch": ("batch", "batch name"),
+    "status": ("status",),
+}
+SESSION_COLUMNS = list(COLUMN_ALIASES)
+# few distinct values per column: stored as category codes, not a string per row
+CATEGORY_COLUMNS = ("er_number", "class", "subject", "batch", "status")
+
+
+def is_report_object(obj):
+    key = obj.get("Key", "")
+    # master student list lives next to the reports in some buckets
+    if os.path.basename(key).lower() == "students.xlsx":
+        return False
+    return key.lower().endswith((".xlsx", ".csv"))
+
+
+def list_pages(prefix, bucket, delimiter=None):
+    yield from get_storage(bucket).list_pages(prefix, delimiter)
+
+
+def _batch_prefixes(bucket):
+    for page in list_pages(REPORTS_ROOT, bucket, delimiter="/"):
+        for common in page.get("CommonPrefixes", []) or []:
+            if common["Prefix"][len(REPORTS_ROOT):].startswith("batch="):
+                yield common["Prefix"]
+
+
+def report_batches(bucket=BUCKET_NAME):
+    """Batch names that have a partition under REPORTS_ROOT."""
+    return [p[len(REPORTS_ROOT) + len("batch="):].rstrip("/") for p in _batch_prefixes(bucket)]
+
+
+def list_report_objects(prefix=REPORTS_PREFIX, bucket=BUCKET_NAME, batch=None, months=None):
+    """
+    Yields listing entries (Key, ETag, Size, LastModified) of every report
+    under prefix. With batch and/or months only the matching partitions
+    are listed, plus any legacy flat keys that have not been migrated.
+    """
+    if not batch and not months:
+        for page in list_pages(prefix, bucket):
+            for obj in page.get("Contents", []) or []:
+                if is_report_object(obj):
+                    yield obj
+        return
+
+    if batch:
+        prefixes = partition_prefixes(batch, months)
+    else:
+        prefixes = [f"{p}month={m}/" for p in _batch_prefixes(bucket) for m in sorted(set(months))]
+
+    for partition in prefixes:
+        for page in list_pages(partition, bucket):
+            for obj in page.get("Contents", []) or []:
+                if is_report_object(obj):
+                    yield obj
+
+    # legacy flat reports directly under reports/
+    for page in list_pages(REPORTS_ROOT, bucket, delimiter="/"):
+        for obj in page.get("Contents", []) or []:
+            if is_report_object(obj) and matches_query(obj["Key"], batch, months):
+                yield obj
+
+
+def _parse_dates(values):
+    # reports store dd-mm-yyyy, CSV exports store yyyy-mm-dd
+    parsed = pd.to_datetime(values, format="%d-%m-%Y", errors="coerce")
+    missing = parsed.isna() & values.notna()
+    if missing.any():
+        parsed[missing] = pd.to_datetime(values[missing], format="ISO8601", errors="coerce")
+    return parsed
+
+
+def parse_report(body, key, columns=None):
+    """
+    Parses one report into a frame with canonical columns
+    (see SESSION_COLUMNS). `columns` limits the output to a subset and
+    only those columns are read from the file. CATEGORY_COLUMNS are
+    categoricals, dates datetime64, and loading status adds a boolean
+    `present` column.
+    """
+    wanted = list(columns) if columns else SESSION_COLUMNS
+    aliases = {a for column in wanted for a in COLUMN_ALIASES[column]}
+
+    def usecols(header):
+        return str(header).strip().lower() in aliases
+
+    if key.lower().endswith(".csv"):
+        raw = pd.read_csv(io.BytesIO(body), dtype=str, usecols=usecols)
+    else:
+        raw = pd.read_excel(io.BytesIO(body), dtype=str, usecols=usecols)
+
+    headers = {str(c).strip().lower(): c for c in raw.columns}
+    frame = pd.DataFrame(index=raw.index)
+    for column in wanted:
+        source = next((headers[a] for a in COLUMN_ALIASES[column] if a in headers), None)
+        if source is None:
+            frame[column] = pd.Series(pd.NA, index=raw.index, dtype="string")
+        else:
+            frame[column] = raw[source].astype("string").str.strip()
+
+    if "status" in frame.columns:
+        status = frame["status"].str.lower()
+        # CSV exports only list recognised students and carry no status
+        if not any(a in headers for a in COLUMN_ALIASES["status"]):
+            status = status.fillna("present")
+        frame["status"] = status
+        frame["present"] = status.str.contains("present", na=False).astype(bool)
+
+    if "date" in frame.columns:
+        frame["date"] = _parse_dates(frame["date"])
+
+    for column in CATEGORY_COLUMNS:
+        if column in frame.columns:
+            frame[column] = frame[column].astype("category")
+
+    return frame
+
+
+def _load_session(obj, columns, bucket):
+    key = obj["Key"]
+    try:
+        # served from the local hot tier unless the report is new or changed
+        body = get_storage(bucket).get_bytes(key, etag=obj.get("ETag"), size=obj.get("Size"))
+        frame = parse_report(body, key, columns)
+    except Exception as e:
+        print(f"⚠️ Skipping unreadable report {key}: {e}")
+        return None
+
+    return {
+        "key": key,
+        "file_name": os.path.basename(key),
+        "etag": (obj.get("ETag") or "").strip('"'),
+        "size": obj.get("Size", 0),
+        "last_modified": obj.get("LastModified"),
+        "frame": frame,
+    }
+
+
+def iter_sessions(prefix=REPORTS_PREFIX, columns=None, objects=None,
+                  bucket=BUCKET_NAME, workers=LOADER_WORKERS, batch=None, months=None):
+    """
+    Yields one normalized session per report, in listing order.
+
+    Reports are downloaded (through the report cache) and parsed on a small
+    thread pool with a bounded look-ahead, so memory stays proportional to
+    `workers`, not to the number of reports.
+    """
+    if objects is None:
+        objects = list_report_objects(prefix, bucket, batch=batch, months=months)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending = deque()
+        for obj in objects:
+            pending.append(executor.submit(_load_session, obj, columns, bucket))
+            if len(pending) >= workers * 2:
+                session = pending.popleft().result()
+                if session is not None:
+                    yield session
+        while pending:
+            session = pending.popleft().result()
+            if session is not None:
+                yield session
+
+
+def _concat_frames(frames):
+    """
+    pd.concat that keeps categoricals categorical (concat falls back to
+    object columns when the categories differ between frames).
+    """
+    for column, dtype in frames[0].dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            categories = union_categoricals([f[column] for f in frames]).categories
+            for f in frames:
+                f[column] = f[column].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_attendance_frame(prefix=REPORTS_PREFIX, columns=None, objects=None, bucket=BUCKET_NAME,
+                          batch=None, months=None):
+    """
+    All sessions as one frame, with a categorical report_key column.
+    Sessions are merged LOADER_CONCAT_CHUNK at a time as they arrive: each
+    one-report frame carries fixed overhead that dwarfs its few rows.
+    """
+    chunks = []
+    pending = []
+    for session in iter_sessions(prefix, columns=columns, objects=objects, bucket=bucket,
+                                 batch=batch, months=months):
+        frame = session["frame"]
+        frame["report_key"] = pd.Series(session["key"], index=frame.index, dtype="category")
+        pending.append(frame)
+        if len(pending) >= LOADER_CONCAT_CHUNK:
+            chunks.append(_concat_frames(pending))
+            pending = []
+    if pending:
+        chunks.append(_concat_frames(pending))
+
+    if not chunks:
+        wanted = list(columns) if columns else SESSION_COLUMNS
+        return pd.DataFrame(columns=wanted + (["present"] if "status" in wanted else []) + ["report_key"])
+    return _concat_frames(chunks) if len(chunks) > 1 else chunks[0]
+
+
+def present_names(frame):
+    """Names of the students marked present in a session frame."""
+    if "student_name" not in frame.columns:
+        return []
+    names = frame["student_name"]
+    if "present" in frame.columns:
+        names = names[frame["present"]]
+    return names.dropna().tolist()
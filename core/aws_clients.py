@@ -0,0 +1,55 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+# Load environment
+load_dotenv()
+
+AWS_REGION = os.getenv("AWS_REGION", "ap-south-1")
+AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY")
+AWS_SECRET_KEY = os.getenv("AWS_SECRET_KEY")
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_client(service, **kwargs):
+    """
+    Process-wide boto3 client, built on first use. boto3 itself is only
+    imported here, so importing a module that holds a client stays cheap.
+    """
+    options = {
+        "region_name": AWS_REGION,
+        "aws_access_key_id": AWS_ACCESS_KEY,
+        "aws_secret_access_key": AWS_SECRET_KEY,
+        **kwargs,
+    }
+    key = (service, tuple(sorted(options.items())))
+    client = _clients.get(key)
+    if client is None:
+        # boto3's default session is not safe to build clients from concurrently
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                import boto3
+                client = boto3.client(service, **options)
+                _clients[key] = client
+    return client
+
+
+class LazyClient:
+    """Stands in for a boto3 client until the first attribute is used."""
+
+    def __init__(self, service, **kwargs):
+        self._service = service
+        self._kwargs = kwargs
+
+    def __getattr__(self, name):
+        return getattr(get_client(self._service, **self._kwargs), name)
+
+    def __repr__(self):
+        return f"<LazyClient {self._service}>"
+
+
+def lazy_client(service, **kwargs):
+    return LazyClient(service, **kwargs)
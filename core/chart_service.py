@@ -0,0 +1,88 @@
+import io
+import os
+import json
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+
+CHART_CACHE_SIZE = int(os.getenv("CHART_CACHE_SIZE", "32"))
+CHART_FORMATS = ("png", "svg", "data", "none")
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_render_lock = threading.Lock()  # pyplot keeps global state
+_pyplot = None
+
+
+def _get_pyplot():
+    """Imports matplotlib on first use, with the non-interactive Agg backend."""
+    global _pyplot
+    if _pyplot is None:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        _pyplot = plt
+    return _pyplot
+
+
+def _cache_key(kind, labels, values, fmt):
+    payload = json.dumps([kind, list(labels), [float(v) for v in values], fmt])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cached(key, build):
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    value = build()
+
+    with _cache_lock:
+        _cache[key] = value
+        _cache.move_to_end(key)
+        while len(_cache) > CHART_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return value
+
+
+def _render_pie(labels, values, title, fmt):
+    with _render_lock:
+        plt = _get_pyplot()
+        fig, ax = plt.subplots(figsize=(8, 8))
+        ax.pie(values, labels=labels, autopct="%1.1f%%", startangle=140)
+        ax.set_title(title)
+        plt.tight_layout()
+        buf = io.BytesIO()
+        fig.savefig(buf, format=fmt)
+        plt.close(fig)
+
+    if fmt == "svg":
+        return buf.getvalue().decode("utf-8")
+    return base64.b64encode(buf.getvalue()).decode()
+
+
+def render_pie_chart(labels, values, title="", fmt="png"):
+    """
+    Pie chart for labels/values in the requested format:
+      png  -> base64 PNG string
+      svg  -> SVG markup
+      data -> {"labels", "values", "title"} for client-side rendering
+      none -> None
+    Rendered charts are cached by a hash of the data, so unchanged
+    summaries never pay for matplotlib again.
+    """
+    if fmt not in CHART_FORMATS:
+        raise ValueError(f"Unsupported chart format: {fmt}")
+
+    labels = [str(label) for label in labels]
+    values = [int(v) if float(v).is_integer() else float(v) for v in values]
+
+    if fmt == "none" or not values or sum(values) <= 0:
+        return None
+    if fmt == "data":
+        return {"labels": labels, "values": values, "title": title}
+
+    key = _cache_key(title, labels, values, fmt)
+    return _cached(key, lambda: _render_pie(labels, values, title, fmt))
@@ -0,0 +1,337 @@
+"""
+Incrementally maintained dashboard aggregates, stored in the shared SQLite file.
+
+Per query scope (prefix, batch, months) it keeps the reports already folded
+in plus running counters: present count per student, present students per
+day and per subject, and the session/date/student sets behind the totals.
+Folding a report only inserts its new rows (the dedup tables are keyed, so
+a session seen twice is counted once) and bumps the counters, so a refresh
+costs in proportion to the new reports and reading the summary in
+proportion to days + students + subjects, not to all history.
+"""
+import os
+import re
+import time
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+
+from core.attendance_loader import list_report_objects, iter_sessions, report_batches, REPORTS_PREFIX
+from core.report_layout import safe_part
+from core.student_index import get_connection
+
+# Load environment
+load_dotenv()
+
+DASHBOARD_RECONCILE_SECONDS = int(os.getenv("DASHBOARD_RECONCILE_SECONDS", "3600"))
+# aggregates for a batch/month combination nobody has asked for lately are dropped
+DASHBOARD_SCOPE_TTL_SECONDS = int(os.getenv("DASHBOARD_SCOPE_TTL_SECONDS", str(7 * 86400)))
+DASHBOARD_MAX_SCOPES = int(os.getenv("DASHBOARD_MAX_SCOPES", "50"))
+
+MONTH_RE = re.compile(r"^\d{4}-\d{2}$")
+
+STATE_COLUMNS = ["date", "subject", "student_name", "er_number", "status"]
+# CSV exports (download_attendance) list present students only, with no
+# absent rows, so they would skew percentages; the dashboard counts Excel
+# attendance reports only, as it always has
+DASHBOARD_REPORT_EXTENSIONS = (".xlsx",)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dashboard_scopes (
+    scope         TEXT PRIMARY KEY,
+    watermark     TEXT,
+    reconciled_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dashboard_reads (
+    scope   TEXT PRIMARY KEY,
+    read_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dashboard_reports (
+    scope      TEXT NOT NULL,
+    report_key TEXT NOT NULL,
+    etag       TEXT,
+    PRIMARY KEY (scope, report_key)
+);
+CREATE TABLE IF NOT EXISTS dashboard_sessions (
+    scope TEXT NOT NULL, date TEXT NOT NULL, subject TEXT NOT NULL,
+    PRIMARY KEY (scope, date, subject)
+);
+CREATE TABLE IF NOT EXISTS dashboard_dates (
+    scope TEXT NOT NULL, date TEXT NOT NULL,
+    PRIMARY KEY (scope, date)
+);
+CREATE TABLE IF NOT EXISTS dashboard_ers (
+    scope TEXT NOT NULL, er_number TEXT NOT NULL,
+    PRIMARY KEY (scope, er_number)
+);
+-- rowid keeps first-seen order, which breaks ties in the student list
+CREATE TABLE IF NOT EXISTS dashboard_students (
+    scope TEXT NOT NULL, student_name TEXT NOT NULL, er_number TEXT NOT NULL,
+    present INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (scope, student_name, er_number)
+);
+CREATE TABLE IF NOT EXISTS dashboard_present (
+    scope TEXT NOT NULL, date TEXT NOT NULL, subject TEXT NOT NULL,
+    student_name TEXT NOT NULL, er_number TEXT NOT NULL,
+    PRIMARY KEY (scope, date, subject, student_name, er_number)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dashboard_present_days (
+    scope TEXT NOT NULL, date TEXT NOT NULL, er_number TEXT NOT NULL,
+    PRIMARY KEY (scope, date, er_number)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dashboard_subject_present (
+    scope TEXT NOT NULL, subject TEXT NOT NULL, er_number TEXT NOT NULL,
+    PRIMARY KEY (scope, subject, er_number)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dashboard_daily (
+    scope TEXT NOT NULL, date TEXT NOT NULL, present INTEGER NOT NULL,
+    PRIMARY KEY (scope, date)
+);
+CREATE TABLE IF NOT EXISTS dashboard_subjects (
+    scope TEXT NOT NULL, subject TEXT NOT NULL, present INTEGER NOT NULL,
+    PRIMARY KEY (scope, subject)
+);
+"""
+
+SCOPE_TABLES = (
+    "dashboard_reports", "dashboard_sessions", "dashboard_dates", "dashboard_ers", "dashboard_students",
+    "dashboard_present", "dashboard_present_days", "dashboard_subject_present", "dashboard_daily",
+    "dashboard_subjects", "dashboard_scopes",
+)
+
+_scope_locks = {}
+_locks_lock = threading.Lock()
+
+
+class InvalidScope(ValueError):
+    """A dashboard query for a malformed month or a batch with no reports."""
+
+
+def _connection():
+    conn = get_connection()
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _bump(conn, table, scope, column, value):
+    conn.execute(
+        f"INSERT INTO {table} (scope, {column}, present) VALUES (?, ?, 1) "
+        f"ON CONFLICT (scope, {column}) DO UPDATE SET present = present + 1",
+        (scope, value),
+    )
+
+
+def fold_report(conn, scope, frame):
+    """Adds one report's rows to the scope's aggregates (inside the caller's transaction)."""
+    df = frame.dropna(subset=["date"])
+    if df.empty:
+        return
+
+    # categoricals cannot take "" as a fill value, so fill as plain strings
+    df = df.assign(
+        date=df["date"].dt.strftime("%Y-%m-%d"),
+        subject=df["subject"].astype("string").fillna(""),
+        student_name=df["student_name"].fillna(""),
+        er_number=df["er_number"].astype("string").fillna(""),
+    )
+
+    conn.executemany(
+        "INSERT OR IGNORE INTO dashboard_dates (scope, date) VALUES (?, ?)",
+        [(scope, d) for d in df["date"].unique().tolist()],
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO dashboard_ers (scope, er_number) VALUES (?, ?)",
+        [(scope, er) for er in df["er_number"].unique().tolist() if er],
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO dashboard_sessions (scope, date, subject) VALUES (?, ?, ?)",
+        [(scope, d, s) for d, s in dict.fromkeys(zip(df["date"], df["subject"]))],
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO dashboard_students (scope, student_name, er_number) VALUES (?, ?, ?)",
+        [(scope, name, er) for name, er in dict.fromkeys(zip(df["student_name"], df["er_number"]))],
+    )
+
+    present_df = df[df["present"]].drop_duplicates(["date", "subject", "student_name", "er_number"])
+    for date, subject, name, er in zip(present_df["date"], present_df["subject"],
+                                       present_df["student_name"], present_df["er_number"]):
+        new = conn.execute(
+            "INSERT OR IGNORE INTO dashboard_present (scope, date, subject, student_name, er_number) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (scope, date, subject, name, er),
+        ).rowcount
+        if not new:
+            continue
+        conn.execute(
+            "UPDATE dashboard_students SET present = present + 1 "
+            "WHERE scope = ? AND student_name = ? AND er_number = ?",
+            (scope, name, er),
+        )
+        if conn.execute(
+            "INSERT OR IGNORE INTO dashboard_present_days (scope, date, er_number) VALUES (?, ?, ?)",
+            (scope, date, er),
+        ).rowcount:
+            _bump(conn, "dashboard_daily", scope, "date", date)
+        if conn.execute(
+            "INSERT OR IGNORE INTO dashboard_subject_present (scope, subject, er_number) VALUES (?, ?, ?)",
+            (scope, subject, er),
+        ).rowcount:
+            _bump(conn, "dashboard_subjects", scope, "subject", subject)
+
+
+def _reset(conn, scope):
+    with conn:
+        for table in SCOPE_TABLES:
+            conn.execute(f"DELETE FROM {table} WHERE scope = ?", (scope,))
+        conn.execute(
+            "INSERT INTO dashboard_scopes (scope, watermark, reconciled_at) VALUES (?, NULL, ?)",
+            (scope, time.time()),
+        )
+
+
+def _etag(obj):
+    return (obj.get("ETag") or "").strip('"')
+
+
+def _needs_reconcile(meta, processed, listed):
+    """Deleted or overwritten reports, or a stale state, force a full rebuild."""
+    if meta is None or time.time() - meta["reconciled_at"] > DASHBOARD_RECONCILE_SECONDS:
+        return True
+    for key, etag in processed.items():
+        if listed.get(key) != etag:
+            return True
+    return False
+
+
+def summary(conn, scope):
+    """The aggregates generate_overall_attendance needs, read from the counters."""
+    def one(query):
+        return conn.execute(query, (scope,)).fetchone()[0]
+
+    watermark = one("SELECT watermark FROM dashboard_scopes WHERE scope = ?")
+    return {
+        "watermark": datetime.fromisoformat(watermark) if watermark else None,
+        "total_classes": one("SELECT COUNT(*) FROM dashboard_sessions WHERE scope = ?"),
+        "total_days": one("SELECT COUNT(*) FROM dashboard_dates WHERE scope = ?"),
+        "total_students": one("SELECT COUNT(*) FROM dashboard_ers WHERE scope = ?"),
+        "present_days": one("SELECT COALESCE(SUM(present), 0) FROM dashboard_daily WHERE scope = ?"),
+        # (name, er_number, present count) in first-seen order
+        "students": [tuple(r) for r in conn.execute(
+            "SELECT student_name, er_number, present FROM dashboard_students WHERE scope = ? ORDER BY rowid",
+            (scope,),
+        )],
+        "daily_present": [tuple(r) for r in conn.execute(
+            "SELECT date, present FROM dashboard_daily WHERE scope = ? ORDER BY date", (scope,)
+        )],
+        "subject_present": [tuple(r) for r in conn.execute(
+            "SELECT subject, present FROM dashboard_subjects WHERE scope = ? ORDER BY rowid", (scope,)
+        )],
+    }
+
+
+def _validate_scope(batch, months):
+    for month in months or ():
+        if not MONTH_RE.match(month):
+            raise InvalidScope(f"month must look like YYYY-MM, got {month!r}")
+    if batch and safe_part(batch) not in report_batches():
+        raise InvalidScope(f"Unknown batch {batch!r}")
+
+
+def _scope_lock(scope):
+    with _locks_lock:
+        return _scope_locks.setdefault(scope, threading.Lock())
+
+
+def _expire_scopes(conn, keep):
+    """Drops scopes nobody read within DASHBOARD_SCOPE_TTL_SECONDS, and the least
+    recently read ones beyond DASHBOARD_MAX_SCOPES."""
+    cutoff = time.time() - DASHBOARD_SCOPE_TTL_SECONDS
+    expired = {r[0] for r in conn.execute(
+        "SELECT s.scope FROM dashboard_scopes s LEFT JOIN dashboard_reads r ON r.scope = s.scope "
+        "WHERE s.scope != ? AND (r.read_at IS NULL OR r.read_at < ?)",
+        (keep, cutoff),
+    )}
+    expired.update(r[0] for r in conn.execute(
+        "SELECT scope FROM dashboard_reads WHERE scope != ? ORDER BY read_at DESC LIMIT -1 OFFSET ?",
+        (keep, max(0, DASHBOARD_MAX_SCOPES - 1)),
+    ))
+    for scope in expired:
+        with _scope_lock(scope):
+            with conn:
+                for table in SCOPE_TABLES + ("dashboard_reads",):
+                    conn.execute(f"DELETE FROM {table} WHERE scope = ?", (scope,))
+        with _locks_lock:
+            _scope_locks.pop(scope, None)
+
+
+def refresh_state(prefix=REPORTS_PREFIX, batch=None, months=None, incremental=True):
+    """
+    Returns (summary, objects) for a query, folding in only reports that
+    are newer than the stored watermark (or not yet processed).
+    incremental=False rebuilds the scope from scratch. Raises InvalidScope
+    for a malformed month or a batch with no reports.
+    """
+    _validate_scope(batch, months)
+    scope = repr((prefix, safe_part(batch) if batch else None, tuple(sorted(set(months or ())))))
+    objects = [
+        obj for obj in list_report_objects(prefix, batch=batch, months=months)
+        if obj["Key"].lower().endswith(DASHBOARD_REPORT_EXTENSIONS)
+    ]
+    listed = {obj["Key"]: _etag(obj) for obj in objects}
+
+    conn = _connection()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO dashboard_reads (scope, read_at) VALUES (?, ?)", (scope, time.time())
+        )
+    _expire_scopes(conn, scope)
+
+    # the lock covers reading/resetting the state and each fold, never the downloads
+    lock = _scope_lock(scope)
+    with lock:
+        meta = conn.execute(
+            "SELECT watermark, reconciled_at FROM dashboard_scopes WHERE scope = ?", (scope,)
+        ).fetchone()
+        processed = dict(conn.execute(
+            "SELECT report_key, etag FROM dashboard_reports WHERE scope = ?", (scope,)
+        ).fetchall())
+        if not incremental or _needs_reconcile(meta, processed, listed):
+            _reset(conn, scope)
+            processed = {}
+
+    # everything at or before the watermark is already folded in (overwrites
+    # and deletions were caught above), so only newer/unseen keys remain
+    pending = [obj for obj in objects if obj["Key"] not in processed]
+    for session in iter_sessions(prefix, columns=STATE_COLUMNS, objects=pending):
+        with lock:
+            _fold_session(conn, scope, session)
+
+    return summary(conn, scope), objects
+
+
+def _fold_session(conn, scope, session):
+    # one transaction per report; another request or worker may have folded it meanwhile
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if conn.execute(
+            "SELECT 1 FROM dashboard_reports WHERE scope = ? AND report_key = ?",
+            (scope, session["key"]),
+        ).fetchone() is None:
+            fold_report(conn, scope, session["frame"])
+            conn.execute(
+                "INSERT INTO dashboard_reports (scope, report_key, etag) VALUES (?, ?, ?)",
+                (scope, session["key"], session["etag"]),
+            )
+            modified = session["last_modified"]
+            watermark = conn.execute(
+                "SELECT watermark FROM dashboard_scopes WHERE scope = ?", (scope,)
+            ).fetchone()[0]
+            if modified is not None and (watermark is None or modified > datetime.fromisoformat(watermark)):
+                conn.execute(
+                    "UPDATE dashboard_scopes SET watermark = ? WHERE scope = ?",
+                    (modified.isoformat(), scope),
+                )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
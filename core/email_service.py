@@ -1,26 +1,18 @@
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
 import logging
+from core.mailer import get_mailer
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def send_low_attendance_email(student_email, student_name, percentage, course_name="Course"):
+def build_low_attendance_email(student_email, student_name, percentage, course_name="Course", sender_email=None):
     """
-    Sends a low attendance warning email to the student.
+    Builds the low attendance warning email for a student.
     """
-    sender_email = os.getenv("MAIL_USERNAME")
-    sender_password = os.getenv("MAIL_PASSWORD")
-    smtp_server = os.getenv("MAIL_SERVER", "smtp.gmail.com")
-    smtp_port = int(os.getenv("MAIL_PORT", 587))
-
-    if not sender_email or not sender_password:
-        logger.warning("❌ Email credentials not set in .env. Skipping email dispatch.")
-        return False
-
+    sender_email = sender_email or os.getenv("MAIL_USERNAME")
     subject = f"⚠️ Low Attendance Warning: {int(percentage)}%"
     
     html_content = f"""
@@ -52,15 +44,106 @@ def send_low_attendance_email(student_email, student_name, percentage, course_na
     msg["To"] = student_email
     msg["Subject"] = subject
     msg.attach(MIMEText(html_content, "html"))
+    return msg
+
+
+def build_low_attendance_digest(student_email, student_name, subjects, sender_email=None):
+    """
+    Builds one warning email covering every subject a student is low in.
+    `subjects` are dicts with course, percentage and threshold.
+    """
+    sender_email = sender_email or os.getenv("MAIL_USERNAME")
+    lowest = min(s["percentage"] for s in subjects)
+    subject = f"⚠️ Low Attendance Warning: {int(lowest)}%"
+
+    rows = "".join(
+        f"""
+                <tr>
+                    <td style="padding: 8px; border-bottom: 1px solid #eee;">{s['course']}</td>
+                    <td style="padding: 8px; border-bottom: 1px solid #eee; color: #d9534f; text-align: right;"><strong>{s['percentage']}%</strong></td>
+                    <td style="padding: 8px; border-bottom: 1px solid #eee; color: #777; text-align: right;">{s['threshold']:g}%</td>
+                </tr>"""
+        for s in subjects
+    )
+    html_content = f"""
+    <html>
+    <body style="font-family: Arial, sans-serif; color: #333;">
+        <div style="max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #ddd; border-radius: 8px;">
+            <h2 style="color: #d9534f;">Low Attendance Alert</h2>
+            <p>Dear <strong>{student_name}</strong>,</p>
+            <p>This is an automated alert to inform you that your attendance has dropped below the required threshold in:</p>
+
+            <table style="width: 100%; border-collapse: collapse; background-color: #f9f9f9; border-radius: 5px; margin: 20px 0;">
+                <tr>
+                    <th style="padding: 8px; text-align: left;">Course</th>
+                    <th style="padding: 8px; text-align: right;">Attendance</th>
+                    <th style="padding: 8px; text-align: right;">Threshold</th>
+                </tr>{rows}
+            </table>
+
+            <p>Please ensure you attend upcoming classes to avoid any academic penalties.</p>
+            <p>If you believe this is an error, please contact your faculty immediately.</p>
+            
+            <hr style="border: none; border-top: 1px solid #eee; margin: 20px 0;">
+            <p style="font-size: 12px; color: #999;">Attendance System Automated Message</p>
+        </div>
+    </body>
+    </html>
+    """
+
+    msg = MIMEMultipart()
+    msg["From"] = sender_email
+    msg["To"] = student_email
+    msg["Subject"] = subject
+    msg.attach(MIMEText(html_content, "html"))
+    return msg
+
 
-    try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        server.sendmail(sender_email, student_email, msg.as_string())
-        server.quit()
+def send_low_attendance_email(student_email, student_name, percentage, course_name="Course"):
+    """
+    Sends a low attendance warning email to the student.
+    """
+    if not mail_configured():
+        logger.warning("❌ Email credentials not set in .env. Skipping email dispatch.")
+        return False
+
+    msg = build_low_attendance_email(student_email, student_name, percentage, course_name)
+    outcome = get_mailer().send(msg)
+    if outcome["status"] == "sent":
         logger.info(f"✅ Email sent successfully to {student_email}")
         return True
-    except Exception as e:
-        logger.error(f"❌ Failed to send email to {student_email}: {e}")
+    return False
+
+
+def send_low_attendance_emails(alerts):
+    """
+    Sends many warnings over the pooled mailer.
+    `alerts` are dicts with email, name and either percentage plus optional
+    course, or a `subjects` list for one digest email (see
+    build_low_attendance_digest).
+    Returns one outcome dict per alert (see SMTPMailer.send).
+    """
+    if not mail_configured():
+        logger.warning("❌ Email credentials not set in .env. Skipping email dispatch.")
+        return [
+            {"recipient": a["email"], "status": "skipped", "attempts": 0, "error": "mail not configured"}
+            for a in alerts
+        ]
+
+    messages = [
+        build_low_attendance_digest(a["email"], a["name"], a["subjects"]) if a.get("subjects")
+        else build_low_attendance_email(a["email"], a["name"], a["percentage"], a.get("course", "Course"))
+        for a in alerts
+    ]
+    outcomes = get_mailer().send_batch(messages)
+    sent = sum(1 for o in outcomes if o["status"] == "sent")
+    logger.info(f"✅ Sent {sent}/{len(outcomes)} low attendance emails")
+    return outcomes
+
+
+def mail_configured():
+    """A sender is required; a password too unless talking to a plain local relay."""
+    mailer = get_mailer()
+    if not mailer.username:
         return False
+    return bool(mailer.password) or not mailer.use_tls
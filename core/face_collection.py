@@ -0,0 +1,306 @@
+"""
+Rekognition face collections for student photos.
+
+Every indexed face is recorded locally (face ID -> student, photo key and
+the photo's ETag), so:
+  - a photo whose ETag has not changed is not indexed again,
+  - a replaced photo's old faces are deleted from the collection,
+  - faces whose photo is gone are pruned on re-index.
+
+By default everything goes into FACE_COLLECTION_ID as before. With
+FACE_COLLECTION_PER_BATCH=true each batch gets its own collection,
+FACE_COLLECTION_PREFIX + batch.
+
+    python -m core.face_collection --reindex                 # every batch
+    python -m core.face_collection --reindex --batch 2022-2026 --workers 8
+    python -m core.face_collection --stats
+"""
+import os
+import re
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from core.aws_clients import get_client
+from core.student_index import get_connection
+from core.storage import get_storage
+from core.rate_limiter import get_limiter
+
+# Load environment
+load_dotenv()
+
+AWS_REGION = os.getenv("AWS_REGION", "ap-south-1")
+FACE_COLLECTION_ID = os.getenv("FACE_COLLECTION_ID", "students")
+FACE_COLLECTION_PREFIX = os.getenv("FACE_COLLECTION_PREFIX", "students-")
+FACE_COLLECTION_PER_BATCH = os.getenv("FACE_COLLECTION_PER_BATCH", "false").lower() in ("1", "true", "yes")
+FACE_INDEX_WORKERS = int(os.getenv("FACE_INDEX_WORKERS", "8"))
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+# top-level prefixes that hold app data rather than batches of photos
+NON_BATCH_PREFIXES = {"reports/", "exports/"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS faces (
+    face_id       TEXT PRIMARY KEY,
+    collection_id TEXT NOT NULL,
+    image_key     TEXT NOT NULL,
+    etag          TEXT NOT NULL,
+    er_number     TEXT NOT NULL,
+    student_name  TEXT,
+    batch         TEXT,
+    indexed_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_faces_image ON faces (collection_id, image_key);
+CREATE INDEX IF NOT EXISTS idx_faces_er ON faces (er_number);
+CREATE TABLE IF NOT EXISTS faceless_images (
+    collection_id TEXT NOT NULL,
+    image_key     TEXT NOT NULL,
+    etag          TEXT NOT NULL,
+    PRIMARY KEY (collection_id, image_key)
+);
+"""
+
+_collections = set()
+_collections_lock = threading.Lock()
+
+
+def _connection():
+    conn = get_connection()
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def collection_for_batch(batch):
+    if not FACE_COLLECTION_PER_BATCH or not batch:
+        return FACE_COLLECTION_ID
+    # collection IDs allow [a-zA-Z0-9_.-]
+    return FACE_COLLECTION_PREFIX + re.sub(r"[^a-zA-Z0-9_.\-]", "_", batch)
+
+
+def _rekognition(region=AWS_REGION):
+    return get_client("rekognition", region_name=region)
+
+
+def ensure_collection(collection_id, region=AWS_REGION):
+    """Creates the collection unless this process already knows it exists."""
+    with _collections_lock:
+        if collection_id in _collections:
+            return
+    rekognition = _rekognition(region)
+    try:
+        rekognition.create_collection(CollectionId=collection_id)
+        print(f"✅ Rekognition Collection '{collection_id}' created")
+    except Exception as e:
+        if getattr(e, "response", {}).get("Error", {}).get("Code") != "ResourceAlreadyExistsException":
+            raise
+    with _collections_lock:
+        _collections.add(collection_id)
+
+
+def _is_missing_collection(error):
+    return getattr(error, "response", {}).get("Error", {}).get("Code") == "ResourceNotFoundException"
+
+
+def _delete_faces(collection_id, face_ids, region=AWS_REGION):
+    if not face_ids:
+        return
+    rekognition = _rekognition(region)
+    limiter = get_limiter("rekognition.delete_faces")
+    face_ids = list(face_ids)
+    try:
+        # DeleteFaces takes at most 4096 IDs per call
+        for start in range(0, len(face_ids), 4096):
+            limiter.call(rekognition.delete_faces, CollectionId=collection_id,
+                         FaceIds=face_ids[start:start + 4096])
+    except Exception as e:
+        if not _is_missing_collection(e):
+            raise
+    conn = _connection()
+    with conn:
+        conn.executemany("DELETE FROM faces WHERE face_id = ?", [(f,) for f in face_ids])
+
+
+def index_student_image(image_key, er_number, student_name, batch=None, etag=None,
+                        collection_id=None, region=AWS_REGION, force=False):
+    """
+    Indexes the face in one student photo, replacing faces from an earlier
+    version of the same photo. Returns {"state": "indexed" | "unchanged" |
+    "no_face", "face_ids": [...], "removed": n}.
+    """
+    batch = batch if batch is not None else os.path.dirname(image_key)
+    collection_id = collection_id or collection_for_batch(batch)
+    if etag is None:
+        etag = get_storage().head(image_key).get("ETag")
+    etag = (etag or "").strip('"')
+
+    conn = _connection()
+    existing = conn.execute(
+        "SELECT face_id, etag FROM faces WHERE collection_id = ? AND image_key = ?",
+        (collection_id, image_key),
+    ).fetchall()
+    if not force:
+        if existing and all(r["etag"] == etag for r in existing):
+            return {"state": "unchanged", "face_ids": [r["face_id"] for r in existing], "removed": 0}
+        faceless = conn.execute(
+            "SELECT etag FROM faceless_images WHERE collection_id = ? AND image_key = ?",
+            (collection_id, image_key),
+        ).fetchone()
+        if not existing and faceless is not None and faceless["etag"] == etag:
+            return {"state": "no_face", "face_ids": [], "removed": 0}
+
+    rekognition = _rekognition(region)
+    external_id = f"{er_number}_{student_name.replace(' ', '_')}"
+    request = dict(
+        CollectionId=collection_id,
+        Image={"S3Object": {"Bucket": get_storage().bucket, "Name": image_key}},
+        ExternalImageId=external_id,
+        # one student per photo: keep only the largest face
+        MaxFaces=1,
+        QualityFilter="AUTO",
+        DetectionAttributes=["DEFAULT"],
+    )
+    limiter = get_limiter("rekognition.index_faces")
+    ensure_collection(collection_id, region)
+    try:
+        response = limiter.call(rekognition.index_faces, **request)
+    except Exception as e:
+        if not _is_missing_collection(e):
+            raise
+        # deleted behind our back: recreate once
+        with _collections_lock:
+            _collections.discard(collection_id)
+        ensure_collection(collection_id, region)
+        response = limiter.call(rekognition.index_faces, **request)
+
+    face_ids = [r["Face"]["FaceId"] for r in response.get("FaceRecords", [])]
+    now = time.time()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO faces "
+            "(face_id, collection_id, image_key, etag, er_number, student_name, batch, indexed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(f, collection_id, image_key, etag, er_number, student_name, batch, now) for f in face_ids],
+        )
+        if face_ids:
+            conn.execute(
+                "DELETE FROM faceless_images WHERE collection_id = ? AND image_key = ?",
+                (collection_id, image_key),
+            )
+        else:
+            conn.execute(
+                "INSERT OR REPLACE INTO faceless_images (collection_id, image_key, etag) VALUES (?, ?, ?)",
+                (collection_id, image_key, etag),
+            )
+
+    # faces from the previous version of this photo
+    superseded = [r["face_id"] for r in existing if r["face_id"] not in face_ids]
+    _delete_faces(collection_id, superseded, region)
+
+    if face_ids:
+        print(f"✅ Rekognition Indexed: {external_id} ({image_key})")
+    else:
+        print(f"⚠️ No face detected in {image_key}")
+    return {"state": "indexed" if face_ids else "no_face", "face_ids": face_ids, "removed": len(superseded)}
+
+
+def face_owner(face_id):
+    """The student a face ID belongs to, e.g. for search_faces results."""
+    conn = _connection()
+    row = conn.execute(
+        "SELECT er_number, student_name, batch, image_key, collection_id FROM faces WHERE face_id = ?",
+        (face_id,),
+    ).fetchone()
+    return dict(row) if row is not None else None
+
+
+def list_batches():
+    """Top-level prefixes that hold student photos."""
+    batches = []
+    for page in get_storage().list_pages("", delimiter="/"):
+        for prefix in page.get("CommonPrefixes", []) or []:
+            if prefix["Prefix"] not in NON_BATCH_PREFIXES:
+                batches.append(prefix["Prefix"].rstrip("/"))
+    return batches
+
+
+def _student_from_key(key):
+    # <batch>/<er_number>_<name>_<n>.<ext>
+    name_part = os.path.splitext(os.path.basename(key))[0]
+    er_number, _, rest = name_part.partition("_")
+    name = re.sub(r"_\d+$", "", rest).replace("_", " ").strip()
+    return er_number.strip(), name or er_number.strip()
+
+
+def reindex(batches=None, workers=FACE_INDEX_WORKERS, force=False, region=AWS_REGION):
+    """
+    Brings the collections in line with the photos in storage: indexes new
+    or changed photos in parallel, skips unchanged ones and deletes faces
+    whose photo was removed. Returns counts per batch.
+    """
+    storage = get_storage()
+    summary = {}
+    for batch in batches or list_batches():
+        collection_id = collection_for_batch(batch)
+        images = [
+            obj for obj in storage.list_objects(f"{batch}/")
+            if obj["Key"].lower().endswith(IMAGE_EXTENSIONS)
+        ]
+
+        def index(obj):
+            er_number, name = _student_from_key(obj["Key"])
+            try:
+                return index_student_image(obj["Key"], er_number, name, batch=batch, etag=obj.get("ETag"),
+                                           collection_id=collection_id, region=region, force=force)["state"]
+            except Exception as e:
+                print(f"❌ Could not index {obj['Key']}: {e}")
+                return "error"
+
+        counts = {"indexed": 0, "unchanged": 0, "no_face": 0, "error": 0, "pruned": 0}
+        # the shared rate limiter keeps the workers within the account quota
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for state in pool.map(index, images):
+                counts[state] += 1
+
+        # faces whose photo no longer exists
+        present = {obj["Key"] for obj in images}
+        conn = _connection()
+        stale = [
+            r["face_id"] for r in conn.execute(
+                "SELECT face_id, image_key FROM faces WHERE collection_id = ?", (collection_id,)
+            )
+            if r["image_key"] not in present
+        ]
+        _delete_faces(collection_id, stale, region)
+        counts["pruned"] = len(stale)
+
+        summary[batch] = counts
+        print(f"✅ {batch} -> {collection_id}: {counts}")
+    return summary
+
+
+def collection_stats():
+    conn = _connection()
+    return {
+        row["collection_id"]: {"faces": row["faces"], "images": row["images"], "students": row["students"]}
+        for row in conn.execute(
+            "SELECT collection_id, COUNT(*) AS faces, COUNT(DISTINCT image_key) AS images, "
+            "COUNT(DISTINCT er_number) AS students FROM faces GROUP BY collection_id"
+        )
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage Rekognition face collections.")
+    parser.add_argument("--reindex", action="store_true", help="index new/changed photos and prune removed ones")
+    parser.add_argument("--batch", action="append", help="limit to a batch (repeatable)")
+    parser.add_argument("--workers", type=int, default=FACE_INDEX_WORKERS)
+    parser.add_argument("--force", action="store_true", help="re-index even unchanged photos")
+    parser.add_argument("--stats", action="store_true")
+    args = parser.parse_args()
+
+    if args.reindex:
+        reindex(args.batch, workers=args.workers, force=args.force)
+    if args.stats or not args.reindex:
+        print(collection_stats())
@@ -0,0 +1,145 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, make_response
+from dotenv import load_dotenv
+
+# Load environment
+load_dotenv()
+
+# how long a computed version token is trusted before listing S3 again
+VERSION_TTL_SECONDS = float(os.getenv("HTTP_VERSION_TTL_SECONDS", "5"))
+# how long a rendered response is reused for the same version token
+RESPONSE_MEMO_SECONDS = float(os.getenv("HTTP_RESPONSE_MEMO_SECONDS", "60"))
+RESPONSE_MEMO_SIZE = int(os.getenv("HTTP_RESPONSE_MEMO_SIZE", "128"))
+STUDENTS_KEY = "students.xlsx"
+
+_versions = {}
+_memo = OrderedDict()
+_lock = threading.Lock()
+
+
+def _remember(key, compute):
+    now = time.monotonic()
+    with _lock:
+        cached = _versions.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+    value = compute()
+    with _lock:
+        _versions[key] = (now + VERSION_TTL_SECONDS, value)
+    return value
+
+
+def reports_version(batch=None, months=None):
+    """(token, last_modified) of the report set for a batch/month query."""
+    from core.attendance_loader import list_report_objects
+
+    def compute():
+        digest = hashlib.sha1()
+        newest = None
+        count = 0
+        for obj in sorted(list_report_objects(batch=batch, months=months), key=lambda o: o["Key"]):
+            digest.update(f"{obj['Key']}\0{obj.get('ETag', '')}\n".encode("utf-8"))
+            count += 1
+            if newest is None or obj["LastModified"] > newest:
+                newest = obj["LastModified"]
+        return f"r{count}-{digest.hexdigest()[:16]}", newest
+
+    return _remember(("reports", batch, tuple(sorted(months or ()))), compute)
+
+
+def students_version():
+    """(token, last_modified) of the master students.xlsx."""
+    def compute():
+        # the roster revalidates its ETag itself, and the view needs it anyway
+        from core.roster import get_roster
+        roster = get_roster(STUDENTS_KEY)
+        return f"s-{roster.etag}", roster.last_modified
+
+    return _remember(("students",), compute)
+
+
+def request_reports_version():
+    return reports_version(request.args.get("batch"), request.args.getlist("month"))
+
+
+def combine_versions(*version_fns):
+    """Version of a response that depends on several sources."""
+    def version():
+        parts = [fn() for fn in version_fns]
+        token = hashlib.sha1("|".join(p[0] for p in parts).encode("utf-8")).hexdigest()[:20]
+        stamps = [p[1] for p in parts if p[1] is not None]
+        return token, max(stamps) if stamps else None
+    return version
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def _tag(response, etag, last_modified):
+    # weak: the same payload may be sent gzip/br encoded
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def conditional(version_fn):
+    """
+    Decorator for GET endpoints whose payload only depends on `version_fn()`.
+    Answers If-None-Match / If-Modified-Since with 304 and reuses the
+    rendered response for the same URL and version for a short while.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                etag, last_modified = version_fn()
+            except Exception as e:
+                print(f"⚠️ Could not compute version for {request.path}: {e}")
+                return view(*args, **kwargs)
+
+            if _not_modified(etag, last_modified):
+                return _tag(make_response("", 304), etag, last_modified)
+
+            memo_key = (request.full_path, etag)
+            now = time.monotonic()
+            with _lock:
+                cached = _memo.get(memo_key)
+                if cached and cached[0] > now:
+                    _memo.move_to_end(memo_key)
+                    body, status, mimetype = cached[1]
+                    return _tag(make_response(body, status, {"Content-Type": mimetype}), etag, last_modified)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+            if not response.is_streamed:
+                with _lock:
+                    _memo[memo_key] = (now + RESPONSE_MEMO_SECONDS,
+                                       (response.get_data(), response.status_code, response.content_type))
+                    while len(_memo) > RESPONSE_MEMO_SIZE:
+                        _memo.popitem(last=False)
+
+            return _tag(response, etag, last_modified)
+        return wrapper
+    return decorator
+
+
+def clear_memo():
+    """Drops cached versions and responses (e.g. right after writing a report)."""
+    with _lock:
+        _versions.clear()
+        _memo.clear()
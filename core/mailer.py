@@ -0,0 +1,172 @@
+import os
+import time
+import queue
+import socket
+import smtplib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+# Load environment
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# errors worth retrying on a fresh connection
+TRANSIENT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, socket.timeout, ConnectionError)
+
+
+class SMTPMailer:
+    """
+    Sends mail over a small pool of authenticated SMTP connections.
+
+    Connections are opened lazily (connect + STARTTLS + login once) and
+    reused across messages; sends are rate limited across all threads and
+    transient failures are retried with backoff on a new connection.
+    """
+
+    def __init__(self, host=None, port=None, username=None, password=None, use_tls=None,
+                 pool_size=None, rate_per_second=None, max_retries=None, timeout=30):
+        self.host = host or os.getenv("MAIL_SERVER", "smtp.gmail.com")
+        self.port = int(port or os.getenv("MAIL_PORT", 587))
+        self.username = username if username is not None else os.getenv("MAIL_USERNAME")
+        self.password = password if password is not None else os.getenv("MAIL_PASSWORD")
+        if use_tls is None:
+            use_tls = os.getenv("MAIL_USE_TLS", "true").lower() in ("1", "true", "yes")
+        self.use_tls = use_tls
+        self.pool_size = max(1, int(pool_size or os.getenv("MAIL_POOL_SIZE", 3)))
+        self.rate_per_second = float(rate_per_second or os.getenv("MAIL_RATE_PER_SECOND", 5))
+        self.max_retries = int(max_retries if max_retries is not None else os.getenv("MAIL_MAX_RETRIES", 3))
+        self.timeout = timeout
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        self._rate_lock = threading.Lock()
+        self._next_send = 0.0
+
+    # ---------------- connections ----------------
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            server.starttls()
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        return server
+
+    def _checkout(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _checkin(self, server, broken=False):
+        if broken:
+            try:
+                server.close()
+            except Exception:
+                pass
+        else:
+            self._idle.put(server)
+        self._slots.release()
+
+    def close(self):
+        """Closes all idle connections."""
+        while True:
+            try:
+                server = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                server.quit()
+            except Exception:
+                server.close()
+
+    # ---------------- sending ----------------
+
+    def _throttle(self):
+        if self.rate_per_second <= 0:
+            return
+        with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_send - now
+            self._next_send = max(now, self._next_send) + 1.0 / self.rate_per_second
+        if wait > 0:
+            time.sleep(wait)
+
+    def send(self, message):
+        """
+        Sends one email.message.Message. Returns an outcome dict:
+        {"recipient", "status": "sent" | "failed", "attempts", "error"}.
+        """
+        recipient = message["To"]
+        sender = message["From"] or self.username
+        outcome = {"recipient": recipient, "status": "failed", "attempts": 0, "error": None}
+
+        for attempt in range(1, self.max_retries + 2):
+            outcome["attempts"] = attempt
+            self._throttle()
+            try:
+                server = self._checkout()
+            except Exception as e:
+                outcome["error"] = str(e)
+                if not isinstance(e, TRANSIENT_ERRORS + (OSError,)):
+                    break
+                time.sleep(min(2 ** (attempt - 1), 10))
+                continue
+
+            try:
+                server.sendmail(sender, [recipient], message.as_string())
+                self._checkin(server)
+                outcome.update(status="sent", error=None)
+                return outcome
+            except smtplib.SMTPRecipientsRefused as e:
+                self._checkin(server)
+                outcome["error"] = str(e.recipients)
+                break
+            except TRANSIENT_ERRORS as e:
+                self._checkin(server, broken=True)
+                outcome["error"] = str(e)
+                time.sleep(min(2 ** (attempt - 1), 10))
+            except smtplib.SMTPResponseException as e:
+                # 4xx = try again later, 5xx = permanent
+                self._checkin(server)
+                outcome["error"] = f"{e.smtp_code} {e.smtp_error!r}"
+                if not 400 <= e.smtp_code < 500:
+                    break
+                time.sleep(min(2 ** (attempt - 1), 10))
+            except Exception as e:
+                self._checkin(server, broken=True)
+                outcome["error"] = str(e)
+                break
+
+        logger.error(f"❌ Failed to send email to {recipient}: {outcome['error']}")
+        return outcome
+
+    def send_batch(self, messages):
+        """Sends messages across the connection pool; outcomes are in input order."""
+        messages = list(messages)
+        if not messages:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.pool_size, len(messages))) as executor:
+            return list(executor.map(self.send, messages))
+
+
+_mailer = None
+_mailer_lock = threading.Lock()
+
+
+def get_mailer():
+    """Process-wide mailer so connections are shared between requests."""
+    global _mailer
+    with _mailer_lock:
+        if _mailer is None:
+            _mailer = SMTPMailer()
+        return _mailer
@@ -1,27 +1,34 @@
-import boto3
 import os
 from datetime import datetime
 from openpyxl import Workbook
+from core.aws_clients import get_client
+from core.storage import get_storage, BUCKET_NAME
+from core.report_layout import report_key
+from core.student_index import index_report
+from core.timings import StageTimer
+from core.upload_queue import queue_upload
+from core.recognition_cache import image_digest, lookup_matches, store_matches
+from core.rate_limiter import get_limiter, RateLimitExceeded
+from core.recognition_scheduler import get_scheduler
 
-# Get individual student image bytes from S3
-def get_photo_bytes_from_s3(bucket, key):
-    s3 = boto3.client('s3')
-    response = s3.get_object(Bucket=bucket, Key=key)
-    return response['Body'].read()
+SIMILARITY_THRESHOLD = 80
+
+# Get individual student image bytes from S3 (ETag/Size from the listing let the hot tier answer)
+def get_photo_bytes_from_s3(bucket, key, etag=None, size=None):
+    return get_storage(bucket).get_bytes(key, etag=etag, size=size)
+
+# List all student image objects (Key, ETag) in a batch
+def list_student_image_objects(bucket, batch_prefix):
+    images = []
+    for obj in get_storage(bucket).list_objects(batch_prefix):
+        key = obj['Key']
+        if key.lower().endswith(('.jpg', '.jpeg', '.png')) and key != batch_prefix:
+            images.append(obj)
+    return images
 
 # List all student image keys in a batch
 def list_student_images_from_s3(bucket, batch_prefix):
-    s3 = boto3.client('s3')
-    paginator = s3.get_paginator('list_objects_v2')
-    page_iterator = paginator.paginate(Bucket=bucket, Prefix=batch_prefix)
-
-    image_keys = []
-    for page in page_iterator:
-        for obj in page.get('Contents', []):
-            key = obj['Key']
-            if key.lower().endswith(('.jpg', '.jpeg', '.png')) and key != batch_prefix:
-                image_keys.append(key)
-    return image_keys
+    return [obj['Key'] for obj in list_student_image_objects(bucket, batch_prefix)]
 
 # Extract ER number and student name from file name safely
 def extract_student_details_from_key(key):
@@ -37,8 +44,10 @@ def extract_student_details_from_key(key):
     # Fallback if no underscore or malformed filename
     return name_part.strip(), name_part.strip()
 
-# Save attendance to Excel and upload to S3
-def save_attendance_to_excel(attendance_data, absent_data, batch_name, class_name, subject, s3_bucket, region):
+# Save attendance to Excel and queue it for upload to S3
+def save_attendance_to_excel(attendance_data, absent_data, batch_name, class_name, subject, s3_bucket, region,
+                             timer=None, upload=None):
+    timer = timer or StageTimer("save_attendance_to_excel")
     now = datetime.now()
     current_date = now.strftime("%Y%m%d")  
     current_time = now.strftime("%H%M%S")  # ✅ Unique per attendance
@@ -55,92 +64,204 @@ def save_attendance_to_excel(attendance_data, absent_data, batch_name, class_nam
     os.makedirs(save_dir, exist_ok=True)
     filepath = os.path.join(save_dir, filename)
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Attendance"
-
-    # Header row
-    ws.append(["ER Number", "Student Name", "Date", "Time", "Class", "Subject", "Batch", "Status"])
-
-    # ✅ Present students
-    for student in attendance_data:
-        ws.append([
-            student["er_number"],
-            student["name"],
-            now.strftime("%d-%m-%Y"),
-            now.strftime("%H:%M:%S"),
-            class_name,
-            subject,
-            batch_name,
-            "Present"
-        ])
-
-    # ✅ Absent students
-    for student in absent_data:
-        ws.append([
-            student["er_number"],
-            student["name"],
-            now.strftime("%d-%m-%Y"),
-            now.strftime("%H:%M:%S"),
-            class_name,
-            subject,
-            batch_name,
-            "Absent"
-        ])
-
-    wb.save(filepath)
-
-    # ✅ Upload to S3
-    s3 = boto3.client("s3", region_name=region)
-    s3_key = f"reports/{filename}"
-    s3.upload_file(filepath, s3_bucket, s3_key)
-
-    # ✅ Return public file URL
-    file_url = f"https://{s3_bucket}.s3.{region}.amazonaws.com/{s3_key}"
-    return filepath, file_url
+    # write-only workbook streams rows straight to the file
+    with timer.stage("write_excel"):
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title="Attendance")
+
+        # Header row
+        ws.append(["ER Number", "Student Name", "Date", "Time", "Class", "Subject", "Batch", "Status"])
+
+        # ✅ Present students
+        for student in attendance_data:
+            ws.append([
+                student["er_number"],
+                student["name"],
+                now.strftime("%d-%m-%Y"),
+                now.strftime("%H:%M:%S"),
+                class_name,
+                subject,
+                batch_name,
+                "Present"
+            ])
+
+        # ✅ Absent students
+        for student in absent_data:
+            ws.append([
+                student["er_number"],
+                student["name"],
+                now.strftime("%d-%m-%Y"),
+                now.strftime("%H:%M:%S"),
+                class_name,
+                subject,
+                batch_name,
+                "Absent"
+            ])
+
+        wb.save(filepath)
+
+    # ✅ Queue the upload to S3; the background uploader pushes it
+    s3_key = report_key(filename, batch_name, now)
+    with timer.stage("queue_upload"):
+        status = queue_upload(filepath, s3_key, bucket=s3_bucket)
+    if upload is not None:
+        upload.update(status)
+    timer.fields["report_key"] = s3_key
+    timer.count("report_bytes", os.path.getsize(filepath))
+
+    # ✅ Keep the per-student index in step with the new report
+    try:
+        with timer.stage("index_report"):
+            index_report(s3_key, [
+                {
+                    "er_number": student["er_number"],
+                    "student_name": student["name"],
+                    "date": now.strftime("%Y-%m-%d"),
+                    "time": now.strftime("%H:%M:%S"),
+                    "subject": subject,
+                    "batch": batch_name,
+                    "class": class_name,
+                    "status": status,
+                }
+                for students, status in ((attendance_data, "present"), (absent_data, "absent"))
+                for student in students
+            ])
+    except Exception as e:
+        print(f"⚠️ Could not index report {s3_key}: {e}")
+
+    # ✅ Return the public file URL (reserved until the upload lands)
+    return filepath, status["url"]
 
 def mark_batch_attendance_s3(
     batch_name,
     class_name,
     subject,
     group_image_files,
-    s3_bucket='ict-attendances',
-    region='ap-south-1'
+    s3_bucket=BUCKET_NAME,
+    region='ap-south-1',
+    timer=None,
+    upload=None
 ):
-    rekognition = boto3.client('rekognition', region_name=region)
+    """
+    Marks attendance for a batch from group photos. Pass a StageTimer as
+    `timer` to read back per-stage timings and counters; either way one
+    structured timing line is logged per run, failed runs included. Pass a
+    dict as `upload` to receive the report's upload status (url,
+    object_key, state).
+    """
+    timer = timer or StageTimer("take_attendance")
+    timer.fields.update(batch=batch_name, subject=subject, class_name=class_name)
+    try:
+        return _mark_batch_attendance(batch_name, class_name, subject, group_image_files, s3_bucket, region, timer,
+                                      upload)
+    except Exception as e:
+        # no_faces / throttled runs have already logged their outcome
+        if not timer.logged:
+            timer.log(outcome="error", error=str(e))
+        raise
+
+
+def _mark_batch_attendance(batch_name, class_name, subject, group_image_files, s3_bucket, region, timer, upload):
+    rekognition = get_client('rekognition', region_name=region)
+    # shared with every other worker on this host
+    detect_limiter = get_limiter("rekognition.detect_faces")
+    compare_limiter = get_limiter("rekognition.compare_faces")
+    scheduler = get_scheduler()
     batch_prefix = f"{batch_name}/"
 
     # ✅ Fetch only images from the selected batch
-    student_image_keys = list_student_images_from_s3(s3_bucket, batch_prefix)
+    with timer.stage("list_references"):
+        student_images = list_student_image_objects(s3_bucket, batch_prefix)
+    student_image_keys = [obj['Key'] for obj in student_images]
+    reference_objects = {obj['Key']: obj for obj in student_images}
+    # the ETag changes whenever a reference photo is replaced
+    reference_tags = {obj['Key']: obj.get('ETag', '').strip('"') or obj['Key'] for obj in student_images}
+    timer.count("references", len(student_image_keys))
 
     present_students = {}
 
     for group_img_file in group_image_files:
-        group_bytes = group_img_file.read()
+        with timer.stage("read_group_image"):
+            group_bytes = group_img_file.read()
+        timer.count("group_images")
+        timer.count("group_image_bytes", len(group_bytes))
 
-        detection = rekognition.detect_faces(
-            Image={'Bytes': group_bytes},
-            Attributes=['DEFAULT']
-        )
-        if not detection['FaceDetails']:
-            raise ValueError("❌ No face detected in group image.")
+        group_digest = image_digest(group_bytes)
+        try:
+            with timer.stage("cache_lookup"):
+                known = lookup_matches(group_digest, reference_tags, SIMILARITY_THRESHOLD)
+        except Exception as e:
+            print(f"⚠️ Recognition cache unavailable: {e}")
+            known = {}
+        timer.count("compare_cache_hits", len(known))
 
-        for key in student_image_keys:
-            try:
-                student_bytes = get_photo_bytes_from_s3(s3_bucket, key)
-                response = rekognition.compare_faces(
-                    SourceImage={'Bytes': student_bytes},
-                    TargetImage={'Bytes': group_bytes},
-                    SimilarityThreshold=80
+        # answers on file mean these exact bytes already passed face detection
+        # (a retry or resubmission; a new photo of the class never hits)
+        if not known:
+            with timer.stage("detect_faces"):
+                detection = detect_limiter.call(
+                    rekognition.detect_faces,
+                    Image={'Bytes': group_bytes},
+                    Attributes=['DEFAULT']
                 )
-                if response['FaceMatches']:
-                    er_number, student_name = extract_student_details_from_key(key)
-                    er_number = er_number.strip()  # ensure no extra spaces
-                    student_name = student_name.strip()
-                    present_students[er_number] = {"er_number": er_number, "name": student_name}
+            timer.count("faces_detected", len(detection['FaceDetails']))
+            if not detection['FaceDetails']:
+                timer.log(outcome="no_faces")
+                raise ValueError("❌ No face detected in group image.")
+
+        new_answers = []
+
+        def compare(key):
+            """(key, matched, similarity); None when this reference cannot be compared."""
+            try:
+                with timer.stage("download_reference"):
+                    ref = reference_objects[key]
+                    student_bytes = get_photo_bytes_from_s3(s3_bucket, key, ref.get('ETag'), ref.get('Size'))
+                timer.count("reference_bytes", len(student_bytes))
+                with timer.stage("compare_faces"):
+                    response = compare_limiter.call(
+                        rekognition.compare_faces,
+                        SourceImage={'Bytes': student_bytes},
+                        TargetImage={'Bytes': group_bytes},
+                        SimilarityThreshold=SIMILARITY_THRESHOLD
+                    )
+            except RateLimitExceeded:
+                raise
             except Exception as e:
+                timer.count("compare_errors")
                 print(f"⚠️ Error comparing {key}: {e}")
-                continue
+                return None
+            matched = bool(response['FaceMatches'])
+            similarity = max((m.get('Similarity', 0) for m in response['FaceMatches']), default=None)
+            new_answers.append((reference_tags[key], matched, similarity))
+            return key, matched, similarity
+
+        # comparisons run on the shared pool, interleaved with other classes
+        pending_keys = [key for key in student_image_keys if key not in known]
+        try:
+            with timer.stage("recognition"):
+                compared = scheduler.map(compare, pending_keys, name=f"{batch_name}/{subject}")
+        except RateLimitExceeded:
+            # never guess "absent" for a comparison we could not make;
+            # answers obtained so far are cached, so a retry is cheap
+            timer.count("compare_throttled")
+            timer.log(outcome="throttled")
+            raise
+        finally:
+            try:
+                with timer.stage("cache_store"):
+                    store_matches(group_digest, new_answers, SIMILARITY_THRESHOLD)
+            except Exception as e:
+                print(f"⚠️ Could not cache recognition results: {e}")
+
+        matched_keys = [key for key, matched in known.items() if matched]
+        matched_keys += [r[0] for r in compared if r is not None and r[1]]
+        for key in matched_keys:
+            timer.count("matches")
+            er_number, student_name = extract_student_details_from_key(key)
+            er_number = er_number.strip()  # ensure no extra spaces
+            student_name = student_name.strip()
+            present_students[er_number] = {"er_number": er_number, "name": student_name}
 
         group_img_file.seek(0)
 
@@ -167,8 +288,11 @@ def mark_batch_attendance_s3(
     # Save Excel for present students
     attendance_list = list(present_students.values())
     excel_file_path, file_url = save_attendance_to_excel(
-    attendance_list, absent_students, batch_name, class_name, subject, s3_bucket, region
+    attendance_list, absent_students, batch_name, class_name, subject, s3_bucket, region, timer=timer, upload=upload
 )
+    timer.count("present", len(attendance_list))
+    timer.count("absent", len(absent_students))
+    timer.log(outcome="ok")
 
     # ✅ Return present, absent, and excel URL
-    return attendance_list, absent_students, file_url
\ No newline at end of file
+    return attendance_list, absent_students, file_url
@@ -0,0 +1,42 @@
+"""
+Moves flat reports (reports/<file>) into the partitioned layout
+(reports/batch=<batch>/month=<YYYY-MM>/<file>).
+
+Usage:
+    python -m core.migrate_report_layout            # dry run
+    python -m core.migrate_report_layout --apply
+"""
+import argparse
+
+from core.attendance_loader import BUCKET_NAME, is_report_object, list_pages
+from core.storage import get_storage
+from core.report_layout import REPORTS_ROOT, legacy_target_key
+
+
+def migrate_reports(bucket=BUCKET_NAME, apply=False):
+    moved = []
+    for page in list_pages(REPORTS_ROOT, bucket, delimiter="/"):
+        for obj in page.get("Contents", []) or []:
+            if not is_report_object(obj):
+                continue
+
+            source = obj["Key"]
+            target = legacy_target_key(obj)
+            moved.append((source, target))
+            print(f"{'➡️ ' if apply else '(dry run) '}{source} -> {target}")
+
+            if apply:
+                storage = get_storage(bucket)
+                storage.copy(source, target)
+                storage.delete(source)
+
+    print(f"✅ {len(moved)} report(s) {'migrated' if apply else 'to migrate'}.")
+    return moved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate flat reports into batch/month partitions.")
+    parser.add_argument("--bucket", default=BUCKET_NAME)
+    parser.add_argument("--apply", action="store_true", help="perform the copy + delete (default: dry run)")
+    args = parser.parse_args()
+    migrate_reports(bucket=args.bucket, apply=args.apply)
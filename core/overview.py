@@ -1,69 +1,45 @@
-import io
-import os
-import pandas as pd
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from dotenv import load_dotenv
-import boto3
+from core.roster import get_roster
+from core.http_cache import conditional, combine_versions, request_reports_version, students_version
 
 # Load environment
 load_dotenv()
 
-AWS_REGION = os.getenv("AWS_REGION", "ap-south-1")
-AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY")
-AWS_SECRET_KEY = os.getenv("AWS_SECRET_KEY")
-BUCKET_NAME = os.getenv("BUCKET_NAME", "ict-attendances")
-
-# S3 client
-s3_client = boto3.client(
-    "s3",
-    region_name=AWS_REGION,
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY
-)
-
 dashboard_bp = Blueprint("dashboard_api", __name__)
 
 @dashboard_bp.route("/overview", methods=["GET"])
+@conditional(combine_versions(request_reports_version, students_version))
 def class_overview():
+    # heavy imports are deferred until the endpoint is first hit
+    import pandas as pd
+    from core.attendance_loader import iter_sessions
+
     try:
-        # Load master students list
-        s3_obj = s3_client.get_object(Bucket=BUCKET_NAME, Key="students.xlsx")
-        body = s3_obj["Body"].read()
-        df_students = pd.read_excel(io.BytesIO(body))
-        total_students = len(df_students)
+        # Master students list (cached roster)
+        total_students = get_roster().count()
 
         # Attendance reports in S3
-        response = s3_client.list_objects_v2(Bucket=BUCKET_NAME, Prefix="reports/")
         subjects_data = []
         overall_trend = []
 
-        for obj in response.get("Contents", []):
-            key = obj["Key"]
-            if not key.endswith((".xlsx", ".csv")):
-                continue
-
-            s3_file = s3_client.get_object(Bucket=BUCKET_NAME, Key=key)
-            file_body = s3_file["Body"].read()
-
-            # Load file
-            if key.endswith(".csv"):
-                df = pd.read_csv(io.BytesIO(file_body))
-            else:
-                df = pd.read_excel(io.BytesIO(file_body))
-
+        sessions = iter_sessions(
+            columns=["er_number", "subject", "batch", "status", "date"],
+            batch=request.args.get("batch"),
+            months=request.args.getlist("month"),
+        )
+        for session in sessions:
+            df = session["frame"]
             if df.empty:
                 continue
 
-            # Normalize headers
-            df.columns = [c.strip() for c in df.columns]
-
             # Subject and batch extraction
-            subject_name = df["Subject"].iloc[0] if "Subject" in df.columns else "Unknown"
-            batch_name = df["Batch"].iloc[0] if "Batch" in df.columns else "Unknown"
+            subject_name = df["subject"].dropna().iloc[0] if df["subject"].notna().any() else "Unknown"
+            batch_name = df["batch"].dropna().iloc[0] if df["batch"].notna().any() else "Unknown"
 
             # Attendance calculation
-            present_count = df[df["Status"].str.lower() == "present"]["ER Number"].nunique() \
-                if "Status" in df.columns and "ER Number" in df.columns else 0
+            present_df = df[df["present"]]
+            present_count = int(present_df["er_number"].nunique())
 
             total_count = total_students if total_students > 0 else 1
             attendance_percent = round((present_count / total_count) * 100, 2)
@@ -77,24 +53,20 @@ def class_overview():
             })
 
             # Trend (by month)
-            if "Date" in df.columns:
-                df["Month"] = pd.to_datetime(
-                    df["Date"], format="%d-%m-%Y", errors="coerce"
-                ).dt.strftime("%b")
-
-                trend_counts = (
-                    df[df["Status"].str.lower() == "present"]
-                    .groupby("Month")["ER Number"]
-                    .nunique()
-                    .reset_index(name="present")
-                )
-
-                for _, row in trend_counts.iterrows():
-                    overall_trend.append({
-                        "month": row["Month"],
-                        "attendance": row["present"],
-                        "subject_batch": f"{subject_name} ({batch_name})"
-                    })
+            trend_counts = (
+                present_df.assign(Month=present_df["date"].dt.strftime("%b"))
+                .dropna(subset=["Month"])
+                .groupby("Month")["er_number"]
+                .nunique()
+                .reset_index(name="present")
+            )
+
+            for _, row in trend_counts.iterrows():
+                overall_trend.append({
+                    "month": row["Month"],
+                    "attendance": int(row["present"]),
+                    "subject_batch": f"{subject_name} ({batch_name})"
+                })
 
         # ✅ Deduplicate & aggregate subjects by subject+batch
         if subjects_data:
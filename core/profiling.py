@@ -0,0 +1,145 @@
+"""
+Opt-in request profiling.
+
+With PROFILING_ENABLED=true, a logged-in admin can send `X-Profile: 1` on any
+request (e.g. /take_attendance, /api/dashboard) to run it under cProfile.
+The .prof file and a JSON summary (route, args, timing, hottest functions)
+are written to PROFILE_DIR and listed at /api/profiles.
+
+When disabled no hooks or routes are registered, so requests pay nothing.
+"""
+import os
+import io
+import json
+import time
+import pstats
+import cProfile
+from datetime import datetime
+
+from flask import request, session, g, jsonify, send_from_directory
+from dotenv import load_dotenv
+
+# Load environment
+load_dotenv()
+
+PROFILE_HEADER = "X-Profile"
+
+
+def profiling_enabled():
+    return os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+
+
+def _profile_dir():
+    return os.getenv("PROFILE_DIR", os.path.join(".cache", "profiles"))
+
+
+def _is_admin():
+    return bool(session.get("logged_in"))
+
+
+def _start_profile():
+    if request.headers.get(PROFILE_HEADER, "").lower() not in ("1", "true", "yes"):
+        return
+    if not _is_admin():
+        return
+    g.profiler = cProfile.Profile()
+    g.profile_started = time.perf_counter()
+    g.profiler.enable()
+
+
+def _top_functions(profiler, limit):
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, line, func), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{line}({func})",
+            "calls": calls,
+            "tottime_ms": round(tottime * 1000, 2),
+            "cumtime_ms": round(cumtime * 1000, 2),
+        })
+    rows.sort(key=lambda r: r["cumtime_ms"], reverse=True)
+    return rows[:limit]
+
+
+def _prune(directory, keep):
+    profiles = sorted(f for f in os.listdir(directory) if f.endswith(".json"))
+    for name in profiles[:-keep] if keep > 0 else []:
+        for ext in (".json", ".prof"):
+            try:
+                os.remove(os.path.join(directory, name[:-5] + ext))
+            except FileNotFoundError:
+                pass
+
+
+def _finish_profile(response):
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        return response
+    profiler.disable()
+    duration = time.perf_counter() - g.pop("profile_started")
+
+    directory = _profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    endpoint = request.endpoint or "unknown"
+    profile_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{endpoint.replace('.', '-')}"
+
+    profiler.dump_stats(os.path.join(directory, f"{profile_id}.prof"))
+    meta = {
+        "id": profile_id,
+        "endpoint": endpoint,
+        "method": request.method,
+        "path": request.path,
+        "args": request.args.to_dict(flat=False),
+        # field names only: values can be credentials (e.g. a profiled /login)
+        "form_fields": sorted(request.form.keys()),
+        "files": sum(len(request.files.getlist(name)) for name in request.files),
+        "status": response.status_code,
+        "duration_ms": round(duration * 1000, 1),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "top": _top_functions(profiler, int(os.getenv("PROFILE_TOP_FUNCTIONS", "25"))),
+    }
+    with open(os.path.join(directory, f"{profile_id}.json"), "w") as fh:
+        json.dump(meta, fh, indent=2)
+    _prune(directory, int(os.getenv("PROFILE_KEEP", "50")))
+
+    response.headers["X-Profile-Id"] = profile_id
+    return response
+
+
+def list_profiles():
+    if not _is_admin():
+        return jsonify({"error": "Login required"}), 401
+    directory = _profile_dir()
+    if not os.path.isdir(directory):
+        return jsonify({"profiles": []}), 200
+
+    limit = request.args.get("limit", 20, type=int)
+    profiles = []
+    for name in sorted((f for f in os.listdir(directory) if f.endswith(".json")), reverse=True)[:limit]:
+        with open(os.path.join(directory, name)) as fh:
+            meta = json.load(fh)
+        meta.pop("top", None)
+        profiles.append(meta)
+    return jsonify({"profiles": profiles}), 200
+
+
+def get_profile(profile_id):
+    """JSON summary, or the raw .prof (for snakeviz/pstats) with ?format=prof."""
+    if not _is_admin():
+        return jsonify({"error": "Login required"}), 401
+    directory = os.path.abspath(_profile_dir())
+    if request.args.get("format") == "prof":
+        return send_from_directory(directory, f"{profile_id}.prof", as_attachment=True)
+    return send_from_directory(directory, f"{profile_id}.json", mimetype="application/json")
+
+
+def init_profiling(app):
+    """Registers the profiling hooks and endpoints when PROFILING_ENABLED is set."""
+    if not profiling_enabled():
+        return False
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+    app.add_url_rule("/api/profiles", view_func=list_profiles, methods=["GET"])
+    app.add_url_rule("/api/profiles/<profile_id>", view_func=get_profile, methods=["GET"])
+    app.logger.warning("⚠️ Request profiling is enabled (X-Profile header)")
+    return True
@@ -0,0 +1,150 @@
+"""
+Token-bucket rate limiting for AWS calls, shared by every worker process on
+the host through a small state file guarded by flock.
+
+The allowed rate adapts AIMD-style: each success nudges it up by
+RATE_LIMIT_INCREASE calls/s (up to the configured ceiling), each throttling
+error halves it. Throttled calls are retried with jittered backoff instead
+of surfacing as failures.
+"""
+import os
+import json
+import time
+import random
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: limit within this process only
+    fcntl = None
+
+# Load environment
+load_dotenv()
+
+RATE_LIMIT_DIR = os.getenv("RATE_LIMIT_DIR", os.path.join(".cache", "ratelimit"))
+RATE_LIMIT_INCREASE = float(os.getenv("RATE_LIMIT_INCREASE", "0.5"))
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "8"))
+
+THROTTLING_CODES = {
+    "ThrottlingException",
+    "ProvisionedThroughputExceededException",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+    "SlowDown",
+}
+
+
+class RateLimitExceeded(Exception):
+    """A call was still throttled after all retries."""
+
+
+def is_throttling_error(error):
+    code = getattr(error, "response", {}).get("Error", {}).get("Code")
+    return code in THROTTLING_CODES or type(error).__name__ in THROTTLING_CODES
+
+
+class RateLimiter:
+    def __init__(self, name, max_rate, min_rate=0.5, burst=None):
+        self.name = name
+        self.max_rate = float(max_rate)
+        self.min_rate = float(min_rate)
+        self.burst = float(burst or max(1.0, self.max_rate))
+        self.path = os.path.join(RATE_LIMIT_DIR, f"{name}.json")
+        self._lock = threading.Lock()
+        self._memory = None  # state when fcntl is unavailable
+
+    @contextmanager
+    def _state(self):
+        """Yields the shared state dict under an exclusive lock and saves it."""
+        with self._lock:
+            if fcntl is None:
+                if self._memory is None:
+                    self._memory = self._initial()
+                yield self._memory
+                return
+
+            os.makedirs(RATE_LIMIT_DIR, exist_ok=True)
+            with open(self.path, "a+") as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    fh.seek(0)
+                    try:
+                        state = json.loads(fh.read() or "null") or self._initial()
+                    except ValueError:
+                        state = self._initial()
+                    yield state
+                    fh.seek(0)
+                    fh.truncate()
+                    fh.write(json.dumps(state))
+                    fh.flush()
+                finally:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _initial(self):
+        return {"rate": self.max_rate, "tokens": self.burst, "updated": time.time()}
+
+    def acquire(self):
+        """Blocks until a call is allowed."""
+        while True:
+            with self._state() as state:
+                now = time.time()
+                rate = min(max(state["rate"], self.min_rate), self.max_rate)
+                tokens = min(self.burst, state["tokens"] + (now - state["updated"]) * rate)
+                state.update(rate=rate, updated=now)
+                if tokens >= 1:
+                    state["tokens"] = tokens - 1
+                    return
+                state["tokens"] = tokens
+                wait = (1 - tokens) / rate
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._state() as state:
+            state["rate"] = min(self.max_rate, state["rate"] + RATE_LIMIT_INCREASE)
+
+    def on_throttle(self):
+        with self._state() as state:
+            state["rate"] = max(self.min_rate, state["rate"] / 2)
+            # drain what is left so every worker backs off at once
+            state["tokens"] = min(state["tokens"], 0.0)
+
+    def current_rate(self):
+        with self._state() as state:
+            return state["rate"]
+
+    def call(self, fn, *args, **kwargs):
+        """Runs fn under the limiter, retrying throttled attempts."""
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            self.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_throttling_error(e):
+                    raise
+                self.on_throttle()
+                if attempt == RATE_LIMIT_MAX_RETRIES:
+                    raise RateLimitExceeded(f"{self.name} still throttled after {attempt + 1} attempts") from e
+                time.sleep(min(20.0, 0.1 * 2 ** attempt) * random.uniform(0.5, 1.0))
+                continue
+            self.on_success()
+            return result
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name, max_rate=None):
+    """
+    Process-wide limiter; the ceiling comes from RATE_LIMIT_<NAME>_TPS,
+    e.g. RATE_LIMIT_REKOGNITION_COMPARE_FACES_TPS=5.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            env = f"RATE_LIMIT_{name.upper().replace('.', '_')}_TPS"
+            limiter = RateLimiter(name, float(os.getenv(env, max_rate or 5)))
+            _limiters[name] = limiter
+        return limiter
@@ -0,0 +1,132 @@
+"""
+Persistent cache of Rekognition compare_faces answers.
+
+An answer is keyed by the SHA-256 of the whole group image, the reference
+photo's S3 ETag and the similarity threshold. Only a byte-identical
+resubmission (a retry after throttling, a double submit) is answered from
+here; every newly taken photo misses and is compared in full.
+Entries expire after RECOGNITION_CACHE_TTL_HOURS and the table is trimmed
+to RECOGNITION_CACHE_MAX_ENTRIES, least recently used first.
+"""
+import os
+import time
+import hashlib
+import threading
+from dotenv import load_dotenv
+
+from core.student_index import get_connection
+
+# Load environment
+load_dotenv()
+
+RECOGNITION_CACHE_TTL_HOURS = float(os.getenv("RECOGNITION_CACHE_TTL_HOURS", "168"))
+RECOGNITION_CACHE_MAX_ENTRIES = int(os.getenv("RECOGNITION_CACHE_MAX_ENTRIES", "200000"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS face_matches (
+    group_digest  TEXT NOT NULL,
+    reference_tag TEXT NOT NULL,
+    threshold     REAL NOT NULL,
+    matched       INTEGER NOT NULL,
+    similarity    REAL,
+    created_at    REAL NOT NULL,
+    used_at       REAL NOT NULL,
+    PRIMARY KEY (group_digest, reference_tag, threshold)
+);
+CREATE INDEX IF NOT EXISTS idx_face_matches_used ON face_matches (used_at);
+"""
+
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_stats_lock = threading.Lock()
+
+
+def _connection():
+    conn = get_connection()
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def image_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def lookup_matches(group_digest, reference_tags, threshold):
+    """
+    `reference_tags` maps reference key -> ETag. Returns {key: matched} for
+    the references with a live cached answer.
+    """
+    if not reference_tags:
+        return {}
+    conn = _connection()
+    cutoff = time.time() - RECOGNITION_CACHE_TTL_HOURS * 3600
+    answers = {
+        r["reference_tag"]: bool(r["matched"])
+        for r in conn.execute(
+            "SELECT reference_tag, matched FROM face_matches "
+            "WHERE group_digest = ? AND threshold = ? AND created_at >= ?",
+            (group_digest, threshold, cutoff),
+        )
+    }
+    found = {key: answers[tag] for key, tag in reference_tags.items() if tag in answers}
+
+    if found:
+        with conn:
+            conn.executemany(
+                "UPDATE face_matches SET used_at = ? WHERE group_digest = ? AND reference_tag = ? AND threshold = ?",
+                [(time.time(), group_digest, reference_tags[key], threshold) for key in found],
+            )
+    with _stats_lock:
+        _stats["hits"] += len(found)
+        _stats["misses"] += len(reference_tags) - len(found)
+    return found
+
+
+def store_matches(group_digest, results, threshold):
+    """`results` is a list of (reference_tag, matched, similarity)."""
+    if not results:
+        return
+    conn = _connection()
+    now = time.time()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO face_matches "
+            "(group_digest, reference_tag, threshold, matched, similarity, created_at, used_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(group_digest, tag, threshold, int(matched), similarity, now, now)
+             for tag, matched, similarity in results],
+        )
+    evict()
+
+
+def evict():
+    """Drops expired answers, then the least recently used beyond the size cap."""
+    conn = _connection()
+    with conn:
+        expired = conn.execute(
+            "DELETE FROM face_matches WHERE created_at < ?",
+            (time.time() - RECOGNITION_CACHE_TTL_HOURS * 3600,),
+        ).rowcount
+        total = conn.execute("SELECT COUNT(*) FROM face_matches").fetchone()[0]
+        overflow = 0
+        if total > RECOGNITION_CACHE_MAX_ENTRIES:
+            overflow = conn.execute(
+                "DELETE FROM face_matches WHERE rowid IN "
+                "(SELECT rowid FROM face_matches ORDER BY used_at LIMIT ?)",
+                (total - RECOGNITION_CACHE_MAX_ENTRIES,),
+            ).rowcount
+    with _stats_lock:
+        _stats["evictions"] += expired + overflow
+
+
+def cache_stats():
+    conn = _connection()
+    entries = conn.execute("SELECT COUNT(*) FROM face_matches").fetchone()[0]
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats.update(
+        entries=entries,
+        max_entries=RECOGNITION_CACHE_MAX_ENTRIES,
+        hit_rate=round(stats["hits"] / lookups, 3) if lookups else 0.0,
+    )
+    return stats
@@ -0,0 +1,121 @@
+"""
+Fair scheduling of recognition work between concurrent take_attendance runs.
+
+Each run submits its comparisons as one job. A shared pool of
+RECOGNITION_WORKERS threads takes one unit from each job with work in turn
+(round-robin), so a class that submitted first cannot hold the capacity
+while ten others wait; a job on its own still gets every worker.
+
+Fairness is per worker process; the rate limiter bounds the total across
+processes.
+"""
+import os
+import itertools
+import threading
+from collections import OrderedDict, deque
+from dotenv import load_dotenv
+
+# Load environment
+load_dotenv()
+
+RECOGNITION_WORKERS = int(os.getenv("RECOGNITION_WORKERS", "8"))
+
+
+class _Job:
+    def __init__(self, job_id, name, fn, items):
+        self.id = job_id
+        self.name = name
+        self.fn = fn
+        self.units = deque(enumerate(items))
+        self.results = [None] * len(self.units)
+        self.pending = len(self.units)
+        self.error = None
+        self.done = threading.Event()
+        if not self.pending:
+            self.done.set()
+
+
+class RecognitionScheduler:
+    def __init__(self, workers=RECOGNITION_WORKERS):
+        self.workers = max(1, workers)
+        self._jobs = OrderedDict()
+        self._cond = threading.Condition()
+        self._ids = itertools.count(1)
+        self._threads = []
+
+    def _start(self):
+        # called with the condition held
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"recognition-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _next_unit(self):
+        """Round-robin: the job that just got a unit goes to the back of the line."""
+        while True:
+            for job_id, job in self._jobs.items():
+                if job.units:
+                    index, item = job.units.popleft()
+                    self._jobs.move_to_end(job_id)
+                    return job, index, item
+            self._cond.wait()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job, index, item = self._next_unit()
+            try:
+                result = job.fn(item)
+                error = None
+            except Exception as e:
+                result, error = None, e
+
+            with self._cond:
+                job.results[index] = result
+                if error is not None and job.error is None:
+                    # stop handing out the rest of a failed job
+                    job.error = error
+                    job.pending -= len(job.units)
+                    job.units.clear()
+                job.pending -= 1
+                if job.pending == 0:
+                    self._jobs.pop(job.id, None)
+                    job.done.set()
+
+    def map(self, fn, items, name=None):
+        """
+        Runs fn over items on the shared pool, interleaved with other jobs.
+        Returns results in input order; re-raises the first exception.
+        """
+        with self._cond:
+            job = _Job(next(self._ids), name, fn, list(items))
+            if job.pending:
+                self._start()
+                self._jobs[job.id] = job
+                self._cond.notify_all()
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.results
+
+    def snapshot(self):
+        """Queued units per active job, e.g. for a status endpoint."""
+        with self._cond:
+            return [
+                {"job": job.id, "name": job.name, "queued": len(job.units), "pending": job.pending}
+                for job in self._jobs.values()
+            ]
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RecognitionScheduler()
+        return _scheduler
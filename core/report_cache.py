@@ -0,0 +1,131 @@
+import os
+import hashlib
+import threading
+from dotenv import load_dotenv
+
+# Load environment
+load_dotenv()
+
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", os.path.join(".cache", "reports"))
+REPORT_CACHE_MAX_MB = float(os.getenv("REPORT_CACHE_MAX_MB", "256"))
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _bump(counter, amount=1):
+    with _stats_lock:
+        _stats[counter] += amount
+
+
+def _entry_path(key, etag):
+    """Cache file for one version of a report (S3 key + ETag)."""
+    digest = hashlib.sha1(f"{key}\0{etag}".encode("utf-8")).hexdigest()
+    return os.path.join(REPORT_CACHE_DIR, digest[:2], digest + ".bin")
+
+
+def get_cached_body(key, etag, size=None):
+    """
+    Returns the cached body for key+etag, or None.
+    If size is given (from the listing) it must match the cached file.
+    """
+    if not etag:
+        return None
+    path = _entry_path(key, etag)
+    try:
+        if size is not None and os.path.getsize(path) != int(size):
+            return None
+        with open(path, "rb") as fh:
+            body = fh.read()
+        # touch for LRU ordering
+        os.utime(path, None)
+        return body
+    except OSError:
+        return None
+
+
+def put_cached_body(key, etag, body):
+    """Stores a report body atomically and evicts old entries past the size cap."""
+    if not etag:
+        return
+    path = _entry_path(key, etag)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as fh:
+            fh.write(body)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ Could not write report cache entry for {key}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    evict_to_limit()
+
+
+def evict_to_limit(max_bytes=None):
+    """Removes least recently used entries until the cache fits in max_bytes."""
+    if max_bytes is None:
+        max_bytes = int(REPORT_CACHE_MAX_MB * 1024 * 1024)
+
+    entries = []
+    total = 0
+    for root, _, files in os.walk(REPORT_CACHE_DIR):
+        for name in files:
+            if not name.endswith(".bin"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+    if total <= max_bytes:
+        return
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+            _bump("evictions")
+        except OSError:
+            pass
+
+
+def record_hit():
+    _bump("hits")
+
+
+def record_miss():
+    _bump("misses")
+
+
+def cache_stats():
+    """Hit/miss/eviction counters plus current on-disk usage."""
+    with _stats_lock:
+        stats = dict(_stats)
+
+    entries = 0
+    size = 0
+    for root, _, files in os.walk(REPORT_CACHE_DIR):
+        for name in files:
+            if name.endswith(".bin"):
+                entries += 1
+                try:
+                    size += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+
+    lookups = stats["hits"] + stats["misses"]
+    stats.update({
+        "entries": entries,
+        "size_bytes": size,
+        "max_bytes": int(REPORT_CACHE_MAX_MB * 1024 * 1024),
+        "hit_rate": round(stats["hits"] / lookups, 3) if lookups else 0.0,
+    })
+    return stats
@@ -0,0 +1,96 @@
+import os
+import re
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+REPORTS_ROOT = os.getenv("EXCEL_FOLDER_KEY", "reports/")
+
+# reports/batch=<batch>/month=<YYYY-MM>/<file>
+PARTITION_RE = re.compile(r"^batch=(?P<batch>[^/]+)/month=(?P<month>\d{4}-\d{2})/")
+
+
+def safe_part(value):
+    """Makes a batch/class/subject value safe for use in a key or filename."""
+    return str(value).strip().replace(" ", "_").replace("/", "-")
+
+
+def parse_report_filename(filename):
+    """
+    Extracts metadata from the report filenames we have written over time:
+      20250828_101010_2022-2026_A_CN.xlsx    (date_time_batch_class_subject)
+      20250825_2022-2026_A_CN.xlsx           (date_batch_section_subject)
+      2022-2026_CN_2025-08-29_10-00-00.csv   (batch_subject_date_time)
+    Returns dict with date (datetime or None), batch, section, subject.
+    """
+    name, _ = os.path.splitext(os.path.basename(filename))
+    parts = name.split("_")
+    meta = {"date": None, "batch": None, "section": None, "subject": None}
+
+    try:
+        if len(parts) >= 5 and re.fullmatch(r"\d{8}", parts[0]) and re.fullmatch(r"\d{6}", parts[1]):
+            meta.update(
+                date=datetime.strptime(parts[0] + parts[1], "%Y%m%d%H%M%S"),
+                batch=parts[2], section=parts[3], subject="_".join(parts[4:]),
+            )
+        elif len(parts) >= 4 and re.fullmatch(r"\d{8}", parts[0]):
+            meta.update(
+                date=datetime.strptime(parts[0], "%Y%m%d"),
+                batch=parts[1], section=parts[2], subject="_".join(parts[3:]),
+            )
+        elif len(parts) >= 4 and re.fullmatch(r"\d{4}-\d{2}-\d{2}", parts[-2]):
+            meta.update(
+                date=datetime.strptime(parts[-2], "%Y-%m-%d"),
+                batch=parts[0], subject="_".join(parts[1:-2]),
+            )
+    except ValueError:
+        pass
+
+    return meta
+
+
+def report_key(filename, batch, when):
+    """Partitioned S3 key for a new report."""
+    return f"{REPORTS_ROOT}batch={safe_part(batch)}/month={when.strftime('%Y-%m')}/{filename}"
+
+
+def parse_partition(key):
+    """(batch, month) of a partitioned key, or (None, None) for legacy flat keys."""
+    if not key.startswith(REPORTS_ROOT):
+        return None, None
+    match = PARTITION_RE.match(key[len(REPORTS_ROOT):])
+    if not match:
+        return None, None
+    return match.group("batch"), match.group("month")
+
+
+def partition_prefixes(batch=None, months=None):
+    """The smallest set of prefixes that covers a batch / month query."""
+    if not batch:
+        return [REPORTS_ROOT]
+    base = f"{REPORTS_ROOT}batch={safe_part(batch)}/"
+    if not months:
+        return [base]
+    return [f"{base}month={m}/" for m in sorted(set(months))]
+
+
+def matches_query(key, batch=None, months=None):
+    """Checks a legacy (flat) report key against a batch / month query."""
+    meta = parse_report_filename(key)
+    if batch and (meta["batch"] is None or safe_part(meta["batch"]) != safe_part(batch)):
+        return False
+    if months:
+        if meta["date"] is None or meta["date"].strftime("%Y-%m") not in set(months):
+            return False
+    return True
+
+
+def legacy_target_key(obj):
+    """Partitioned key for an existing flat report (used by the migration)."""
+    key = obj["Key"]
+    filename = os.path.basename(key)
+    meta = parse_report_filename(filename)
+    batch = meta["batch"] or "unknown"
+    when = meta["date"] or obj["LastModified"]
+    return report_key(filename, batch, when)
@@ -1,27 +1,16 @@
-import os
-import io
-import csv
-import boto3
+from itertools import chain
+import numpy as np
 import pandas as pd
-from datetime import datetime, timezone
+from datetime import timezone
 from dotenv import load_dotenv
+from core.storage import get_storage
+from core.roster import get_roster, MASTER_STUDENTS_KEY
+from core.attendance_loader import iter_sessions, present_names
+from core.report_layout import parse_report_filename
 
 # Load environment values
 load_dotenv()
 
-AWS_REGION = os.getenv("AWS_REGION", "ap-south-1")
-AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY")
-AWS_SECRET_KEY = os.getenv("AWS_SECRET_KEY")
-BUCKET_NAME = os.getenv("BUCKET_NAME", "ict-attendances")
-
-# Initialize S3 client
-s3_client = boto3.client(
-    "s3",
-    region_name=AWS_REGION,
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY,
-)
-
 # 🔹 Subject mapping dictionary
 SUBJECT_MAP = {
     "OS": "Operating System",
@@ -34,35 +23,27 @@ SUBJECT_MAP = {
 
 def parse_metadata_from_filename(filename: str):
     """
-    Example filename: 20250825_2020-2024_A_OS.xlsx
+    Example filename: 20250825_101010_2020-2024_A_OS.xlsx
     -> date = 20250825, batch = 2020-2024, section = A, subject = OS
+    (see core.report_layout.parse_report_filename for the accepted layouts)
     """
-    try:
-        name, _ = os.path.splitext(filename)
-        parts = name.split("_")
-
-        if len(parts) >= 4:
-            date_str = parts[0]          # 20250825
-            batch = parts[1]             # 2020-2024
-            section = parts[2]           # A
-            subject_code = parts[3]      # OS
+    meta = parse_report_filename(filename)
+    if meta["date"] is None or meta["batch"] is None:
+        return "-", "-", "-", "-", filename
 
-            # Format date
-            date_obj = datetime.strptime(date_str, "%Y%m%d")
-            formatted_date = date_obj.strftime("%d %b %Y")
+    batch = meta["batch"]
+    section = meta["section"] or "-"
 
-            # Map subject
-            subject = SUBJECT_MAP.get(subject_code, subject_code)
+    # Format date
+    formatted_date = meta["date"].strftime("%d %b %Y")
 
-            # Build name
-            user_friendly = f"{subject} | Batch {batch} | Section {section} | {formatted_date}"
+    # Map subject
+    subject = SUBJECT_MAP.get(meta["subject"], meta["subject"])
 
-            return batch, section, subject, formatted_date, user_friendly
+    # Build name
+    user_friendly = f"{subject} | Batch {batch} | Section {section} | {formatted_date}"
 
-    except Exception:
-        pass
-
-    return "-", "-", "-", "-", filename
+    return batch, section, subject, formatted_date, user_friendly
 
 
 def load_master_students():
@@ -72,98 +53,44 @@ def load_master_students():
     Returns: dict {batch: {section: [students]}}
     """
     try:
-        s3_obj = s3_client.get_object(Bucket=BUCKET_NAME, Key="reports/students.xlsx")
-        body = s3_obj["Body"].read()
-        df = pd.read_excel(io.BytesIO(body))
-
-        master_students = {}
-        if {"Batch", "Section", "Name"}.issubset(df.columns):
-            for _, row in df.iterrows():
-                batch = str(row["Batch"]).strip()
-                section = str(row["Section"]).strip()
-                name = str(row["Name"]).strip()
-                if batch and section and name:
-                    master_students.setdefault(batch, {}).setdefault(section, []).append(name)
-
-        return master_students
+        return get_roster(MASTER_STUDENTS_KEY).sections()
     except Exception as e:
         print("⚠️ Could not load master student list:", e)
         return {}
 
 
-def list_s3_reports():
+def list_s3_reports(batch=None, months=None):
     try:
         grouped_reports = {}  # {batch: {section: [reports]}}
-        continuation_token = None
-
-        while True:
-            if continuation_token:
-                response = s3_client.list_objects_v2(
-                    Bucket=BUCKET_NAME, Prefix="reports/", ContinuationToken=continuation_token
-                )
-            else:
-                response = s3_client.list_objects_v2(
-                    Bucket=BUCKET_NAME, Prefix="reports/"
-                )
-
-            for obj in response.get("Contents", []):
-                key = obj["Key"]
-                filename = os.path.basename(key)
-
-                # 🚫 Skip master student file
-                if filename.lower() == "students.xlsx":
-                    continue
-
-                # Only process CSV/XLSX reports
-                if not key.lower().endswith((".csv", ".xlsx")):
-                    continue
-
-                # Download file content
-                s3_obj = s3_client.get_object(Bucket=BUCKET_NAME, Key=key)
-                body = s3_obj["Body"].read()
-
-                records_count, students = 0, []
-
-                if key.endswith(".csv"):
-                    rows = list(csv.reader(io.StringIO(body.decode("utf-8"))))
-                    if len(rows) > 1:
-                        records_count = len(rows) - 1
-                        students = [row[0] for row in rows[1:] if row]
-
-                elif key.endswith(".xlsx"):
-                    df = pd.read_excel(io.BytesIO(body))
-                    records_count = len(df)
-                    if "Name" in df.columns:
-                        students = df["Name"].dropna().tolist()
-
-                # Extract metadata
-                batch, section, subject, formatted_date, user_friendly = parse_metadata_from_filename(filename)
-
-                report = {
-                    "id": key,
-                    "fileName": filename,
-                    "userFriendlyName": user_friendly,
-                    "batch": batch,
-                    "section": section,
-                    "subject": subject,
-                    "generatedDate": formatted_date,
-                    "uploadedAt": obj["LastModified"].astimezone(timezone.utc).isoformat(),
-                    "size": f"{obj['Size']/1024:.1f} KB",
-                    "records": records_count,
-                    "status": "ready",
-                    "students": students,
-                    "url": f"https://{BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{key}",
-                    # will be filled later
-                    "attendanceMap": {}
-                }
-
-                # Insert into grouped structure
-                grouped_reports.setdefault(batch, {}).setdefault(section, []).append(report)
 
-            if response.get("IsTruncated"):
-                continuation_token = response.get("NextContinuationToken")
-            else:
-                break
+        for session in iter_sessions(columns=["student_name", "status"], batch=batch, months=months):
+            key = session["key"]
+            filename = session["file_name"]
+            df = session["frame"]
+
+            # Extract metadata
+            batch, section, subject, formatted_date, user_friendly = parse_metadata_from_filename(filename)
+
+            report = {
+                "id": key,
+                "fileName": filename,
+                "userFriendlyName": user_friendly,
+                "batch": batch,
+                "section": section,
+                "subject": subject,
+                "generatedDate": formatted_date,
+                "uploadedAt": session["last_modified"].astimezone(timezone.utc).isoformat(),
+                "size": f"{session['size']/1024:.1f} KB",
+                "records": len(df),
+                "status": "ready",
+                "students": present_names(df),
+                "url": get_storage().url(key),
+                # will be filled later
+                "attendanceMap": {}
+            }
+
+            # Insert into grouped structure
+            grouped_reports.setdefault(batch, {}).setdefault(section, []).append(report)
 
         return grouped_reports
 
@@ -171,35 +98,90 @@ def list_s3_reports():
         return {"error": str(e)}
 
 
-def calculate_attendance_percentages(grouped_reports, master_students):
+STATUS_LABELS = np.array(["Absent", "Present"], dtype=object)
+
+
+def build_attendance_matrix(reports, students):
+    """
+    Boolean students x sessions matrix: matrix[i, j] is True when
+    students[i] appears in reports[j]["students"].
+    """
+    index = pd.Index(students)
+    matrix = np.zeros((len(students), len(reports)), dtype=bool)
+    if not len(students) or not reports:
+        return matrix
+
+    lengths = [len(report["students"]) for report in reports]
+    names = np.array(list(chain.from_iterable(report["students"] for report in reports)), dtype=object)
+    if not len(names):
+        return matrix
+
+    cols = np.repeat(np.arange(len(reports)), lengths)
+    rows = index.get_indexer(names)
+    known = rows >= 0
+    matrix[rows[known], cols[known]] = True
+    return matrix
+
+
+def attendance_streaks(matrix):
+    """
+    (current, longest) runs of consecutive presents per student.
+    Columns of `matrix` must be in chronological order.
+    """
+    n_students, n_sessions = matrix.shape
+    if n_sessions == 0:
+        zeros = np.zeros(n_students, dtype=int)
+        return zeros, zeros
+
+    # current streak = trailing presents
+    absent_from_end = ~matrix[:, ::-1]
+    current = np.where(absent_from_end.any(axis=1), absent_from_end.argmax(axis=1), n_sessions)
+
+    # longest streak = running count reset at every absence
+    running = np.cumsum(matrix, axis=1)
+    reset = np.maximum.accumulate(np.where(matrix, 0, running), axis=1)
+    longest = (running - reset).max(axis=1)
+    return current, longest
+
+
+def calculate_attendance_percentages(grouped_reports, master_students, include_maps=True):
+    """
+    Per-student present/total/percentage and streaks for every
+    (batch, section). With include_maps each report also gets an
+    attendanceMap {student: "Present"/"Absent"}; callers that only need
+    the summary can skip building those per-session dicts.
+    """
     results = {}
 
     for batch, sections in grouped_reports.items():
         for section, reports in sections.items():
-            students = master_students.get(batch, {}).get(section, [])
+            students = list(dict.fromkeys(master_students.get(batch, {}).get(section, [])))
             total_classes = len(reports)
 
-            # Initialize counts
-            student_counts = {s: {"present": 0, "total": total_classes} for s in students}
+            matrix = build_attendance_matrix(reports, students)
 
             # Mark presence/absence in each report
-            for report in reports:
-                present_students = set(report["students"])
-                attendance_map = {}
-                for s in students:
-                    if s in present_students:
-                        student_counts[s]["present"] += 1
-                        attendance_map[s] = "Present"
-                    else:
-                        attendance_map[s] = "Absent"
-                report["attendanceMap"] = attendance_map  # attach per-class status
+            if include_maps:
+                labels = STATUS_LABELS[matrix.T.view(np.uint8)].tolist()
+                for report, row in zip(reports, labels):
+                    report["attendanceMap"] = dict(zip(students, row))  # attach per-class status
+
+            # Streaks follow upload order
+            order = np.argsort([report.get("uploadedAt", "") for report in reports], kind="stable")
+            current, longest = attendance_streaks(matrix[:, order])
 
             # Compute %
-            for s, data in student_counts.items():
-                attended = data["present"]
-                total = data["total"]
-                pct = round((attended / total) * 100, 1) if total > 0 else 0
-                student_counts[s]["percentage"] = pct
+            present = matrix.sum(axis=1)
+            student_counts = {}
+            for i, s in enumerate(students):
+                attended = int(present[i])
+                student_counts[s] = {
+                    "present": attended,
+                    "total": total_classes,
+                    "percentage": round((attended / total_classes) * 100, 1) if total_classes > 0 else 0,
+                    "currentStreak": int(current[i]),
+                    "longestStreak": int(longest[i]),
+                }
 
             results[(batch, section)] = student_counts
 
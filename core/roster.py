@@ -0,0 +1,183 @@
+"""
+In-memory student roster built from students.xlsx.
+
+The workbook is downloaded and parsed once per process and indexed by ER
+number, batch and section. Before reuse it is revalidated against the
+object's ETag at most every ROSTER_REVALIDATE_SECONDS, so an upload from
+another worker shows up within that window; enrollment in this process
+calls invalidate_roster() and is visible at once.
+"""
+import io
+import os
+import time
+import threading
+from dotenv import load_dotenv
+
+from core.storage import get_storage
+
+# Load environment
+load_dotenv()
+
+ROSTER_KEY = "students.xlsx"
+# the Batch/Section/Name list used for per-section attendance percentages
+MASTER_STUDENTS_KEY = "reports/students.xlsx"
+ROSTER_REVALIDATE_SECONDS = float(os.getenv("ROSTER_REVALIDATE_SECONDS", "30"))
+
+# header cell -> field, for both workbook layouts
+COLUMN_FIELDS = {
+    "er number": "er_number",
+    "student name": "name",
+    "name": "name",
+    "batch name": "batch",
+    "batch": "batch",
+    "section": "section",
+    "email": "email",
+    "email address": "email",
+}
+
+_rosters = {}
+_locks = {}
+_lock = threading.Lock()
+_stats = {"loads": 0, "revalidations": 0, "invalidations": 0}
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        # ER numbers typed into Excel come back as floats
+        value = int(value)
+    return str(value).strip()
+
+
+def parse_roster(body):
+    """Rows of the first sheet as dicts with er_number/name/batch/section/email."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(io.BytesIO(body), read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        fields = [COLUMN_FIELDS.get(_cell(h).lower()) for h in header]
+        students = []
+        for row in rows:
+            record = {"er_number": "", "name": "", "batch": "", "section": "", "email": ""}
+            for field, value in zip(fields, row):
+                if field:
+                    record[field] = _cell(value)
+            if any(record.values()):
+                students.append(record)
+        return students
+    finally:
+        wb.close()
+
+
+class Roster:
+    """One version of a roster workbook with lookup indexes."""
+
+    def __init__(self, key, etag, last_modified, students):
+        self.key = key
+        self.etag = etag
+        self.last_modified = last_modified
+        self.students = students
+        self.checked_at = time.monotonic()
+
+        self.by_er = {}
+        self.by_batch = {}
+        self.by_section = {}
+        for s in students:
+            if s["er_number"]:
+                self.by_er.setdefault(s["er_number"], s)
+            self.by_batch.setdefault(s["batch"], []).append(s)
+            self.by_section.setdefault(s["batch"], {}).setdefault(s["section"], []).append(s)
+
+    def count(self, batch=None):
+        """Distinct students (by ER number; rows without one count individually)."""
+        students = self.students if batch is None else self.by_batch.get(batch, [])
+        with_er = {s["er_number"] for s in students if s["er_number"]}
+        return len(with_er) + sum(1 for s in students if not s["er_number"])
+
+    def list(self, batch=None, section=None):
+        if batch is None:
+            students = self.students
+        elif section is None:
+            students = self.by_batch.get(batch, [])
+        else:
+            students = self.by_section.get(batch, {}).get(section, [])
+        return list(students)
+
+    def lookup(self, er_number):
+        return self.by_er.get(_cell(er_number))
+
+    def sections(self):
+        """{batch: {section: [names]}} for rows that have all three."""
+        return {
+            batch: {
+                section: [s["name"] for s in rows if s["name"]]
+                for section, rows in sections.items() if section
+            }
+            for batch, sections in self.by_section.items() if batch
+        }
+
+
+def _bump(counter):
+    with _lock:
+        _stats[counter] += 1
+
+
+def _key_lock(key):
+    with _lock:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def get_roster(key=ROSTER_KEY):
+    """
+    Current roster for `key`. Raises storage.ObjectNotFound if the
+    workbook does not exist.
+    """
+    roster = _rosters.get(key)
+    if roster is not None and time.monotonic() - roster.checked_at < ROSTER_REVALIDATE_SECONDS:
+        return roster
+
+    # one download per key at a time; the others wait and reuse it
+    with _key_lock(key):
+        roster = _rosters.get(key)
+        if roster is not None and time.monotonic() - roster.checked_at < ROSTER_REVALIDATE_SECONDS:
+            return roster
+
+        storage = get_storage()
+        head = storage.head(key)
+        etag = (head.get("ETag") or "").strip('"')
+        if roster is not None and etag and roster.etag == etag:
+            roster.checked_at = time.monotonic()
+            _bump("revalidations")
+            return roster
+
+        body = storage.get_bytes(key, etag=head.get("ETag"), size=head.get("Size"))
+        roster = Roster(key, etag, head.get("LastModified"), parse_roster(body))
+        _rosters[key] = roster
+        _bump("loads")
+        return roster
+
+
+def invalidate_roster(key=None):
+    """Drops the cached roster (all of them without a key) after enrollment changes it."""
+    with _lock:
+        if key is None:
+            _rosters.clear()
+        else:
+            _rosters.pop(key, None)
+    _bump("invalidations")
+
+
+def roster_stats():
+    with _lock:
+        stats = dict(_stats)
+    return {
+        **stats,
+        "rosters": {
+            key: {"etag": r.etag, "rows": len(r.students), "students": r.count(),
+                  "age_seconds": round(time.monotonic() - r.checked_at, 1)}
+            for key, r in list(_rosters.items())
+        },
+    }
@@ -0,0 +1,243 @@
+"""
+Runs periodic jobs (alert evaluation, aggregate refresh, cache warming,
+the upload queue sweep) off the request path.
+
+In the app it is started when SCHEDULER_ENABLED=true; it can also run
+standalone:
+    python -m core.scheduler            # loop forever
+    python -m core.scheduler --once alerts
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+# Load environment
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_DIR = os.getenv("SCHEDULER_DIR", os.path.join(".cache", "scheduler"))
+SCHEDULER_TICK_SECONDS = float(os.getenv("SCHEDULER_TICK_SECONDS", "30"))
+
+
+def _run_alerts(full=False):
+    from core.alert_service import check_and_alert_low_attendance
+    alerts = check_and_alert_low_attendance(full=full)
+    return {"alerts": len(alerts), "sent": sum(1 for a in alerts if a["status"].startswith("Email Sent"))}
+
+
+def _run_aggregates():
+    from core.student_index import sync_index
+    from core.generate_attendance_charts import generate_overall_attendance
+    index = sync_index()
+    data = generate_overall_attendance(chart_format="none")
+    return {"indexed": index["indexed"], "students": len(data["students"]), "classes": data["total_classes"]}
+
+
+def _run_cache_warm():
+    from core.attendance_loader import iter_sessions
+    from core.report_cache import cache_stats
+    reports = sum(1 for _ in iter_sessions(columns=["er_number"]))
+    stats = cache_stats()
+    return {"reports": reports, "entries": stats["entries"], "hit_rate": stats["hit_rate"]}
+
+
+def _run_uploads():
+    # picks up uploads left behind by a restart or still waiting to retry
+    from core.upload_queue import drain_uploads, queue_stats
+    counts = drain_uploads()
+    return {**counts, "pending": queue_stats()["pending"]}
+
+
+# name -> (function, interval in seconds)
+JOBS = {
+    "alerts": (_run_alerts, float(os.getenv("SCHEDULER_ALERTS_SECONDS", "3600"))),
+    "aggregates": (_run_aggregates, float(os.getenv("SCHEDULER_AGGREGATES_SECONDS", "300"))),
+    "cache_warm": (_run_cache_warm, float(os.getenv("SCHEDULER_CACHE_WARM_SECONDS", "900"))),
+    "uploads": (_run_uploads, float(os.getenv("SCHEDULER_UPLOADS_SECONDS", "60"))),
+}
+
+_local_locks = {name: threading.Lock() for name in JOBS}
+_queue = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scheduler-queue")
+_started = False
+
+
+def _status_path(name):
+    return os.path.join(SCHEDULER_DIR, f"{name}.json")
+
+
+def read_status(name):
+    try:
+        with open(_status_path(name)) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_status(name, status):
+    os.makedirs(SCHEDULER_DIR, exist_ok=True)
+    tmp_path = f"{_status_path(name)}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as fh:
+        json.dump(status, fh)
+    os.replace(tmp_path, _status_path(name))
+
+
+class _JobLock:
+    """Non-blocking lock shared by every worker process on this host."""
+
+    def __init__(self, name):
+        self.name = name
+        self.fh = None
+
+    def acquire(self):
+        if not _local_locks[self.name].acquire(blocking=False):
+            return False
+        if fcntl is None:
+            return True
+        os.makedirs(SCHEDULER_DIR, exist_ok=True)
+        self.fh = open(os.path.join(SCHEDULER_DIR, f"{self.name}.lock"), "w")
+        try:
+            fcntl.flock(self.fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            self.fh.close()
+            self.fh = None
+            _local_locks[self.name].release()
+            return False
+
+    def release(self):
+        if self.fh is not None:
+            fcntl.flock(self.fh, fcntl.LOCK_UN)
+            self.fh.close()
+            self.fh = None
+        _local_locks[self.name].release()
+
+
+def is_due(name):
+    _, interval = JOBS[name]
+    last = read_status(name).get("last_started_epoch")
+    return last is None or time.time() - last >= interval
+
+
+def run_job(name, force=False, **kwargs):
+    """
+    Runs a job unless another worker holds it, or (without force) it ran
+    within its interval. Returns the recorded status, or None if skipped.
+    """
+    if name not in JOBS:
+        raise ValueError(f"Unknown job: {name}")
+
+    lock = _JobLock(name)
+    if not lock.acquire():
+        logger.info(f"Job {name} already running elsewhere, skipping")
+        return None
+    return _run_locked(name, lock, force, **kwargs)
+
+
+def _run_locked(name, lock, force=False, **kwargs):
+    """Runs a job whose lock the caller acquired, releasing it at the end."""
+    try:
+        # re-check under the lock: another worker may have just finished it
+        if not force and not is_due(name):
+            return None
+
+        fn, _ = JOBS[name]
+        status = read_status(name)
+        started = time.time()
+        status.update({
+            "state": "running",
+            "last_started_epoch": started,
+            "last_started": datetime.fromtimestamp(started, timezone.utc).isoformat(timespec="seconds"),
+            "pid": os.getpid(),
+        })
+        _write_status(name, status)
+
+        try:
+            result = fn(**kwargs)
+            status.update({"state": "ok", "result": result, "error": None})
+        except Exception as e:
+            logger.exception(f"Job {name} failed")
+            status.update({"state": "failed", "error": str(e)})
+
+        finished = time.time()
+        status.update({
+            "last_finished": datetime.fromtimestamp(finished, timezone.utc).isoformat(timespec="seconds"),
+            "last_duration_seconds": round(finished - started, 3),
+            "runs": status.get("runs", 0) + 1,
+        })
+        _write_status(name, status)
+        return status
+    finally:
+        lock.release()
+
+
+def enqueue(name, **kwargs):
+    """
+    Queues a job to run in the background now (the trigger endpoints use this).
+    The job lock is taken here and handed to the queued run, so a run that
+    is queued always happens. Returns False if the job is already running
+    or queued, in this or another worker.
+    """
+    if name not in JOBS:
+        raise ValueError(f"Unknown job: {name}")
+
+    lock = _JobLock(name)
+    if not lock.acquire():
+        return False
+    try:
+        _queue.submit(_run_locked, name, lock, True, **kwargs)
+    except Exception:
+        lock.release()
+        raise
+    return True
+
+
+def scheduler_status():
+    return {
+        name: {**read_status(name), "interval_seconds": interval}
+        for name, (_, interval) in JOBS.items()
+    }
+
+
+def _loop():
+    while True:
+        for name in JOBS:
+            try:
+                if is_due(name):
+                    run_job(name)
+            except Exception:
+                logger.exception(f"Scheduler tick failed for {name}")
+        time.sleep(SCHEDULER_TICK_SECONDS)
+
+
+def start_scheduler():
+    """Starts the scheduler thread once per process."""
+    global _started
+    if _started:
+        return
+    _started = True
+    threading.Thread(target=_loop, name="scheduler", daemon=True).start()
+    logger.info("✅ Scheduler started")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Run scheduled attendance jobs.")
+    parser.add_argument("--once", choices=sorted(JOBS), help="run one job now and exit")
+    args = parser.parse_args()
+
+    if args.once:
+        print(json.dumps(run_job(args.once, force=True), indent=2))
+    else:
+        _loop()
@@ -0,0 +1,227 @@
+"""
+Consolidated semester workbook: one row per student, one column per session.
+
+Usage:
+    python -m core.semester_export --batch 2022-2026 --out semester.xlsx
+    python -m core.semester_export --batch 2022-2026 --s3
+"""
+import os
+import json
+import uuid
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+
+from openpyxl import Workbook
+from dotenv import load_dotenv
+
+from core.attendance_loader import list_report_objects, BUCKET_NAME
+from core.student_index import get_connection, sync_index
+from core.storage import get_storage
+from core.report_layout import safe_part
+
+# Load environment
+load_dotenv()
+
+EXPORTS_PREFIX = os.getenv("EXPORTS_PREFIX", "exports/")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS export_jobs (
+    id          TEXT PRIMARY KEY,
+    batch       TEXT NOT NULL,
+    months      TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    started_at  TEXT NOT NULL,
+    finished_at TEXT,
+    result      TEXT,
+    error       TEXT
+);
+"""
+
+
+def _connection():
+    conn = get_connection()
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _session_label(date, time, subject, class_name):
+    label = datetime.strptime(date, "%Y-%m-%d").strftime("%d-%m-%Y") if date else "-"
+    parts = [label] + [v for v in (time, subject) if v is not None]
+    if class_name:
+        parts.append(f"({class_name})")
+    return " ".join(parts)
+
+
+def write_semester_workbook(batch, output, months=None):
+    """
+    Writes the consolidated workbook for a batch to `output` (path or
+    binary file object) using openpyxl's write-only mode.
+    Returns (students, sessions) counts.
+
+    Rows come from the student index (brought up to date for the batch
+    first) one student at a time, so memory grows with the number of
+    sessions, not students x sessions.
+    """
+    objects = list(list_report_objects(batch=batch, months=months))
+    sync_index(objects=objects)
+
+    conn = get_connection()
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS export_reports (report_key TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM temp.export_reports")
+    conn.executemany("INSERT OR IGNORE INTO temp.export_reports VALUES (?)", [(o["Key"],) for o in objects])
+    try:
+        # one column per report (session), in chronological order
+        sessions = conn.execute(
+            "SELECT s.report_key, MIN(s.date) AS date, MIN(s.time) AS time, "
+            "MIN(s.subject) AS subject, MIN(s.class) AS class "
+            "FROM sessions s JOIN temp.export_reports r ON r.report_key = s.report_key "
+            "GROUP BY s.report_key "
+            "ORDER BY date IS NULL, date, time IS NULL, time, s.report_key"
+        ).fetchall()
+        column = {row["report_key"]: i for i, row in enumerate(sessions)}
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title=safe_part(batch)[:31] or "Attendance")
+        ws.append(["ER Number", "Student Name"]
+                  + [_session_label(r["date"], r["time"], r["subject"], r["class"]) for r in sessions]
+                  + ["Present", "Total", "Attendance %"])
+
+        students = 0
+        current = None
+        for row in conn.execute(
+            "SELECT s.er_number, s.student_name, s.report_key, s.status "
+            "FROM sessions s JOIN temp.export_reports r ON r.report_key = s.report_key "
+            "ORDER BY s.er_number"
+        ):
+            if current is None or row["er_number"] != current["er_number"]:
+                if current is not None:
+                    _append_student(ws, current)
+                    students += 1
+                # "" = student not listed in that session's report
+                current = {"er_number": row["er_number"], "cells": [""] * len(sessions), "names": {}}
+            i = column[row["report_key"]]
+            present = "present" in (row["status"] or "").lower()
+            current["cells"][i] = "P" if present or current["cells"][i] == "P" else "A"
+            if row["student_name"]:
+                current["names"][i] = row["student_name"]
+        if current is not None:
+            _append_student(ws, current)
+            students += 1
+    finally:
+        conn.execute("DELETE FROM temp.export_reports")
+        conn.commit()
+
+    wb.save(output)
+    return students, len(sessions)
+
+
+def _append_student(ws, student):
+    cells = student["cells"]
+    present = cells.count("P")
+    total = present + cells.count("A")
+    # the name as of the latest session
+    names = student["names"]
+    name = names[max(names)] if names else None
+    ws.append([student["er_number"], name] + cells
+              + [present, total, round(present / total * 100, 1) if total else 0.0])
+
+
+def export_to_s3(batch, months=None, bucket=BUCKET_NAME):
+    """Builds the workbook in a temp file and uploads it (multipart when large)."""
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"semester_{safe_part(batch)}_{stamp}.xlsx"
+    key = f"{EXPORTS_PREFIX}{safe_part(batch)}/{filename}"
+
+    storage = get_storage(bucket)
+    with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as tmp:
+        tmp_path = tmp.name
+    try:
+        students, sessions = write_semester_workbook(batch, tmp_path, months)
+        storage.upload_file(tmp_path, key)
+    finally:
+        os.remove(tmp_path)
+
+    return {
+        "key": key,
+        "url": storage.url(key),
+        "students": students,
+        "sessions": sessions,
+    }
+
+
+def _save_job(job):
+    conn = _connection()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO export_jobs "
+            "(id, batch, months, status, started_at, finished_at, result, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job["id"], job["batch"], json.dumps(job["months"]), job["status"], job["startedAt"],
+             job["finishedAt"], json.dumps(job["result"]) if job["result"] else None, job["error"]),
+        )
+
+
+def start_export_job(batch, months=None):
+    """
+    Runs export_to_s3 on a background thread; returns the job id. Job
+    state is kept in the shared SQLite file so any worker can report it.
+    """
+    job_id = uuid.uuid4().hex[:12]
+    job = {
+        "id": job_id,
+        "batch": batch,
+        "months": list(months or []),
+        "status": "running",
+        "startedAt": datetime.now().isoformat(timespec="seconds"),
+        "finishedAt": None,
+        "result": None,
+        "error": None,
+    }
+    _save_job(job)
+
+    def run():
+        try:
+            result = export_to_s3(batch, months)
+            job.update(status="done", result=result)
+        except Exception as e:
+            job.update(status="failed", error=str(e))
+        finally:
+            job["finishedAt"] = datetime.now().isoformat(timespec="seconds")
+            _save_job(job)
+
+    threading.Thread(target=run, name=f"semester-export-{job_id}", daemon=True).start()
+    return job_id
+
+
+def get_export_job(job_id):
+    conn = _connection()
+    row = conn.execute("SELECT * FROM export_jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    return {
+        "id": row["id"],
+        "batch": row["batch"],
+        "months": json.loads(row["months"]),
+        "status": row["status"],
+        "startedAt": row["started_at"],
+        "finishedAt": row["finished_at"],
+        "result": json.loads(row["result"]) if row["result"] else None,
+        "error": row["error"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a consolidated semester workbook for a batch.")
+    parser.add_argument("--batch", required=True)
+    parser.add_argument("--month", action="append", help="YYYY-MM, repeatable")
+    parser.add_argument("--out", help="local .xlsx path")
+    parser.add_argument("--s3", action="store_true", help="upload to S3 under EXPORTS_PREFIX")
+    args = parser.parse_args()
+
+    if args.s3:
+        print(f"✅ Uploaded: {export_to_s3(args.batch, args.month)}")
+    else:
+        out = args.out or f"semester_{safe_part(args.batch)}.xlsx"
+        students, sessions = write_semester_workbook(args.batch, out, args.month)
+        print(f"✅ Wrote {out}: {students} students x {sessions} sessions")
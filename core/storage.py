@@ -0,0 +1,391 @@
+"""
+Object storage used by the app (reports, student photos, students.xlsx, exports).
+
+Backends, chosen with STORAGE_BACKEND:
+    s3      objects in the S3 bucket (BUCKET_NAME)
+    local   files under STORAGE_LOCAL_ROOT/<bucket>/ (dev, tests, benchmarks)
+    tiered  S3 behind a local hot tier (the report cache); the default
+
+Listings and metadata use S3's shapes (Key, ETag, Size, LastModified and
+Contents/CommonPrefixes pages) whatever the backend. Every call is counted
+and timed per operation; see storage_stats().
+"""
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+from core.aws_clients import lazy_client
+from core import report_cache
+
+# Load environment
+load_dotenv()
+
+AWS_REGION = os.getenv("AWS_REGION", "ap-south-1")
+BUCKET_NAME = os.getenv("BUCKET_NAME", os.getenv("AWS_BUCKET_NAME", "ict-attendances"))
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "tiered").lower()
+STORAGE_LOCAL_ROOT = os.getenv("STORAGE_LOCAL_ROOT", os.path.join(".cache", "storage"))
+
+MISSING_CODES = {"NoSuchKey", "404", "NotFound"}
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+class ObjectNotFound(KeyError):
+    """No object at that key."""
+
+
+class Storage:
+    """Common interface; backends implement the underscore methods."""
+
+    backend = None
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+    @contextmanager
+    def _timed(self, op, nbytes=0):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with _stats_lock:
+                entry = _stats.setdefault(f"{self.backend}.{op}", {"calls": 0, "bytes": 0, "seconds": 0.0})
+                entry["calls"] += 1
+                entry["bytes"] += nbytes
+                entry["seconds"] += time.perf_counter() - start
+
+    def list_pages(self, prefix="", delimiter=None):
+        """Yields {"Contents": [...], "CommonPrefixes": [...]} pages."""
+        pages = iter(self._list_pages(prefix, delimiter))
+        while True:
+            # one timed call per page, i.e. per list request
+            with self._timed("list"):
+                page = next(pages, None)
+            if page is None:
+                return
+            yield page
+
+    def list_objects(self, prefix=""):
+        for page in self.list_pages(prefix):
+            yield from page.get("Contents", []) or []
+
+    def head(self, key):
+        with self._timed("head"):
+            return self._head(key)
+
+    def exists(self, key):
+        try:
+            self.head(key)
+            return True
+        except ObjectNotFound:
+            return False
+
+    def get_bytes(self, key, etag=None, size=None):
+        """
+        Object body. `etag`/`size` from a listing let a caching backend
+        serve its copy without asking the remote store first.
+        """
+        with self._timed("get"):
+            body = self._get_bytes(key)
+        self._count_bytes("get", len(body))
+        return body
+
+    def get_object(self, key):
+        """(body, etag) from one read, so the ETag describes exactly these bytes."""
+        with self._timed("get"):
+            body, etag = self._get_object(key)
+        self._count_bytes("get", len(body))
+        return body, etag
+
+    def _get_bytes(self, key):
+        return self._get_object(key)[0]
+
+    def put_bytes(self, key, data, public=False, content_type=None):
+        with self._timed("put", len(data)):
+            self._put_bytes(key, data, public, content_type)
+
+    def upload_file(self, path, key, public=False):
+        with self._timed("put", os.path.getsize(path)):
+            self._upload_file(path, key, public)
+
+    def upload_fileobj(self, fileobj, key, public=False):
+        with self._timed("put"):
+            self._upload_fileobj(fileobj, key, public)
+
+    def copy(self, source_key, target_key):
+        with self._timed("copy"):
+            self._copy(source_key, target_key)
+
+    def delete(self, key):
+        with self._timed("delete"):
+            self._delete(key)
+
+    def _count_bytes(self, op, nbytes):
+        with _stats_lock:
+            _stats[f"{self.backend}.{op}"]["bytes"] += nbytes
+
+
+class S3Storage(Storage):
+    backend = "s3"
+
+    def __init__(self, bucket=BUCKET_NAME, client=None, region=AWS_REGION):
+        super().__init__(bucket)
+        self.client = client or lazy_client("s3")
+        self.region = region
+
+    def _missing(self, error):
+        code = getattr(error, "response", {}).get("Error", {}).get("Code")
+        return code in MISSING_CODES
+
+    def _list_pages(self, prefix, delimiter):
+        kwargs = {"Bucket": self.bucket, "Prefix": prefix}
+        if delimiter:
+            kwargs["Delimiter"] = delimiter
+        yield from self.client.get_paginator("list_objects_v2").paginate(**kwargs)
+
+    def _head(self, key):
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=key)
+        except Exception as e:
+            if self._missing(e):
+                raise ObjectNotFound(key) from e
+            raise
+        return {"Key": key, "ETag": head.get("ETag"), "Size": head.get("ContentLength"),
+                "LastModified": head.get("LastModified")}
+
+    def _get_object(self, key):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=key)
+            return response["Body"].read(), response.get("ETag")
+        except Exception as e:
+            if self._missing(e):
+                raise ObjectNotFound(key) from e
+            raise
+
+    def _extra(self, public, content_type=None):
+        extra = {}
+        if public:
+            extra["ACL"] = "public-read"
+        if content_type:
+            extra["ContentType"] = content_type
+        return extra
+
+    def _put_bytes(self, key, data, public, content_type):
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, **self._extra(public, content_type))
+
+    def _upload_file(self, path, key, public):
+        # boto3 switches to multipart uploads above 8 MB
+        self.client.upload_file(path, self.bucket, key, ExtraArgs=self._extra(public) or None)
+
+    def _upload_fileobj(self, fileobj, key, public):
+        self.client.upload_fileobj(fileobj, self.bucket, key, ExtraArgs=self._extra(public) or None)
+
+    def _copy(self, source_key, target_key):
+        self.client.copy_object(Bucket=self.bucket, Key=target_key,
+                                CopySource={"Bucket": self.bucket, "Key": source_key})
+
+    def _delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def url(self, key):
+        return f"https://{self.bucket}.s3.{self.region}.amazonaws.com/{key}"
+
+
+class LocalStorage(Storage):
+    backend = "local"
+
+    def __init__(self, bucket=BUCKET_NAME, root=STORAGE_LOCAL_ROOT):
+        super().__init__(bucket)
+        self.root = os.path.abspath(os.path.join(root, bucket))
+
+    def _path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Key outside storage root: {key}")
+        return path
+
+    def _meta(self, key, path):
+        st = os.stat(path)
+        return {
+            "Key": key,
+            "ETag": self._etag(st),
+            "Size": st.st_size,
+            "LastModified": datetime.fromtimestamp(st.st_mtime, timezone.utc),
+        }
+
+    @staticmethod
+    def _etag(st):
+        # size + mtime changes whenever the file is rewritten
+        return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+    def _list_pages(self, prefix, delimiter):
+        keys = []
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                key = os.path.relpath(os.path.join(dirpath, name), self.root).replace(os.sep, "/")
+                if key.startswith(prefix):
+                    keys.append(key)
+
+        contents, common = [], []
+        for key in sorted(keys):
+            rest = key[len(prefix):]
+            if delimiter and delimiter in rest:
+                common_prefix = prefix + rest.split(delimiter, 1)[0] + delimiter
+                if not common or common[-1]["Prefix"] != common_prefix:
+                    common.append({"Prefix": common_prefix})
+                continue
+            contents.append(self._meta(key, self._path(key)))
+        yield {"Contents": contents, "CommonPrefixes": common, "KeyCount": len(contents)}
+
+    def _head(self, key):
+        path = self._path(key)
+        if not os.path.isfile(path):
+            raise ObjectNotFound(key)
+        return self._meta(key, path)
+
+    def _get_object(self, key):
+        try:
+            with open(self._path(key), "rb") as fh:
+                # writes replace the file, so the open handle's stat matches what is read
+                return fh.read(), self._etag(os.fstat(fh.fileno()))
+        except FileNotFoundError as e:
+            raise ObjectNotFound(key) from e
+
+    def _write(self, key, writer):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as fh:
+            writer(fh)
+        os.replace(tmp_path, path)
+
+    def _put_bytes(self, key, data, public, content_type):
+        self._write(key, lambda fh: fh.write(data))
+
+    def _upload_file(self, path, key, public):
+        with open(path, "rb") as src:
+            self._write(key, lambda fh: shutil.copyfileobj(src, fh))
+
+    def _upload_fileobj(self, fileobj, key, public):
+        self._write(key, lambda fh: shutil.copyfileobj(fileobj, fh))
+
+    def _copy(self, source_key, target_key):
+        self._upload_file(self._path(source_key), target_key, False)
+
+    def _delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def url(self, key):
+        return "file://" + self._path(key)
+
+
+class TieredStorage(Storage):
+    """
+    Reads through a local hot tier (core.report_cache, keyed by key + ETag)
+    before the remote store; writes go straight to the remote store.
+    """
+
+    backend = "tiered"
+
+    def __init__(self, remote):
+        super().__init__(remote.bucket)
+        self.remote = remote
+
+    def get_bytes(self, key, etag=None, size=None):
+        if etag is None:
+            # no listing entry to go by: revalidate with a HEAD
+            meta = self.remote.head(key)
+            etag, size = meta.get("ETag"), meta.get("Size")
+        etag = (etag or "").strip('"')
+
+        with self._timed("get"):
+            body = report_cache.get_cached_body(key, etag, size)
+        if body is not None:
+            self._count_bytes("get", len(body))
+            report_cache.record_hit()
+            return body
+
+        report_cache.record_miss()
+        # cache under the fetched object's ETag: the listing may predate a rewrite
+        body, fetched = self.remote.get_object(key)
+        report_cache.put_cached_body(key, (fetched or "").strip('"'), body)
+        return body
+
+    def get_object(self, key):
+        return self.remote.get_object(key)
+
+    def list_pages(self, prefix="", delimiter=None):
+        return self.remote.list_pages(prefix, delimiter)
+
+    def head(self, key):
+        return self.remote.head(key)
+
+    def put_bytes(self, key, data, public=False, content_type=None):
+        self.remote.put_bytes(key, data, public, content_type)
+
+    def upload_file(self, path, key, public=False):
+        self.remote.upload_file(path, key, public)
+
+    def upload_fileobj(self, fileobj, key, public=False):
+        self.remote.upload_fileobj(fileobj, key, public)
+
+    def copy(self, source_key, target_key):
+        self.remote.copy(source_key, target_key)
+
+    def delete(self, key):
+        self.remote.delete(key)
+
+    def url(self, key):
+        return self.remote.url(key)
+
+
+_storages = {}
+_storages_lock = threading.Lock()
+
+
+def make_storage(backend=None, bucket=None):
+    backend = (backend or STORAGE_BACKEND).lower()
+    bucket = bucket or BUCKET_NAME
+    if backend == "s3":
+        return S3Storage(bucket)
+    if backend == "local":
+        return LocalStorage(bucket)
+    if backend == "tiered":
+        return TieredStorage(S3Storage(bucket))
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+def get_storage(bucket=None):
+    """Process-wide storage for a bucket (BUCKET_NAME by default)."""
+    bucket = bucket or BUCKET_NAME
+    with _storages_lock:
+        storage = _storages.get(bucket)
+        if storage is None:
+            storage = make_storage(bucket=bucket)
+            _storages[bucket] = storage
+        return storage
+
+
+def set_storage(storage):
+    """Replaces the storage for its bucket (tests, benchmarks)."""
+    with _storages_lock:
+        _storages[storage.bucket] = storage
+    return storage
+
+
+def storage_stats():
+    with _stats_lock:
+        return {
+            op: {"calls": s["calls"], "bytes": s["bytes"], "ms": round(s["seconds"] * 1000, 1)}
+            for op, s in sorted(_stats.items())
+        }
@@ -0,0 +1,134 @@
+import io
+import os
+import csv
+import json
+import zlib
+
+from flask import Response, request, stream_with_context
+
+try:
+    import brotli  # optional, enables "br" when installed
+except ImportError:
+    brotli = None
+
+STREAM_CHUNK_BYTES = 64 * 1024
+# buffered responses smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESSIBLE_TYPES = ("application/json", "text/csv", "text/plain", "text/html", "image/svg+xml")
+
+
+def json_array_chunks(items):
+    """Serialises an iterable as a JSON array, one element at a time."""
+    yield "["
+    first = True
+    for item in items:
+        if not first:
+            yield ","
+        first = False
+        yield json.dumps(item, default=str)
+    yield "]"
+
+
+def csv_chunks(rows):
+    """Serialises an iterable of rows as CSV text, one row at a time."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow(row)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate(0)
+
+
+def file_chunks(fileobj, chunk_size=STREAM_CHUNK_BYTES):
+    """Reads a file object in fixed-size chunks and closes it at the end."""
+    try:
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+def negotiate_encoding():
+    """Best content encoding the client accepts: br, gzip or identity."""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def _compressor(encoding):
+    """(compress, flush, finish) for an encoding."""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=5)
+        return compressor.process, compressor.flush, compressor.finish
+    # wbits=31 -> gzip container
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def compress_chunks(chunks, encoding):
+    """
+    Compresses a stream of str/bytes chunks on the fly. Each chunk is
+    flushed, so the client can decode everything sent so far instead of
+    waiting for the compressor's window to fill.
+    """
+    if encoding is None:
+        for chunk in chunks:
+            yield chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+        return
+
+    compress, flush, finish = _compressor(encoding)
+    for chunk in chunks:
+        data = compress(chunk.encode("utf-8") if isinstance(chunk, str) else chunk) + flush()
+        if data:
+            yield data
+    tail = finish()
+    if tail:
+        yield tail
+
+
+def streaming_response(chunks, mimetype, filename=None, status=200):
+    """Chunked response from a generator, compressed per Accept-Encoding."""
+    encoding = negotiate_encoding()
+    response = Response(
+        stream_with_context(compress_chunks(chunks, encoding)),
+        status=status,
+        mimetype=mimetype,
+    )
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    if filename:
+        response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def compress_response(response):
+    """after_request hook: compresses buffered JSON/CSV/text responses."""
+    if (
+        response.is_streamed
+        or response.direct_passthrough
+        or response.status_code != 200
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_TYPES
+    ):
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+
+    response.set_data(b"".join(compress_chunks([data], encoding)))
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
@@ -0,0 +1,286 @@
+"""
+Per-student attendance index (ER number -> sessions) in a local SQLite file.
+
+Reports are added as they are written (save_attendance_to_excel /
+download_attendance); `python -m core.student_index --sync` backfills
+anything already in S3.
+"""
+import os
+import time
+import sqlite3
+import argparse
+import threading
+from dotenv import load_dotenv
+
+from core.attendance_loader import list_report_objects, iter_sessions
+
+# Load environment
+load_dotenv()
+
+STUDENT_INDEX_PATH = os.getenv("STUDENT_INDEX_PATH", os.path.join(".cache", "student_index.sqlite3"))
+
+INDEX_COLUMNS = ["er_number", "student_name", "date", "time", "subject", "batch", "class", "status"]
+
+_local = threading.local()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    report_key   TEXT NOT NULL,
+    er_number    TEXT NOT NULL,
+    student_name TEXT,
+    date         TEXT,
+    time         TEXT,
+    subject      TEXT,
+    batch        TEXT,
+    class        TEXT,
+    status       TEXT,
+    PRIMARY KEY (report_key, er_number)
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_er ON sessions (er_number, date, time);
+CREATE TABLE IF NOT EXISTS indexed_reports (
+    report_key TEXT PRIMARY KEY,
+    etag       TEXT
+);
+CREATE TABLE IF NOT EXISTS student_changes (
+    er_number  TEXT NOT NULL,
+    changed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_student_changes_at ON student_changes (changed_at);
+"""
+
+
+def get_connection():
+    """One connection per thread; WAL lets app workers read while one writes."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(STUDENT_INDEX_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(STUDENT_INDEX_PATH, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+def _record_changes(conn, report_key, er_numbers=()):
+    """Marks students whose stats change because a report was (re)indexed or removed."""
+    previous = [r[0] for r in conn.execute("SELECT er_number FROM sessions WHERE report_key = ?", (report_key,))]
+    now = time.time()
+    conn.executemany(
+        "INSERT INTO student_changes (er_number, changed_at) VALUES (?, ?)",
+        [(er, now) for er in set(previous) | set(er_numbers)],
+    )
+
+
+def mark_students_changed(er_numbers):
+    """Flags students for the next changed_students() call, e.g. to retry their alerts."""
+    conn = get_connection()
+    now = time.time()
+    with conn:
+        conn.executemany(
+            "INSERT INTO student_changes (er_number, changed_at) VALUES (?, ?)",
+            [(er, now) for er in set(er_numbers)],
+        )
+
+
+def changed_students(since):
+    """ER numbers whose sessions changed after `since` (epoch seconds)."""
+    conn = get_connection()
+    return [r[0] for r in conn.execute(
+        "SELECT DISTINCT er_number FROM student_changes WHERE changed_at > ?", (since,)
+    )]
+
+
+def prune_changes(before):
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM student_changes WHERE changed_at <= ?", (before,))
+
+
+def subject_stats(er_numbers=None):
+    """
+    Per (student, subject) present/total counts, for all students or a subset,
+    counted like the dashboard: a class is a distinct (date, subject) of the
+    student's batch, present counts distinct classes attended, and sessions
+    the student is missing from count as absent. CSV exports are left out.
+    Returns {er_number: {"name": ..., "subjects": {subject: (present, total)}}}.
+    """
+    conn = get_connection()
+    report = "date IS NOT NULL AND LOWER(report_key) NOT LIKE '%.csv'"
+    classes = (
+        "SELECT DISTINCT COALESCE(batch, '') AS batch, COALESCE(subject, '-') AS subject, date "
+        f"FROM sessions WHERE {report}"
+    )
+    query = (
+        f"WITH classes AS ({classes}), "
+        "students AS ("
+        "  SELECT er_number, MAX(student_name) AS name FROM sessions "
+        f"  WHERE {report} {{where}} GROUP BY er_number"
+        "), "
+        "attended AS ("
+        "  SELECT er_number, COALESCE(subject, '-') AS subject, COUNT(DISTINCT date) AS present FROM sessions "
+        f"  WHERE {report} AND LOWER(status) LIKE '%present%' {{where}} GROUP BY er_number, COALESCE(subject, '-')"
+        "), "
+        "totals AS ("
+        "  SELECT b.er_number, c.subject, COUNT(*) AS total "
+        f"  FROM (SELECT DISTINCT er_number, COALESCE(batch, '') AS batch FROM sessions WHERE {report} {{where}}) b "
+        "  JOIN classes c ON c.batch = b.batch GROUP BY b.er_number, c.subject"
+        ") "
+        "SELECT t.er_number, s.name, t.subject, COALESCE(a.present, 0) AS present, t.total "
+        "FROM totals t JOIN students s ON s.er_number = t.er_number "
+        "LEFT JOIN attended a ON a.er_number = t.er_number AND a.subject = t.subject"
+    )
+    rows = []
+    if er_numbers is None:
+        rows = conn.execute(query.format(where="")).fetchall()
+    else:
+        er_numbers = list(er_numbers)
+        # stay under SQLite's bound-parameter limit (the subset is bound three times)
+        for i in range(0, len(er_numbers), 300):
+            chunk = er_numbers[i:i + 300]
+            where = f"AND er_number IN ({', '.join('?' for _ in chunk)})"
+            rows.extend(conn.execute(query.format(where=where), chunk * 3).fetchall())
+
+    stats = {}
+    for row in rows:
+        entry = stats.setdefault(row["er_number"], {"name": row["name"], "subjects": {}})
+        entry["subjects"][row["subject"]] = (row["present"], row["total"])
+    return stats
+
+
+def index_report(report_key, rows, etag=None):
+    """
+    Replaces the indexed rows of one report. `rows` are dicts with
+    INDEX_COLUMNS keys (date as YYYY-MM-DD, status lower-case).
+    """
+    records = [
+        (report_key, *[(str(row.get(c)).strip() if row.get(c) is not None else None) for c in INDEX_COLUMNS])
+        for row in rows
+        if row.get("er_number")
+    ]
+    conn = get_connection()
+    with conn:
+        _record_changes(conn, report_key, [r[1] for r in records])
+        conn.execute("DELETE FROM sessions WHERE report_key = ?", (report_key,))
+        conn.executemany(
+            f"INSERT OR REPLACE INTO sessions (report_key, {', '.join(INDEX_COLUMNS)}) "
+            f"VALUES (?, {', '.join('?' for _ in INDEX_COLUMNS)})",
+            records,
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO indexed_reports (report_key, etag) VALUES (?, ?)",
+            (report_key, etag),
+        )
+    return len(records)
+
+
+def remove_report(report_key):
+    conn = get_connection()
+    with conn:
+        _record_changes(conn, report_key)
+        conn.execute("DELETE FROM sessions WHERE report_key = ?", (report_key,))
+        conn.execute("DELETE FROM indexed_reports WHERE report_key = ?", (report_key,))
+
+
+def frame_rows(frame):
+    """Loader session frame -> index rows."""
+    df = frame.reindex(columns=INDEX_COLUMNS)
+    df["date"] = df["date"].dt.strftime("%Y-%m-%d")
+    df = df.astype(object).where(df.notna(), None)
+    return df.to_dict(orient="records")
+
+
+def sync_index(batch=None, months=None, objects=None):
+    """
+    Indexes reports that are new or changed in S3 and drops ones that
+    were deleted (deletions only for a full, unfiltered sync). `objects`
+    is an existing listing to index instead of listing again.
+    """
+    conn = get_connection()
+    known = dict(conn.execute("SELECT report_key, etag FROM indexed_reports").fetchall())
+
+    full = objects is None and not batch and not months
+    if objects is None:
+        objects = list(list_report_objects(batch=batch, months=months))
+    pending = [o for o in objects if known.get(o["Key"]) != (o.get("ETag") or "").strip('"')]
+
+    indexed = 0
+    for session in iter_sessions(columns=INDEX_COLUMNS, objects=pending):
+        index_report(session["key"], frame_rows(session["frame"]), etag=session["etag"])
+        indexed += 1
+
+    removed = 0
+    if full:
+        from core.upload_queue import pending_keys
+        # reports indexed when written but still waiting for (or retrying) their
+        # upload are not listed yet; a failed upload is no longer pending and goes
+        listed = {o["Key"] for o in objects} | pending_keys()
+        for key in set(known) - listed:
+            remove_report(key)
+            removed += 1
+
+    return {"indexed": indexed, "removed": removed, "total": len(objects)}
+
+
+def student_attendance(er_number):
+    """Per-subject percentages and session timeline for one student, or None."""
+    conn = get_connection()
+    rows = conn.execute(
+        "SELECT report_key, student_name, date, time, subject, batch, class, status "
+        "FROM sessions WHERE er_number = ? ORDER BY date, time",
+        (str(er_number).strip(),),
+    ).fetchall()
+    if not rows:
+        return None
+
+    subjects = {}
+    timeline = []
+    for row in rows:
+        present = "present" in (row["status"] or "").lower()
+        stats = subjects.setdefault(row["subject"] or "-", {"present": 0, "total": 0})
+        stats["total"] += 1
+        stats["present"] += int(present)
+        timeline.append({
+            "date": row["date"],
+            "time": row["time"],
+            "subject": row["subject"],
+            "batch": row["batch"],
+            "class": row["class"],
+            "status": "Present" if present else "Absent",
+            "report": row["report_key"],
+        })
+
+    subject_list = [
+        {
+            "subject": subject,
+            "present": stats["present"],
+            "total": stats["total"],
+            "percentage": round(stats["present"] / stats["total"] * 100, 1) if stats["total"] else 0.0,
+        }
+        for subject, stats in sorted(subjects.items())
+    ]
+    present_total = sum(s["present"] for s in subject_list)
+
+    return {
+        "er_number": str(er_number).strip(),
+        "name": next((r["student_name"] for r in reversed(rows) if r["student_name"]), None),
+        "present": present_total,
+        "total": len(rows),
+        "percentage": round(present_total / len(rows) * 100, 1),
+        "subjects": subject_list,
+        "timeline": timeline,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the per-student attendance index.")
+    parser.add_argument("--sync", action="store_true", help="index new/changed reports from S3")
+    parser.add_argument("--batch")
+    parser.add_argument("--month", action="append")
+    parser.add_argument("--student", help="print one student's attendance")
+    args = parser.parse_args()
+
+    if args.sync:
+        print(f"✅ Index synced: {sync_index(args.batch, args.month)}")
+    if args.student:
+        print(student_attendance(args.student))
@@ -0,0 +1,131 @@
+"""
+De-duplicates /take_attendance resubmissions.
+
+A submission is keyed by the SHA-256 of its images plus batch/subject/class.
+The first request claims the key and runs recognition; a resubmission
+within SUBMISSION_CACHE_SECONDS gets the stored result back instead of a
+second run and a duplicate report. A resubmission that arrives while the
+first is still running is turned away at once (SubmissionPending) and
+the client polls submission_status() instead of holding a worker.
+"""
+import os
+import json
+import time
+import hashlib
+from dotenv import load_dotenv
+
+from core.student_index import get_connection
+
+# Load environment
+load_dotenv()
+
+SUBMISSION_CACHE_SECONDS = float(os.getenv("SUBMISSION_CACHE_SECONDS", "600"))
+# a claim older than this is treated as a crashed run and can be retaken
+SUBMISSION_PENDING_SECONDS = float(os.getenv("SUBMISSION_PENDING_SECONDS", "300"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    submission_key TEXT PRIMARY KEY,
+    state          TEXT NOT NULL,
+    created_at     REAL NOT NULL,
+    result         TEXT
+);
+"""
+
+
+class SubmissionPending(Exception):
+    """An identical submission is still being processed."""
+
+
+def _connection():
+    conn = get_connection()
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def submission_key(batch_name, subject, class_name, image_files):
+    """Hash of the request; image order does not matter. Files are rewound."""
+    image_hashes = []
+    for f in image_files:
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+        f.seek(0)
+        image_hashes.append(digest.hexdigest())
+
+    digest = hashlib.sha256()
+    for part in [batch_name, subject, class_name or ""] + sorted(image_hashes):
+        digest.update(part.strip().encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+def _try_claim(conn, key):
+    """Returns ("done", result), ("pending", None) or ("claimed", None)."""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT state, created_at, result FROM submissions WHERE submission_key = ?", (key,)
+        ).fetchone()
+        if row is not None:
+            if row["state"] == "done" and now - row["created_at"] < SUBMISSION_CACHE_SECONDS:
+                return "done", json.loads(row["result"])
+            if row["state"] == "pending" and now - row["created_at"] < SUBMISSION_PENDING_SECONDS:
+                return "pending", None
+        conn.execute(
+            "INSERT OR REPLACE INTO submissions (submission_key, state, created_at) VALUES (?, 'pending', ?)",
+            (key, now),
+        )
+        return "claimed", None
+    finally:
+        conn.commit()
+
+
+def begin_submission(key):
+    """
+    Returns the stored result for a recent identical submission, or None
+    once this caller owns the key (it must then call finish_submission or
+    abandon_submission). Raises SubmissionPending while another request
+    is running the same submission.
+    """
+    state, result = _try_claim(_connection(), key)
+    if state == "pending":
+        raise SubmissionPending("An identical submission is still being processed")
+    return result
+
+
+def submission_status(key):
+    """("done", result), ("pending", None) or (None, None) for an unknown or expired key."""
+    conn = _connection()
+    row = conn.execute(
+        "SELECT state, created_at, result FROM submissions WHERE submission_key = ?", (key,)
+    ).fetchone()
+    now = time.time()
+    if row is None:
+        return None, None
+    if row["state"] == "done" and now - row["created_at"] < SUBMISSION_CACHE_SECONDS:
+        return "done", json.loads(row["result"])
+    if row["state"] == "pending" and now - row["created_at"] < SUBMISSION_PENDING_SECONDS:
+        return "pending", None
+    return None, None
+
+
+def finish_submission(key, result):
+    conn = _connection()
+    with conn:
+        conn.execute(
+            "UPDATE submissions SET state = 'done', created_at = ?, result = ? WHERE submission_key = ?",
+            (time.time(), json.dumps(result), key),
+        )
+        # drop anything past its window while we are here
+        conn.execute(
+            "DELETE FROM submissions WHERE created_at < ?",
+            (time.time() - max(SUBMISSION_CACHE_SECONDS, SUBMISSION_PENDING_SECONDS),),
+        )
+
+
+def abandon_submission(key):
+    """Releases a claim after a failed run so a retry can go ahead."""
+    conn = _connection()
+    with conn:
+        conn.execute("DELETE FROM submissions WHERE submission_key = ? AND state = 'pending'", (key,))
@@ -0,0 +1,78 @@
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger("attendance.timings")
+
+
+class StageTimer:
+    """
+    Collects wall time per named stage plus simple counters for one run.
+
+        timer = StageTimer("take_attendance")
+        with timer.stage("detect_faces"):
+            ...
+        timer.count("faces_detected", 3)
+
+    Stages may repeat (time and calls accumulate) and may be entered from
+    several threads.
+    """
+
+    def __init__(self, name, **fields):
+        self.name = name
+        self.fields = dict(fields)
+        self.stages = {}
+        self.counters = {}
+        self.logged = False
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stage = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+                stage["seconds"] += elapsed
+                stage["calls"] += 1
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "total_ms": round((time.perf_counter() - self._started) * 1000, 1),
+                "stages": {
+                    name: {"ms": round(s["seconds"] * 1000, 1), "calls": s["calls"]}
+                    for name, s in self.stages.items()
+                },
+                "counters": dict(self.counters),
+            }
+
+    def log(self, **fields):
+        """Writes the run as one JSON log line."""
+        record = {"event": self.name, **self.fields, **fields, **self.as_dict()}
+        logger.info(json.dumps(record, default=str))
+        self.logged = True
+        return record
+
+
+def configure_timing_log(level=logging.INFO):
+    """
+    Emits the timing lines on stderr (one JSON line per run) whatever the
+    root logging setup is. Safe to call more than once.
+    """
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+        logger.addHandler(handler)
+    logger.setLevel(level)
+    # the handler above is enough; don't repeat the line via a root handler
+    logger.propagate = False
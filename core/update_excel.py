@@ -1,33 +1,25 @@
-import boto3
 import pandas as pd
 from datetime import datetime
 import os
 
-AWS_REGION = os.getenv("AWS_REGION", "ap-south-1")
-AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY")
-AWS_SECRET_KEY = os.getenv("AWS_SECRET_KEY")
-BUCKET_NAME = "ict-attendances"
-EXCEL_FILE = 'students.xlsx'
+from core.storage import get_storage
+from core.roster import invalidate_roster
 
-s3_client = boto3.client(
-    "s3",
-    region_name=AWS_REGION,
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY,
-)
+EXCEL_FILE = 'students.xlsx'
 
 from openpyxl import Workbook
 
 def sync_students_to_excel():
     # 🔹 Get student objects from S3
-    response = s3_client.list_objects_v2(Bucket=BUCKET_NAME)
+    storage = get_storage()
+    objects = list(storage.list_objects())
 
-    if "Contents" not in response:
+    if not objects:
         print("⚠️ No students found in S3.")
         return
 
     data = []
-    for obj in response["Contents"]:
+    for obj in objects:
         key = obj["Key"]
 
         # Ignore the Excel file itself
@@ -92,5 +84,6 @@ def sync_students_to_excel():
     wb.save(EXCEL_FILE)
 
     # Upload back to S3
-    s3_client.upload_file(EXCEL_FILE, BUCKET_NAME, EXCEL_FILE)
+    storage.upload_file(EXCEL_FILE, EXCEL_FILE)
+    invalidate_roster(EXCEL_FILE)
     print(f"✅ Excel synced successfully with {len(data)} students.")
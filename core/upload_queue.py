@@ -0,0 +1,321 @@
+"""
+Write-behind uploads for generated reports.
+
+A report is written to local disk, queued here with its final object key,
+and the request returns straight away with the (reserved) URL. A background
+uploader pushes queued files to storage, retrying failures with backoff.
+The queue lives in the shared SQLite file, so uploads survive a restart and
+any worker process can pick up what another left behind.
+
+States: pending -> uploading -> done, or failed after UPLOAD_MAX_ATTEMPTS.
+
+    python -m core.upload_queue             # drain the queue once
+    python -m core.upload_queue --status
+"""
+import os
+import time
+import uuid
+import logging
+import argparse
+import threading
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+from core.student_index import get_connection
+from core.storage import get_storage
+
+# Load environment
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_WRITE_BEHIND = os.getenv("UPLOAD_WRITE_BEHIND", "true").lower() in ("1", "true", "yes")
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", os.path.join(".cache", "uploads"))
+UPLOAD_MAX_ATTEMPTS = int(os.getenv("UPLOAD_MAX_ATTEMPTS", "8"))
+UPLOAD_RETRY_BASE_SECONDS = float(os.getenv("UPLOAD_RETRY_BASE_SECONDS", "2"))
+UPLOAD_POLL_SECONDS = float(os.getenv("UPLOAD_POLL_SECONDS", "30"))
+# an upload still "uploading" after this long belongs to a crashed worker
+UPLOAD_LEASE_SECONDS = float(os.getenv("UPLOAD_LEASE_SECONDS", "300"))
+UPLOAD_KEEP_DONE_HOURS = float(os.getenv("UPLOAD_KEEP_DONE_HOURS", "24"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    object_key   TEXT PRIMARY KEY,
+    bucket       TEXT NOT NULL,
+    path         TEXT NOT NULL,
+    public       INTEGER NOT NULL DEFAULT 0,
+    delete_after INTEGER NOT NULL DEFAULT 0,
+    state        TEXT NOT NULL,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    created_at   REAL NOT NULL,
+    updated_at   REAL NOT NULL,
+    last_error   TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_uploads_state ON uploads (state, next_attempt);
+"""
+
+
+
+class UploadInFlight(Exception):
+    """Another worker is uploading the same key right now."""
+
+
+_wakeup = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _connection():
+    conn = get_connection()
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def spool_path(filename):
+    """A unique path in the spool directory for a file that only needs to live until uploaded."""
+    os.makedirs(UPLOAD_SPOOL_DIR, exist_ok=True)
+    return os.path.join(UPLOAD_SPOOL_DIR, f"{uuid.uuid4().hex}_{os.path.basename(filename)}")
+
+
+def queue_upload(path, key, bucket=None, public=False, delete_after=False):
+    """
+    Queues a local file for upload to `key` and returns its status. The file
+    must already be complete on disk. A queued or failed upload of the same
+    key is replaced; one that is uploading right now raises UploadInFlight.
+    With UPLOAD_WRITE_BEHIND off the upload happens here and a failure raises.
+    """
+    storage = get_storage(bucket)
+    # make sure the file is on disk before the request is answered
+    with open(path, "rb") as fh:
+        os.fsync(fh.fileno())
+
+    now = time.time()
+    path = os.path.abspath(path)
+    conn = _connection()
+    with conn:
+        previous = conn.execute(
+            "SELECT path, delete_after FROM uploads WHERE object_key = ?", (key,)
+        ).fetchone()
+        # a row another worker has claimed is left alone, unless its lease ran out
+        queued = conn.execute(
+            "INSERT INTO uploads "
+            "(object_key, bucket, path, public, delete_after, state, attempts, next_attempt, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, 'pending', 0, ?, ?, ?) "
+            "ON CONFLICT (object_key) DO UPDATE SET "
+            "bucket = excluded.bucket, path = excluded.path, public = excluded.public, "
+            "delete_after = excluded.delete_after, state = 'pending', attempts = 0, "
+            "next_attempt = excluded.next_attempt, created_at = excluded.created_at, "
+            "updated_at = excluded.updated_at, last_error = NULL "
+            "WHERE state != 'uploading' OR updated_at < ?",
+            (key, storage.bucket, path, int(public), int(delete_after), now, now, now, now - UPLOAD_LEASE_SECONDS),
+        ).rowcount
+    if not queued:
+        raise UploadInFlight(f"{key} is being uploaded by another worker")
+    # a newer file for the same key replaces a spooled one that never went up
+    if previous is not None and previous["delete_after"] and previous["path"] != path:
+        try:
+            os.remove(previous["path"])
+        except OSError:
+            pass
+
+    if not UPLOAD_WRITE_BEHIND:
+        row = _claim(conn, key)
+        if row is not None and not _upload(conn, row):
+            raise Exception(f"Upload of {key} failed: {upload_status(key)['last_error']}")
+        return upload_status(key)
+
+    start_uploader()
+    _wakeup.set()
+    return upload_status(key)
+
+
+def delete_when_uploaded(key, path):
+    """
+    Marks a spooled file queued with delete_after=False for removal once its
+    upload is done, or removes it now if it already is (e.g. after a response
+    that streamed it has closed).
+    """
+    conn = _connection()
+    path = os.path.abspath(path)
+    with conn:
+        waiting = conn.execute(
+            "UPDATE uploads SET delete_after = 1 WHERE object_key = ? AND path = ? AND state != 'done'",
+            (key, path),
+        ).rowcount
+    if not waiting:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _row_status(row):
+    status = dict(row)
+    status["public"] = bool(status["public"])
+    status["delete_after"] = bool(status["delete_after"])
+    for field in ("next_attempt", "created_at", "updated_at"):
+        status[field] = datetime.fromtimestamp(status[field], timezone.utc).isoformat(timespec="seconds")
+    status["url"] = get_storage(row["bucket"]).url(row["object_key"])
+    return status
+
+
+def upload_status(key):
+    conn = _connection()
+    row = conn.execute("SELECT * FROM uploads WHERE object_key = ?", (key,)).fetchone()
+    return _row_status(row) if row is not None else None
+
+
+def pending_keys():
+    """Keys queued or mid-upload, i.e. reports that exist locally but not yet in storage."""
+    conn = _connection()
+    return {r[0] for r in conn.execute("SELECT object_key FROM uploads WHERE state IN ('pending', 'uploading')")}
+
+
+def _claim(conn, key=None):
+    """Marks the next due upload (or `key`) as uploading and returns its row."""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        query = (
+            "SELECT * FROM uploads WHERE "
+            "((state = 'pending' AND next_attempt <= ?) OR (state = 'uploading' AND updated_at < ?))"
+        )
+        params = [now, now - UPLOAD_LEASE_SECONDS]
+        if key is not None:
+            query += " AND object_key = ?"
+            params.append(key)
+        row = conn.execute(query + " ORDER BY next_attempt LIMIT 1", params).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE uploads SET state = 'uploading', attempts = attempts + 1, updated_at = ? WHERE object_key = ?",
+            (now, row["object_key"]),
+        )
+        return row
+    finally:
+        conn.commit()
+
+
+def _upload(conn, row):
+    """Uploads one claimed row; returns True on success."""
+    key = row["object_key"]
+    attempts = row["attempts"] + 1
+    try:
+        get_storage(row["bucket"]).upload_file(row["path"], key, public=bool(row["public"]))
+    except Exception as e:
+        # a missing local file will not come back, so don't retry it
+        gone = isinstance(e, FileNotFoundError)
+        failed = gone or attempts >= UPLOAD_MAX_ATTEMPTS
+        delay = min(600.0, UPLOAD_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+        with conn:
+            conn.execute(
+                "UPDATE uploads SET state = ?, next_attempt = ?, updated_at = ?, last_error = ? WHERE object_key = ?",
+                ("failed" if failed else "pending", time.time() + delay, time.time(), str(e), key),
+            )
+        logger.warning(f"⚠️ Upload of {key} failed (attempt {attempts}): {e}")
+        return False
+
+    with conn:
+        conn.execute(
+            "UPDATE uploads SET state = 'done', updated_at = ?, last_error = NULL WHERE object_key = ?",
+            (time.time(), key),
+        )
+        # read again: delete_when_uploaded may have set it since the claim
+        delete_after = conn.execute(
+            "SELECT delete_after FROM uploads WHERE object_key = ?", (key,)
+        ).fetchone()[0]
+        conn.execute(
+            "DELETE FROM uploads WHERE state = 'done' AND updated_at < ?",
+            (time.time() - UPLOAD_KEEP_DONE_HOURS * 3600,),
+        )
+    if delete_after:
+        try:
+            os.remove(row["path"])
+        except OSError:
+            pass
+
+    # the new report is now visible to listings
+    from core.http_cache import clear_memo
+    clear_memo()
+    return True
+
+
+def drain_uploads():
+    """Uploads everything that is due. Returns counts for this pass."""
+    conn = _connection()
+    counts = {"uploaded": 0, "failed": 0}
+    while True:
+        row = _claim(conn)
+        if row is None:
+            return counts
+        counts["uploaded" if _upload(conn, row) else "failed"] += 1
+
+
+def retry_failed():
+    """Puts failed uploads back in the queue (e.g. after an S3 outage)."""
+    conn = _connection()
+    with conn:
+        n = conn.execute(
+            "UPDATE uploads SET state = 'pending', attempts = 0, next_attempt = ? WHERE state = 'failed'",
+            (time.time(),),
+        ).rowcount
+    _wakeup.set()
+    return n
+
+
+def queue_stats():
+    conn = _connection()
+    stats = {state: 0 for state in ("pending", "uploading", "done", "failed")}
+    for row in conn.execute("SELECT state, COUNT(*) AS n FROM uploads GROUP BY state"):
+        stats[row["state"]] = row["n"]
+    oldest = conn.execute(
+        "SELECT MIN(created_at) FROM uploads WHERE state IN ('pending', 'uploading')"
+    ).fetchone()[0]
+    stats["oldest_pending_seconds"] = round(time.time() - oldest, 1) if oldest else 0.0
+    stats["failed_keys"] = [
+        r[0] for r in conn.execute("SELECT object_key FROM uploads WHERE state = 'failed' ORDER BY updated_at DESC LIMIT 20")
+    ]
+    return stats
+
+
+def _next_due():
+    conn = _connection()
+    return conn.execute("SELECT MIN(next_attempt) FROM uploads WHERE state = 'pending'").fetchone()[0]
+
+
+def _loop():
+    while True:
+        _wakeup.clear()
+        try:
+            drain_uploads()
+            due = _next_due()
+        except Exception:
+            logger.exception("Upload pass failed")
+            due = None
+        timeout = UPLOAD_POLL_SECONDS if due is None else min(UPLOAD_POLL_SECONDS, max(0.0, due - time.time()))
+        _wakeup.wait(timeout)
+
+
+def start_uploader():
+    """Starts the background uploader once per process."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_loop, name="report-uploader", daemon=True)
+            _worker.start()
+    return _worker
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upload queued reports.")
+    parser.add_argument("--status", action="store_true", help="print queue counts and exit")
+    parser.add_argument("--retry-failed", action="store_true", help="requeue failed uploads first")
+    args = parser.parse_args()
+
+    if args.status:
+        print(queue_stats())
+    else:
+        if args.retry_failed:
+            print(f"🔁 {retry_failed()} failed upload(s) requeued.")
+        print(f"✅ {drain_uploads()}")
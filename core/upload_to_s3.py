@@ -1,26 +1,18 @@
 import os
-import boto3
 from werkzeug.utils import secure_filename
 from openpyxl import Workbook, load_workbook
 from datetime import datetime
 import re
 import sys
-from aws_config import AWS_ACCESS_KEY, AWS_SECRET_KEY, AWS_REGION
 from openpyxl.utils import get_column_letter
+from core.face_collection import index_student_image
+from core.storage import get_storage, BUCKET_NAME
+from core.roster import invalidate_roster
 
 # Constants
 ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
 MAX_FILE_SIZE_MB = 5
 EXCEL_FILE = 'students.xlsx'
-BUCKET_NAME = 'ict-attendances'
-
-# Initialize S3 client
-s3 = boto3.client(
-    's3',
-    region_name=AWS_REGION,
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY
-)
 
 
 def allowed_file(filename):
@@ -41,7 +33,7 @@ def upload_file_to_s3(bucket_name, file_path, s3_key):
     """Upload a local file to S3 with the object key."""
     try:
         print(f"Uploading to S3 → Bucket: {bucket_name}, Key: {s3_key}")
-        s3.upload_file(file_path, bucket_name, s3_key)
+        get_storage(bucket_name).upload_file(file_path, s3_key)
     except Exception as e:
         raise Exception(f"Upload failed: {e}")
 
@@ -130,7 +122,7 @@ def upload_multiple_images(batch_name, er_number, name, image_files):
 
         try:
             image_file.save(local_path)
-            s3.upload_file(Filename=local_path, Bucket=BUCKET_NAME, Key=s3_key)
+            get_storage().upload_file(local_path, s3_key)
             upload_results.append(f"✅ Uploaded: {s3_key}")
 
             # 👇 Trigger Rekognition auto-index here
@@ -148,6 +140,7 @@ def upload_multiple_images(batch_name, er_number, name, image_files):
         # Update Excel and upload to S3
         update_student_excel(batch_name, er_number, name)
         upload_file_to_s3(BUCKET_NAME, EXCEL_FILE, EXCEL_FILE)
+        invalidate_roster(EXCEL_FILE)
         upload_results.append("✅ Excel updated and uploaded to S3 root.")
     except Exception as e:
         upload_results.append(f"❌ Excel update failed: {e}")
@@ -166,25 +159,13 @@ def mark_attendance_s3():
     ]
     return results
 
-def index_face_to_rekognition(er_number, student_name, s3_key, collection_id="students", region="ap-south-1"):
-    rekognition = boto3.client('rekognition', region_name=region)
-    external_id = f"{er_number}_{student_name.replace(' ', '_')}"
-    try:
-        
-        response = rekognition.index_faces(
-            CollectionId=collection_id,
-            Image={"S3Object": {"Bucket": BUCKET_NAME, "Name": s3_key}},
-            ExternalImageId=external_id,
-            DetectionAttributes=["DEFAULT"]
-        )
-        if response["FaceRecords"]:
-            print(f"✅ Rekognition Indexed: {external_id}")
-        else:
-            print(f"⚠️ No face detected in {s3_key}")
-    except rekognition.exceptions.ResourceNotFoundException:
-        rekognition.create_collection(CollectionId=collection_id)
-        print(f"✅ Rekognition Collection '{collection_id}' created")
-        index_face_to_rekognition(er_number, student_name, s3_key, collection_id, region)
+def index_face_to_rekognition(er_number, student_name, s3_key, collection_id=None, region="ap-south-1"):
+    """
+    Indexes an uploaded photo into its batch's collection. An unchanged
+    photo is skipped and a replaced one's old face is removed; see
+    core.face_collection.
+    """
+    return index_student_image(s3_key, er_number, student_name, collection_id=collection_id, region=region)
 
 
 if __name__ == '__main__':
@@ -1,18 +1,16 @@
 import os
 import sys
-import io
-import csv
+import tempfile
 import traceback
+import itertools
 from datetime import datetime, timedelta, timezone
 
-import boto3
-import pandas as pd
 from dotenv import load_dotenv
 
 from flask import (
     Flask, render_template, request, redirect, url_for,
-    session, send_file, jsonify, send_from_directory,
-    make_response, Response
+    session, jsonify, send_from_directory,
+    make_response, Response, current_app
 )
 
 from flask_cors import CORS
@@ -28,46 +26,42 @@ load_dotenv()
 AWS_REGION = os.getenv("AWS_REGION", "ap-south-1")
 AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY")
 AWS_SECRET_KEY = os.getenv("AWS_SECRET_KEY")
-BUCKET_NAME = os.getenv("BUCKET_NAME", "ict-attendances")
 FLASK_SECRET_KEY = os.getenv("SECRET_KEY", "your_default_secret")
 
-app = Flask(__name__)
-app.secret_key = FLASK_SECRET_KEY
+# Heavy modules (pandas, boto3, openpyxl, matplotlib) are imported inside
+# the views that need them so that importing this module stays fast.
+from core.aws_clients import lazy_client
+from core.storage import get_storage, BUCKET_NAME
+from core.chart_service import CHART_FORMATS
+from core.report_layout import report_key
+from core.http_cache import conditional, request_reports_version, students_version, clear_memo
+from core.scheduler import enqueue, read_status, scheduler_status, start_scheduler
+from core.profiling import init_profiling
+from core.timings import StageTimer, configure_timing_log
+from core.rate_limiter import RateLimitExceeded
+from core.streaming import (
+    streaming_response, json_array_chunks, csv_chunks, file_chunks, compress_response
+)
 
-# ------------------------- Session & Cookie Settings (5 minutes) -------------------------
-app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=5)
-app.config['SESSION_COOKIE_HTTPONLY'] = True
-app.config['SESSION_COOKIE_SECURE'] = False  # set True if using HTTPS
-app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+# AWS clients (built on first use); S3 objects go through core.storage
+rekognition_client = lazy_client("rekognition")
 
-# Enable CORS for React frontend
-CORS(app, supports_credentials=True, resources={r"/*": {"origins": "*"}})
+USER = {'username': 'admin', 'password': 'admin'}
 
-# Initialize AWS clients
-rekognition_client = boto3.client(
-    "rekognition",
-    region_name=AWS_REGION,
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY
-)
-s3_client = boto3.client(
-    "s3",
-    region_name=AWS_REGION,
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY
-)
+_routes = []
 
-# Import core functions (these should exist in core/)
-from core.upload_to_s3 import upload_multiple_images
-from core.update_excel import sync_students_to_excel
-from core.mark_batch_attendance import mark_batch_attendance_s3
-from core.generate_attendance_charts import generate_overall_attendance
 
-USER = {'username': 'admin', 'password': 'admin'}
+def route(rule, **options):
+    """Like app.route; the rules are added to the app in create_app()."""
+    def decorator(view):
+        _routes.append((rule, view, options))
+        return view
+    return decorator
+
 
 # ---------------- ROUTES ---------------- #
 
-@app.route('/', methods=['GET', 'POST'])
+@route('/', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -81,15 +75,15 @@ def login():
     return render_template('login.html')
 
 
-@app.route('/logout')
+@route('/logout')
 def logout():
     session.clear()
     resp = make_response(redirect(url_for('login')))
-    resp.set_cookie(app.session_cookie_name, '', expires=0)
+    resp.set_cookie(current_app.config['SESSION_COOKIE_NAME'], '', expires=0)
     return resp
 
 
-@app.route('/home', methods=['GET', 'POST'])
+@route('/home', methods=['GET', 'POST'])
 def home():
     if not session.get('logged_in'):
         return redirect(url_for('login'))
@@ -99,7 +93,7 @@ def home():
     return render_template('home.html')
 
 
-@app.route('/action/<action>', methods=['GET', 'POST'])
+@route('/action/<action>', methods=['GET', 'POST'])
 def action_page(action):
     if not session.get('logged_in'):
         return redirect(url_for('login'))
@@ -112,7 +106,7 @@ def action_page(action):
     return "Invalid action selected.", 400
 
 
-@app.route('/upload-image', methods=['POST'])
+@route('/upload-image', methods=['POST'])
 def upload_image():
     bucket_name = request.form.get('bucket_name', '').strip() or BUCKET_NAME
     batch_name = request.form.get('batch_name', '').strip()
@@ -127,12 +121,16 @@ def upload_image():
     if not all([bucket_name, batch_name, er_number, student_name]) or not image_files or not any(getattr(f, 'filename', '') for f in image_files):
         return jsonify({"error": "❌ All fields are required and images must be selected."}), 400
 
+    from core.upload_to_s3 import upload_multiple_images
+    from core.update_excel import sync_students_to_excel
+
     try:
         # Upload images to S3
         upload_results = upload_multiple_images(batch_name, er_number, student_name, image_files)
 
         # Update Excel file after upload
         sync_students_to_excel()
+        clear_memo()
 
         return jsonify({
             "success": True,
@@ -147,12 +145,12 @@ def upload_image():
         }), 200
 
     except Exception as e:
-        app.logger.exception("upload_image failed")
+        current_app.logger.exception("upload_image failed")
         return jsonify({"error": f"❌ Upload failed: {str(e)}"}), 500
 
 
 # ---------------- JSON Attendance API ---------------- #
-@app.route('/take_attendance', methods=['POST'])
+@route('/take_attendance', methods=['POST'])
 def take_attendance():
     try:
         batch_name = request.form.get('batch_name')
@@ -163,32 +161,74 @@ def take_attendance():
         if not batch_name or not subject_name or not group_images:
             return jsonify({"success": False, "error": "Batch, Subject, and class_images are required"}), 400
 
-        # Run batch attendance
-        attendance_list, absent_students, file_url = mark_batch_attendance_s3(
-            batch_name=batch_name,
-            class_name=lab_name,
-            subject=subject_name,
-            group_image_files=group_images
+        from core.mark_batch_attendance import mark_batch_attendance_s3
+        from core.submissions import (
+            submission_key, begin_submission, finish_submission, abandon_submission, SubmissionPending
         )
-        return jsonify({
+
+        # Same photos + batch/subject/class resubmitted (flaky Wi-Fi):
+        # hand back the earlier result instead of a second run and report
+        key = submission_key(batch_name, subject_name, lab_name, group_images)
+        try:
+            cached = begin_submission(key)
+        except SubmissionPending as e:
+            # don't hold a worker while the first run finishes; the client polls
+            return jsonify({
+                "success": False,
+                "pending": True,
+                "error": str(e),
+                "status_url": url_for("submission_status_api", key=key),
+            }), 202, {"Retry-After": "5"}
+        if cached is not None:
+            return jsonify({**cached, "cached": True}), 200
+
+        # Run batch attendance
+        timer = StageTimer("take_attendance")
+        upload = {}
+        try:
+            attendance_list, absent_students, file_url = mark_batch_attendance_s3(
+                batch_name=batch_name,
+                class_name=lab_name,
+                subject=subject_name,
+                group_image_files=group_images,
+                timer=timer,
+                upload=upload
+            )
+        except Exception:
+            abandon_submission(key)
+            raise
+        result = {
             "success": True,
             "present": attendance_list,
             "absent": absent_students,
-            "report_url": file_url
-        }), 200
+            "report_url": file_url,
+            "upload_status_url": url_for("upload_status_api", key=upload["object_key"])
+        }
+        finish_submission(key, result)
+        clear_memo()
+
+        # per-stage timings and counters on request (?timings=1)
+        if request.values.get("timings", "").lower() in ("1", "true", "yes"):
+            result["timings"] = timer.as_dict()
+        return jsonify({**result, "cached": False}), 200
+    except RateLimitExceeded:
+        return jsonify({
+            "success": False,
+            "error": "Face recognition is busy right now, please submit again in a minute."
+        }), 503, {"Retry-After": "30"}
     except Exception as e:
-        app.logger.exception("take_attendance failed")
+        current_app.logger.exception("take_attendance failed")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
 # Serve saved attendance reports
-@app.route('/attendance_reports/<path:filename>')
+@route('/attendance_reports/<path:filename>')
 def download_report(filename):
     return send_from_directory("attendance_reports", filename, as_attachment=True)
 
 
 # ---------------- Batch Upload Placeholder ---------------- #
-@app.route('/batch_attendance_upload', methods=['GET', 'POST'])
+@route('/batch_attendance_upload', methods=['GET', 'POST'])
 def batch_attendance_upload():
     if not session.get('logged_in'):
         return redirect(url_for('login'))
@@ -200,7 +240,7 @@ def batch_attendance_upload():
 
 
 # ---------------- CSV Download ---------------- #
-@app.route('/download_attendance')
+@route('/download_attendance')
 def download_attendance():
     if not session.get('logged_in'):
         return redirect(url_for('login'))
@@ -214,57 +254,83 @@ def download_attendance():
     current_date = now.strftime("%Y-%m-%d")
     current_time = now.strftime("%H-%M-%S")
 
-    # Generate CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['ER Number', 'Name', 'Subject Name', 'Batch', 'Class', 'Date', 'Time'])
+    def csv_rows():
+        yield ['ER Number', 'Name', 'Subject Name', 'Batch', 'Class', 'Date', 'Time']
+        for student in students:
+            parts = student.split('_', 1)
+            if len(parts) == 2:
+                er_number, name = parts
+            else:
+                er_number, name = student, ''
+            yield [er_number, name, subject_name, batch_name, class_name, current_date, current_time]
 
-    for student in students:
-        parts = student.split('_', 1)
-        if len(parts) == 2:
-            er_number, name = parts
-        else:
-            er_number, name = student, ''
-        writer.writerow([er_number, name, subject_name, batch_name, class_name, current_date, current_time])
+    filename = f"{batch_name}_{subject_name}_{current_date}_{current_time}.csv"
+    s3_key = report_key(filename, batch_name, now)
 
-    output.seek(0)
-    csv_bytes = io.BytesIO(output.getvalue().encode())
+    from core.student_index import index_report
+    from core.upload_queue import spool_path, queue_upload, delete_when_uploaded
 
-    filename = f"{batch_name}_{subject_name}_{current_date}_{current_time}.csv"
-    s3_key = f"reports/{filename}"
+    # Encode the CSV once into the upload spool; the response streams the same file
+    csv_path = spool_path(filename)
+    with open(csv_path, "wb") as fh:
+        for chunk in csv_chunks(csv_rows()):
+            fh.write(chunk.encode())
+    csv_file = open(csv_path, "rb")
+    upload = None
 
     try:
-        # Upload CSV to S3 with public-read ACL
-        s3_client.upload_fileobj(
-            csv_bytes,
-            BUCKET_NAME,
-            s3_key,
-            ExtraArgs={'ACL': 'public-read'}
-        )
-
-        public_url = f"https://{BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{s3_key}"
+        # Queue the upload with public-read ACL; the URL is final straight away.
+        # The spooled file is only released for deletion once nothing reads it.
+        upload = queue_upload(csv_path, s3_key, public=True)
+        public_url = upload["url"]
+
+        try:
+            index_report(s3_key, [
+                {
+                    "er_number": er_number,
+                    "student_name": name,
+                    "date": current_date,
+                    "time": now.strftime("%H:%M:%S"),
+                    "subject": subject_name,
+                    "batch": batch_name,
+                    "class": class_name,
+                    "status": "present",
+                }
+                for er_number, name in (
+                    student.split('_', 1) if '_' in student else (student, '')
+                    for student in students
+                )
+            ])
+        except Exception:
+            current_app.logger.exception("indexing %s failed", s3_key)
 
         if request.headers.get("Accept") == "application/json":
+            csv_file.close()
+            delete_when_uploaded(s3_key, csv_path)
             return jsonify({
                 "success": True,
                 "report_url": public_url,
+                "upload_state": upload["state"],
+                "upload_status_url": url_for("upload_status_api", key=s3_key),
                 "file_name": filename,
                 "present_students": students
             })
         else:
-            return send_file(
-                io.BytesIO(output.getvalue().encode()),
-                mimetype='text/csv',
-                as_attachment=True,
-                download_name=filename
-            )
+            response = streaming_response(file_chunks(csv_file), "text/csv", filename=filename)
+            response.call_on_close(lambda: delete_when_uploaded(s3_key, csv_path))
+            return response
 
     except Exception as e:
-        app.logger.exception("download_attendance failed")
+        csv_file.close()
+        if upload is not None:
+            delete_when_uploaded(s3_key, csv_path)
+        elif os.path.exists(csv_path):
+            os.remove(csv_path)
+        current_app.logger.exception("download_attendance failed")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
-@app.route('/upload_excel', methods=['POST'])
+@route('/upload_excel', methods=['POST'])
 def upload_excel():
     if 'file' not in request.files:
         return jsonify({"success": False, "error": "No file uploaded"}), 400
@@ -274,72 +340,213 @@ def upload_excel():
     filename = secure_filename(file.filename)
 
     try:
-        s3_client.upload_fileobj(file, BUCKET_NAME, f"{batch_name}/{filename}")
+        get_storage().upload_fileobj(file, f"{batch_name}/{filename}")
         return jsonify({"success": True, "message": "File uploaded to S3"})
     except Exception as e:
-        app.logger.exception("upload_excel failed")
+        current_app.logger.exception("upload_excel failed")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
-@app.route("/api/reports", methods=["GET"])
+@route("/api/reports", methods=["GET"])
+@conditional(request_reports_version)
 def list_reports():
+    from core.attendance_loader import iter_sessions, present_names
+
+    sessions = iter_sessions(
+        columns=["student_name", "status"],
+        batch=request.args.get("batch"),
+        months=request.args.getlist("month"),
+    )
+
+    storage = get_storage()
+
+    # fetch the first report before answering, so a failure up front is still a 500
     try:
-        response = s3_client.list_objects_v2(Bucket=BUCKET_NAME, Prefix="reports/")
-
-        reports = []
-        for obj in response.get("Contents", []):
-            key = obj["Key"]
-
-            # only Excel or CSV reports
-            if not (key.endswith(".xlsx") or key.endswith(".csv")):
-                continue
-
-            # Download file from S3
-            s3_obj = s3_client.get_object(Bucket=BUCKET_NAME, Key=key)
-            body = s3_obj["Body"].read()
-
-            df = pd.read_excel(io.BytesIO(body))
-
-            records_count = len(df)
-            students = df["Name"].dropna().tolist() if "Name" in df.columns else []
-
-            reports.append({
-                "id": key,
-                "fileName": os.path.basename(key),
-                "batch": "-",
-                "subject": "-",
-                "date": obj["LastModified"].astimezone(timezone.utc).isoformat(),
-                "size": f"{obj['Size']/1024:.1f} KB",
-                "records": records_count,
-                "status": "ready",
-                "students": students,
-                "url": f"https://{BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{key}"
-            })
+        first = next(sessions, None)
+    except Exception as e:
+        current_app.logger.exception("list_reports failed")
+        return jsonify({"error": str(e)}), 500
 
-        return jsonify(reports)
+    def generate():
+        try:
+            for report in itertools.chain([first] if first is not None else [], sessions):
+                key = report["key"]
+                df = report["frame"]
+
+                yield {
+                    "id": key,
+                    "fileName": report["file_name"],
+                    "batch": "-",
+                    "subject": "-",
+                    "date": report["last_modified"].astimezone(timezone.utc).isoformat(),
+                    "size": f"{report['size']/1024:.1f} KB",
+                    "records": len(df),
+                    "status": "ready",
+                    "students": present_names(df),
+                    "url": storage.url(key)
+                }
+        except Exception as e:
+            # headers (and the ETag) are already sent: add an error element for
+            # the client, then re-raise so the server drops the connection
+            # without the final chunk and nothing caches the partial body
+            current_app.logger.exception("list_reports failed")
+            yield {"error": str(e)}
+            raise
+
+    # stream the array so memory stays flat however many reports there are
+    return streaming_response(json_array_chunks(generate()), "application/json")
+
+
+@route("/api/report-cache/stats", methods=["GET"])
+def report_cache_stats():
+    from core.report_cache import cache_stats
+    return jsonify(cache_stats()), 200
+
+
+@route("/api/submissions/<key>", methods=["GET"])
+def submission_status_api(key):
+    """Result of a /take_attendance submission that was still running when resubmitted."""
+    from core.submissions import submission_status
+    state, result = submission_status(key)
+    if state == "done":
+        return jsonify({**result, "cached": True}), 200
+    if state == "pending":
+        return jsonify({"success": False, "pending": True}), 202, {"Retry-After": "5"}
+    return jsonify({"error": "Unknown submission"}), 404
+
+
+@route("/api/uploads/status", methods=["GET"])
+def upload_status_api():
+    from core.upload_queue import upload_status
+    key = request.args.get("key", "")
+    status = upload_status(key) if key else None
+    if status is None:
+        return jsonify({"error": "Unknown upload"}), 404
+    return jsonify(status), 200
+
+
+@route("/api/uploads/stats", methods=["GET"])
+def upload_stats_api():
+    from core.upload_queue import queue_stats
+    return jsonify(queue_stats()), 200
+
+
+@route("/api/storage/stats", methods=["GET"])
+def storage_stats_api():
+    from core.storage import storage_stats
+    return jsonify(storage_stats()), 200
+
+
+@route("/api/recognition-cache/stats", methods=["GET"])
+def recognition_cache_stats():
+    from core.recognition_cache import cache_stats
+    return jsonify(cache_stats()), 200
+
+
+@route("/api/roster", methods=["GET"])
+@conditional(students_version)
+def roster_api():
+    from core.roster import get_roster
 
+    try:
+        roster = get_roster()
+        batch = request.args.get("batch")
+        students = roster.list(batch, request.args.get("section"))
+        return jsonify({"count": roster.count(batch), "students": students}), 200
     except Exception as e:
-        app.logger.exception("list_reports failed")
+        current_app.logger.exception("roster_api failed")
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/students/count", methods=["GET"])
+@route("/api/roster/<er_number>", methods=["GET"])
+def roster_student_api(er_number):
+    from core.roster import get_roster
+
+    try:
+        student = get_roster().lookup(er_number)
+        if student is None:
+            return jsonify({"error": f"No student {er_number} in the roster"}), 404
+        return jsonify(student), 200
+    except Exception as e:
+        current_app.logger.exception("roster_student_api failed")
+        return jsonify({"error": str(e)}), 500
+
+
+@route("/api/students/<er_number>/attendance", methods=["GET"])
+def student_attendance_api(er_number):
+    from core.student_index import student_attendance
+
+    try:
+        data = student_attendance(er_number)
+        if data is None:
+            return jsonify({"error": f"No attendance found for {er_number}"}), 404
+        return jsonify(data), 200
+    except Exception as e:
+        current_app.logger.exception("student_attendance_api failed")
+        return jsonify({"error": str(e)}), 500
+
+
+@route("/api/exports/semester", methods=["GET", "POST"])
+def semester_export():
+    from core.semester_export import write_semester_workbook, start_export_job
+
+    if not session.get('logged_in'):
+        return jsonify({"error": "Login required"}), 401
+
+    batch = request.values.get("batch", "").strip()
+    months = request.values.getlist("month")
+    if not batch:
+        return jsonify({"error": "batch is required"}), 400
+
+    # POST runs as a background job that uploads the workbook to S3
+    if request.method == "POST":
+        job_id = start_export_job(batch, months)
+        return jsonify({"success": True, "job_id": job_id,
+                        "status_url": url_for("semester_export_status", job_id=job_id)}), 202
+
+    try:
+        tmp = tempfile.TemporaryFile()
+        write_semester_workbook(batch, tmp, months)
+        tmp.seek(0)
+        return streaming_response(
+            file_chunks(tmp),
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            filename=f"semester_{secure_filename(batch)}.xlsx",
+        )
+    except Exception as e:
+        current_app.logger.exception("semester_export failed")
+        return jsonify({"error": str(e)}), 500
+
+
+@route("/api/exports/<job_id>", methods=["GET"])
+def semester_export_status(job_id):
+    from core.semester_export import get_export_job
+
+    job = get_export_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown export job"}), 404
+    return jsonify(job), 200
+
+
+@route("/students/count", methods=["GET"])
+@conditional(students_version)
 def students_count():
+    from core.roster import get_roster
+
     try:
-        s3_obj = s3_client.get_object(Bucket=BUCKET_NAME, Key="students.xlsx")
-        body = s3_obj["Body"].read()
-        df = pd.read_excel(io.BytesIO(body))
-        count = len(df)
+        count = get_roster().count(request.args.get("batch"))
         return jsonify({"count": count})
     except Exception as e:
-        app.logger.exception("students_count failed")
+        current_app.logger.exception("students_count failed")
         return jsonify({"error": str(e), "count": 0}), 500
 
 
-@app.route('/dashboard', methods=['GET'])
+@route('/dashboard', methods=['GET'])
 def dashboard():
     if not session.get('logged_in'):
         return redirect(url_for('login'))
+    from core.generate_attendance_charts import generate_overall_attendance
+
     try:
         charts = generate_overall_attendance()
         return render_template(
@@ -350,61 +557,121 @@ def dashboard():
             subject_pie_chart=charts.get("subject_pie_chart", None)
         )
     except Exception as e:
-        app.logger.exception("dashboard route failed")
+        current_app.logger.exception("dashboard route failed")
         # show error on template if it supports it
         return render_template("dashboard.html", error=str(e))
 
 
-# Import and register blueprint (wrapped to show import-time errors)
-try:
-    from core.overview import dashboard_bp
-    app.register_blueprint(dashboard_bp)
-except Exception as e:
-    app.logger.exception("Failed to import/register core.overview blueprint")
-
-@app.route("/api/dashboard", methods=["GET"])
+@route("/api/dashboard", methods=["GET"])
+@conditional(request_reports_version)
 def dashboard_api():
+    chart_format = request.args.get("chart", "png").lower()
+    if chart_format not in CHART_FORMATS:
+        return jsonify({"error": f"chart must be one of {', '.join(CHART_FORMATS)}"}), 400
+
+    from core.generate_attendance_charts import generate_overall_attendance
+    from core.dashboard_state import InvalidScope
+
     try:
-        charts = generate_overall_attendance()
+        charts = generate_overall_attendance(
+            batch=request.args.get("batch"),
+            months=request.args.getlist("month"),
+            chart_format=chart_format,
+        )
         return jsonify(charts), 200
+    except InvalidScope as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        app.logger.exception("dashboard_api failed")
+        current_app.logger.exception("dashboard_api failed")
         return jsonify({"error": str(e)}), 500
 
 
 
-@app.route("/api/trigger-low-attendance-alert", methods=["POST"])
+@route("/api/trigger-low-attendance-alert", methods=["POST"])
 def trigger_low_attendance_alert():
-    try:
-        from core.alert_service import check_and_alert_low_attendance
-        alerted = check_and_alert_low_attendance()
+    full = request.args.get("full", "").lower() in ("1", "true", "yes")
+    if not enqueue("alerts", full=full):
         return jsonify({
-            "success": True, 
-            "message": f"Alerts processed. Sent {len(alerted)} emails.",
-            "alerted_students": alerted
-        }), 200
-    except Exception as e:
-        app.logger.exception("trigger_low_attendance_alert failed")
-        return jsonify({"success": False, "error": str(e)}), 500
+            "success": False,
+            "message": "Alert evaluation is already running or queued.",
+            "job": read_status("alerts"),
+            "status_url": url_for("scheduler_status_api"),
+        }), 409
+    return jsonify({
+        "success": True,
+        "message": "Alert evaluation queued.",
+        "status_url": url_for("scheduler_status_api"),
+    }), 202
+
+
+@route("/api/scheduler/status", methods=["GET"])
+def scheduler_status_api():
+    return jsonify({"success": True, "jobs": scheduler_status()})
 
 
 # ---------------- Development helpers ----------------
 
-@app.errorhandler(500)
 def internal_error(e):
     tb = traceback.format_exc()
-    app.logger.error("Internal Server Error: %s\n%s", e, tb)
+    current_app.logger.error("Internal Server Error: %s\n%s", e, tb)
     # DEV only: return the traceback to browser for debugging
     return Response(f"<pre>{tb}</pre>", status=500, mimetype="text/plain")
 
 
-@app.before_request
+def compress_large_responses(response):
+    return compress_response(response)
+
+
 def dev_force_login():
     # Auto-login only when running in debug mode to ease local testing
-    if app.debug:
+    if current_app.debug:
         session.setdefault('logged_in', True)
 
 
+# ---------------- App factory ----------------
+
+def create_app():
+    app = Flask(__name__)
+    app.secret_key = FLASK_SECRET_KEY
+
+    # ------------------------- Session & Cookie Settings (5 minutes) -------------------------
+    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=5)
+    app.config['SESSION_COOKIE_HTTPONLY'] = True
+    app.config['SESSION_COOKIE_SECURE'] = False  # set True if using HTTPS
+    app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+
+    # Enable CORS for React frontend
+    CORS(app, supports_credentials=True, resources={r"/*": {"origins": "*"}})
+
+    for rule, view, options in _routes:
+        app.add_url_rule(rule, view_func=view, **options)
+
+    # Import and register blueprint (wrapped to show import-time errors)
+    try:
+        from core.overview import dashboard_bp
+        app.register_blueprint(dashboard_bp)
+    except Exception:
+        app.logger.exception("Failed to import/register core.overview blueprint")
+
+    app.register_error_handler(500, internal_error)
+    app.after_request(compress_large_responses)
+    app.before_request(dev_force_login)
+    # one JSON line per attendance run on the attendance.timings logger
+    configure_timing_log(os.getenv("TIMINGS_LOG_LEVEL", "INFO").upper())
+    # opt-in cProfile of single requests (PROFILING_ENABLED + X-Profile header)
+    init_profiling(app)
+
+    # run alerts / aggregate refresh / cache warming in the background
+    if os.getenv("SCHEDULER_ENABLED", "false").lower() in ("1", "true", "yes"):
+        start_scheduler()
+
+    return app
+
+
+# WSGI entry point (gunicorn main:app)
+app = create_app()
+
+
 # ---------------- Run ----------------
 if __name__ == '__main__':
     print("✅ Starting Flask server on http://0.0.0.0:5000 ...")
@@ -0,0 +1,149 @@
+import smtplib
+import threading
+import unittest
+from email.message import EmailMessage
+from unittest import mock
+
+from core import mailer
+
+
+class FakeSMTP:
+    """Stands in for smtplib.SMTP; records connections and deliveries."""
+
+    instances = []
+    delivered = []
+    # recipient -> list of exceptions raised on successive sendmail calls
+    failures = {}
+    lock = threading.Lock()
+
+    def __init__(self, host, port, timeout=None):
+        self.host, self.port = host, port
+        self.logins = 0
+        self.closed = False
+        with FakeSMTP.lock:
+            FakeSMTP.instances.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        self.logins += 1
+
+    def sendmail(self, sender, recipients, body):
+        if self.closed:
+            raise smtplib.SMTPServerDisconnected("connection closed")
+        with FakeSMTP.lock:
+            pending = FakeSMTP.failures.get(recipients[0])
+            error = pending.pop(0) if pending else None
+        if error is not None:
+            if isinstance(error, smtplib.SMTPServerDisconnected):
+                self.closed = True
+            raise error
+        with FakeSMTP.lock:
+            FakeSMTP.delivered.append((self, recipients[0]))
+        return {}
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+def message(to):
+    msg = EmailMessage()
+    msg["From"] = "admin@example.com"
+    msg["To"] = to
+    msg["Subject"] = "Low attendance"
+    msg.set_content("Hello")
+    return msg
+
+
+class SMTPMailerTest(unittest.TestCase):
+    def setUp(self):
+        FakeSMTP.instances = []
+        FakeSMTP.delivered = []
+        FakeSMTP.failures = {}
+        patches = [
+            mock.patch.object(mailer.smtplib, "SMTP", FakeSMTP),
+            # no backoff waits in tests
+            mock.patch.object(mailer.time, "sleep", lambda seconds: None),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def make_mailer(self, pool_size=1, max_retries=2):
+        m = mailer.SMTPMailer(host="localhost", port=2525, username="user", password="secret",
+                              use_tls=True, pool_size=pool_size, rate_per_second=0,
+                              max_retries=max_retries)
+        self.addCleanup(m.close)
+        return m
+
+    def test_connection_is_reused_across_messages(self):
+        m = self.make_mailer()
+        outcomes = [m.send(message(f"s{i}@example.com")) for i in range(5)]
+
+        self.assertEqual([o["status"] for o in outcomes], ["sent"] * 5)
+        self.assertEqual(len(FakeSMTP.instances), 1)
+        self.assertEqual(FakeSMTP.instances[0].logins, 1)
+
+    def test_batch_stays_within_pool(self):
+        m = self.make_mailer(pool_size=2)
+        outcomes = m.send_batch(message(f"s{i}@example.com") for i in range(10))
+
+        self.assertEqual([o["recipient"] for o in outcomes], [f"s{i}@example.com" for i in range(10)])
+        self.assertTrue(all(o["status"] == "sent" for o in outcomes))
+        self.assertLessEqual(len(FakeSMTP.instances), 2)
+
+    def test_reconnects_after_server_disconnect(self):
+        m = self.make_mailer()
+        m.send(message("first@example.com"))
+        FakeSMTP.failures["second@example.com"] = [smtplib.SMTPServerDisconnected("gone")]
+
+        outcome = m.send(message("second@example.com"))
+
+        self.assertEqual(outcome["status"], "sent")
+        self.assertEqual(outcome["attempts"], 2)
+        self.assertEqual(len(FakeSMTP.instances), 2)
+        self.assertTrue(FakeSMTP.instances[0].closed)
+        self.assertIs(FakeSMTP.delivered[-1][0], FakeSMTP.instances[1])
+
+    def test_one_failed_message_does_not_stop_the_batch(self):
+        m = self.make_mailer(pool_size=2)
+        FakeSMTP.failures["refused@example.com"] = [
+            smtplib.SMTPRecipientsRefused({"refused@example.com": (550, b"no such user")})
+        ]
+        FakeSMTP.failures["rejected@example.com"] = [smtplib.SMTPDataError(554, b"rejected")]
+        recipients = ["a@example.com", "refused@example.com", "b@example.com",
+                      "rejected@example.com", "c@example.com"]
+
+        outcomes = m.send_batch(message(r) for r in recipients)
+
+        statuses = {o["recipient"]: o["status"] for o in outcomes}
+        self.assertEqual(statuses, {
+            "a@example.com": "sent",
+            "refused@example.com": "failed",
+            "b@example.com": "sent",
+            "rejected@example.com": "failed",
+            "c@example.com": "sent",
+        })
+        # permanent failures are not retried
+        self.assertEqual([o["attempts"] for o in outcomes if o["status"] == "failed"], [1, 1])
+        self.assertEqual(sorted(r for _, r in FakeSMTP.delivered),
+                         ["a@example.com", "b@example.com", "c@example.com"])
+
+    def test_gives_up_after_max_retries(self):
+        m = self.make_mailer(max_retries=2)
+        FakeSMTP.failures["flaky@example.com"] = [smtplib.SMTPServerDisconnected("gone")] * 5
+
+        outcome = m.send(message("flaky@example.com"))
+        after = m.send(message("ok@example.com"))
+
+        self.assertEqual(outcome["status"], "failed")
+        self.assertEqual(outcome["attempts"], 3)
+        self.assertEqual(after["status"], "sent")
+
+
+if __name__ == "__main__":
+    unittest.main()